@@ -11,15 +11,118 @@ import os
 from datetime import timedelta, datetime
 
 # Data Libraries
+import numpy as np
 import pandas as pd
 
 # Visualization Libraries
 import plotly.express as px
 
+# Data store
+from utils import storage
+from utils import rollups
+
 # Data path relative to current script
 script_dir = os.path.dirname(os.path.realpath(__file__))
 data_path = os.path.join(script_dir, "../../data")
 
+# Rename columns for better readability in the plot
+source_names = {'solar': 'Solar', 'wind': 'Wind', 'hydro': 'Hydro', 'nuclear': 'Nuclear', 'gas': 'Gas', 'coal': 'Coal', 'biomass': 'Biomass', 'other': 'Other', 'wind_emb': 'Wind Embedded'}
+all_sources = list(source_names.values())
+
+# Shared read-only frame, so reruns do not copy it. A new store version loads the data again.
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_data(version):
+    '''
+    Loads the merged data, typed by the store and indexed by time.
+
+    Parameters:
+        - version (int): Version of the merged dataset, from storage.version.
+
+    Returns:
+        - dict: The DataFrame ('data') and the summary metrics over the whole history.
+    '''
+
+    df = storage.read("merged").rename(columns=source_names)
+
+    # Sorted time index, so date ranges are binary-search slices
+    df.index = pd.DatetimeIndex(df['settlement_date'], name="time")
+
+    return {
+        "data": df,
+        "mean_demand": df["nd"].mean(),
+        "mean_generation": df["generation"].mean() - df["imports"].mean(),
+    }
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_rollup(version, resolution, start, end):
+    '''Reads a rollup of the merged data between two dates, version is the one of the rollup dataset.'''
+    return rollups.read(start, end, resolution=resolution).rename(columns=source_names)
+
+def filtered_data(version, resolution, start, end):
+    '''Returns the data between two dates at a resolution, version is the one of the dataset read.'''
+    if resolution == "half_hourly":
+        return load_data(version)["data"].loc[pd.to_datetime(start):pd.to_datetime(end)]
+    return load_rollup(version, resolution, start, end)
+
+# Fuel categories of the grouped view
+category_map = {
+    'Fossil Fuels': ['Gas', 'Coal'],
+    'Zero-Carbon': ['Solar', 'Wind', 'Hydro', 'Wind Embedded'],
+    'Low Carbon': ['Nuclear', 'Biomass'],
+    'Other': ['Other']
+}
+all_categories = list(category_map.keys())
+
+# Source -> category matrix, the category sums are one matrix multiply
+category_matrix = np.array([[source in category_map[category] for category in all_categories] for source in all_sources], dtype=np.float64)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def generation_data(version, resolution, start, end, energy_sources, category_view, percentage_view):
+    '''
+    Builds the long frame of the stacked generation chart, memoized per filter set.
+
+    Parameters:
+        - version (int): Version of the dataset read.
+        - resolution (str): Resolution of the data, from rollups.choose_resolution.
+        - start (datetime): Start of the range.
+        - end (datetime): End of the range.
+        - energy_sources (tuple): Selected sources, replaced by all the categories in the category view.
+        - category_view (bool): Group the sources by fuel category.
+        - percentage_view (bool): Show the share of the total generation instead of MW.
+
+    Returns:
+        - pd.DataFrame: Melted frame with settlement_date, Energy Source and the generation.
+    '''
+
+    filtered_df = filtered_data(version, resolution, start, end)
+    sources = filtered_df[all_sources].to_numpy(dtype=np.float64)
+
+    # Adjust columns based on toggles, missing values count as 0 in the sums like in pandas
+    if category_view:
+        values = np.nan_to_num(sources) @ category_matrix
+        columns = all_categories
+        energy_sources = all_categories
+    else:
+        values = sources
+        columns = all_sources
+
+    if percentage_view:
+        # Share of the total generation of all the sources, in one broadcast division
+        total_base = np.nansum(sources, axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = values / total_base * 100
+
+    plot_df = pd.DataFrame(values, columns=columns)
+    plot_df.insert(0, 'settlement_date', filtered_df['settlement_date'].to_numpy())
+
+    # Melt data for plotting
+    return plot_df[['settlement_date'] + list(energy_sources)].melt(
+        id_vars='settlement_date',
+        value_vars=list(energy_sources),
+        var_name='Energy Source',
+        value_name='Generation (MW)' if not percentage_view else 'Generation (%)'
+    )
+
 def data_eda_page():
     '''Function to display the Data EDA page of the EcoWatt app. This page provides insights into energy generation and carbon intensity over time.'''
 
@@ -46,28 +149,25 @@ def data_eda_page():
         unsafe_allow_html=True
     )
 
-    # Load and Prepare Data
-    df = pd.read_csv(os.path.join(data_path, "data_uk_merged_generation_demand_update.csv"))
-
-    # Rename columns for better readability in the plot
-    df.rename(columns={'solar': 'Solar', 'wind': 'Wind', 'hydro': 'Hydro', 'nuclear': 'Nuclear', 'gas': 'Gas', 'coal': 'Coal', 'biomass': 'Biomass', 'other': 'Other', 'wind_emb': 'Wind Embedded'}, inplace=True)
+    # The store is filled by the background refresh on a fresh checkout
+    if storage.last_settlement("merged") is None:
+        st.info("The data is still being downloaded, please come back in a few minutes.")
+        return
 
-    # Ensure that the datetime column is in the correct format
-    df['settlement_date'] = pd.to_datetime(df['settlement_date'])
-
-    all_sources = ['Solar', 'Wind', 'Hydro', 'Nuclear', 'Gas', 'Coal', 'Biomass', 'Other', 'Wind Embedded']
+    # Load and Prepare Data
+    loaded = load_data(storage.version("merged"))
+    df = loaded["data"]
 
     # Get the latest data row
-    latest_row = df.sort_values("settlement_date").iloc[-1]
+    latest_row = df.iloc[-1]
     latest_timestamp = latest_row["settlement_date"]
     latest_demand = latest_row["nd"]
     latest_generation = latest_row["generation"]-latest_row["imports"]
     latest_carbon_intensity = latest_row["carbon_intensity"]
 
     # Mean summary metrics
-    mean_demand = df["nd"].mean()
-    mean_generation = df["generation"].mean() - df["imports"].mean()
- 
+    mean_demand = loaded["mean_demand"]
+    mean_generation = loaded["mean_generation"]
 
     if latest_carbon_intensity > 200:  
         carbon_intensity_color = 'red'
@@ -96,7 +196,7 @@ def data_eda_page():
         col_d.markdown(f"<div style='font-size:1.0em;'>💨 Carbon Intensity:</div><div style='color:{carbon_intensity_color}; font-size:2.2em; margin-top:-5.1px;'>{latest_carbon_intensity:.0f} gCO₂/kWh</div>", unsafe_allow_html=True)
     
     # Default date range: last 14 days from the latest date in the dataset
-    default_end = df['settlement_date'].max()
+    default_end = latest_timestamp
     default_start = default_end - timedelta(days=14)
 
     # Visual Divider between Summary and Filters
@@ -113,7 +213,7 @@ def data_eda_page():
             st.markdown("#### Start date")
             start_date = st.date_input(
                 "Start date", value=default_start,
-                min_value=df['settlement_date'].min(),
+                min_value=df.index[0],
                 max_value=default_end,
                 label_visibility="collapsed"
             )
@@ -123,7 +223,7 @@ def data_eda_page():
             end_date = st.date_input(
                 "End date", value=default_end,
                 min_value=start_date,
-                max_value=df['settlement_date'].max(),
+                max_value=latest_timestamp,
                 label_visibility="collapsed"
             )
 
@@ -148,51 +248,14 @@ def data_eda_page():
             with col42:
                 category_view = st.checkbox("Group by Fuel Category")
 
-    # Prepare Base Data 
-    filtered_df = df[(df['settlement_date'] >= pd.to_datetime(start_datetime)) & (df['settlement_date'] <= pd.to_datetime(end_datetime))]
-    plot_df = filtered_df.copy()    
-
-    # Adjust columns based on toggles
-    if category_view:
-        category_map = {
-            'Fossil Fuels': ['Gas', 'Coal'],
-            'Zero-Carbon': ['Solar', 'Wind', 'Hydro', 'Wind Embedded'],
-            'Low Carbon': ['Nuclear', 'Biomass'],
-            'Other': ['Other']
-        }
-
-        # Create a list of all categories
-        all_categories = list(category_map.keys())
-
-        # Create a new DataFrame to hold the categories
-        df_cat = pd.DataFrame({'settlement_date': plot_df['settlement_date']})
-
-        # Sum the energy sources based on the category mapping
-        for category, sources in category_map.items():
-            df_cat[category] = plot_df[sources].sum(axis=1)
+    # Prepare Base Data, hourly, daily or weekly means for long ranges so the charts stay light
+    resolution = rollups.choose_resolution(start_datetime, end_datetime)
+    version = storage.version(rollups.resolutions[resolution][0])
+    filtered_df = filtered_data(version, resolution, start_datetime, end_datetime)
+    if resolution != "half_hourly":
+        st.caption(f"Showing {resolution.replace('_', '-')} averages for the selected range.")
 
-        # Datframe is rescribe with the categories
-        plot_df = df_cat
-        energy_sources = all_categories
-        
-        # Total generation for all the sources
-        total_base = plot_df[all_categories].sum(axis=1) if percentage_view else None
-    else:
-        # Total generation for all the sources
-        total_base = plot_df[all_sources].sum(axis=1) if percentage_view else None
-
-    if percentage_view:
-        # Percentage calculation for seleted energy sources based on the total generation
-        for col in energy_sources:
-            plot_df[col] = plot_df[col] / total_base * 100
-
-    # Melt data for plotting
-    melted = plot_df[['settlement_date'] + energy_sources].melt(
-        id_vars='settlement_date',
-        value_vars=energy_sources,
-        var_name='Energy Source',
-        value_name='Generation (MW)' if not percentage_view else 'Generation (%)'
-    )
+    melted = generation_data(version, resolution, start_datetime, end_datetime, tuple(energy_sources), category_view, percentage_view)
 
     # Custom color scale for plot
     color_map = {
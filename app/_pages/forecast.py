@@ -0,0 +1,77 @@
+''' Forecast Page for EcoWatt Dashboard.
+    This page shows the live forecasts of national demand, solar, wind and carbon intensity
+    for the next settlement periods, made from the latest data in the store.
+'''
+
+# Libraries
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+
+from utils import storage
+from inference import cache
+
+# Target -> (title, unit)
+target_labels = {
+    "nd": ("National Demand", "MW"),
+    "solar": ("Solar Generation", "MW"),
+    "wind": ("Wind Generation", "MW"),
+    "carbon_intensity": ("Carbon Intensity", "gCO₂/kWh"),
+}
+
+def forecast_page():
+    '''Function to display the Forecast page of the EcoWatt app.'''
+
+    st.title("🔮 Forecasts")
+
+    try:
+        forecasts = cache.get_forecasts()
+    except ValueError as error:
+        st.warning(str(error))
+        return
+
+    last_time = forecasts.attrs["last_settlement_date"]
+    if forecasts.attrs["cached"] == len(forecasts):
+        timing = "served from the cache"
+    else:
+        timing = f"computed in {forecasts.attrs['seconds'] * 1000:.0f} ms"
+    st.markdown(f"Forecasts made from the data up to **{last_time.strftime('%Y-%m-%d %H:%M')}**, {timing}.")
+    if forecasts.attrs["missing_inputs"]:
+        st.caption(f"Inputs not available yet, left to the models as missing values: {', '.join(forecasts.attrs['missing_inputs'])}.")
+
+    # Latest actual values, last day only
+    history = storage.read("merged", columns=["settlement_date"] + list(target_labels), start=last_time - pd.Timedelta(days=1))
+
+    # Forecast for the next period of every target
+    st.markdown("### ⏭️ Next Settlement Period")
+    columns = st.columns(len(target_labels))
+    for col, (target, (title, unit)) in zip(columns, target_labels.items()):
+        next_forecast = forecasts[forecasts["target"] == target].sort_values("settlement_date").iloc[0]
+        delta = next_forecast["prediction"] - history[target].iloc[-1]
+        col.metric(title, f"{next_forecast['prediction']:,.0f} {unit}", f"{delta:+,.0f}", delta_color="off")
+
+    # Actual values and forecasts of one target
+    st.markdown("---")
+    target = st.selectbox("Target", list(target_labels), format_func=lambda name: target_labels[name][0])
+    title, unit = target_labels[target]
+
+    actual = history[["settlement_date", target]].rename(columns={target: "Value"})
+    actual["Type"] = "Actual"
+    predicted = forecasts[forecasts["target"] == target][["settlement_date", "prediction"]].rename(columns={"prediction": "Value"})
+    predicted["Type"] = "Forecast"
+
+    fig = px.line(
+        pd.concat([actual, predicted], ignore_index=True),
+        x="settlement_date",
+        y="Value",
+        color="Type",
+        markers=True,
+        labels={"settlement_date": "Date", "Value": f"{title} ({unit})"},
+        color_discrete_map={"Actual": "white", "Forecast": "orange"}
+    )
+    fig.update_layout(title=title, height=450)
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Forecast table
+    table = forecasts.pivot(index=["settlement_date", "settlement_period", "horizon"], columns="target", values="prediction")
+    st.dataframe(table.reset_index().rename(columns={name: label for name, (label, _) in target_labels.items()}), use_container_width=True)
@@ -7,6 +7,8 @@ from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error, r
 import numpy as np
 import datetime
 
+from utils import predictions
+
 # Test split datetime for demonstration purposes
 split_datetime = pd.to_datetime("2023-05-21 15:00:00") 
 
@@ -15,22 +17,64 @@ script_dir = os.path.dirname(os.path.realpath(__file__))
 data_path = os.path.join(script_dir, "../../data")
 model_prediction_file = "preds_data_up_to_2_days.csv"
 
-@st.cache_data() 
-def get_data_frame():
-    df = pd.read_csv(os.path.join(data_path, model_prediction_file))
-    df.reset_index(inplace=True)
-    print(df.head())
-    df["settlement_date"] = pd.to_datetime(df["settlement_date"])
-    return df
+# Forecast horizons: tab label, column suffix of the predictions and model summary
+horizons = [
+    {"label": "30 Min", "word": "30_min", "R2": [0.9965, 0.9941, 0.9954, 0.9918], "RMSE": [366.8971, 188.9431, 287.2552, 5.6111],
+     "features": ["Demand mean the previous hour.", "Solar generation mean the previous hour.", "Wind generation mean the previous hour.", "Carbon intensity mean the previous hour."]},
+    {"label": "1 Hour", "word": "1_hour", "R2": [0.9927, 0.988, 0.9898, 0.9823], "RMSE": [528.4164, 269.938, 425.9937, 8.2712],
+     "features": ["Demand the previous hour.", "Solar generation the previous hour.", "Wind generation the previous hour.", "Carbon intensity the previous hour."]},
+    {"label": "2 Hours", "word": "2_hour", "R2": [0.9733, 0.9582, 0.9659, 0.9433], "RMSE": [1014.6025, 503.197, 778.5678, 14.7921],
+     "features": ["Demand the previous week.", "Solar generation the previous day.", "Wind mean generation the previous hour.", "Carbon intensity mean the previous hour."]},
+    {"label": "3 Hours", "word": "3_hour"},
+    {"label": "6 Hours", "word": "6_hour"},
+    {"label": "12 Hours", "word": "12_hour"},
+    {"label": "1 Day", "word": "1_day"},
+    {"label": "2 Days", "word": "2_day"},
+]
+
+# Horizons without their own results share the 3 hours summary
+for horizon in horizons[3:]:
+    horizon.update({"R2": [0.9623, 0.9295, 0.9397, 0.9055], "RMSE": [1203.9759, 653.9311, 1035.4401, 19.089],
+                    "features": ["Demand the previous week.", "Solar generation the previous day.", "Wind generation the previous hour.", "Carbon intensity the previous hour."]})
+
+target_cols = ["nd", "solar", "wind", "carbon_intensity"]
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def split_predictions(csv_version):
+    '''Splits the predictions CSV into one file per horizon, again when the CSV changes (csv_version is its modification time).'''
+    return predictions.update(os.path.join(data_path, model_prediction_file))
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def build_figure(word, target, zoom, version):
+    '''
+    Builds the actual vs predicted figure of a horizon and target, cached per data version.
+
+    Only the date, the target and its predictions for the horizon are read, and only the
+    zoomed week when zoom is set.
+
+    Parameters:
+        - word (str): Column suffix of the horizon, e.g. '30_min'.
+        - target (str): Target column.
+        - zoom (bool): Only show the first week of the test set.
+        - version (int): Version of the predictions file of the horizon, from predictions.version.
+
+    Returns:
+        - plotly.graph_objects.Figure: The figure.
+    '''
+
+    if zoom:
+        start, end = split_datetime, split_datetime + pd.Timedelta(days=7)
+    else:
+        start, end = pd.to_datetime("2021-01-01"), None
+
+    df = predictions.read(word, columns=[target, f"{target}_predicted_{word}"], start=start, end=end)
+    return plot_actual_vs_pred(df, target, zoom, word=word)
 
-@st.cache_resource(show_spinner=False)
 def plot_actual_vs_pred(df, target, zoom = False, word="30_min", key = "h"):
 
     chart_df = df[["settlement_date", target, f"{target}_predicted_{word}"]].copy()
 
-    chart_df["Set"] = chart_df["settlement_date"].apply(
-        lambda x: "Test" if x >= split_datetime else "Train"
-    )
+    chart_df["Set"] = np.where(chart_df["settlement_date"] >= split_datetime, "Test", "Train")
 
     chart_df = chart_df.melt(id_vars=["settlement_date", "Set"], 
                              value_vars=[target, f"{target}_predicted_{word}"],
@@ -120,8 +164,6 @@ def plot_actual_vs_pred(df, target, zoom = False, word="30_min", key = "h"):
     fig.update_traces(hovertemplate='%{y:.2f}')
 
     return fig
-    # Show plot in Streamlit
-#    st.plotly_chart(fig, use_container_width=True, key=key)
 
 def show_model_results():
 
@@ -148,301 +190,48 @@ def show_model_results():
         unsafe_allow_html=True
     )
 
-    df = get_data_frame()
+    index = split_predictions(predictions.source_version(os.path.join(data_path, model_prediction_file)))
 
     st.title("Forecast Model Results")
 
     st.write("""
     This page shows the results of our various forecasting models, each of which uses data from a different lookback period:""")
 
-    # Create tabs for each forecast horizon.
-    tabs = st.tabs([
-        "30 Min", "1 Hour", "2 Hours", "3 Hours", "6 Hours", "12 Hours", 
-        "1 Day", "2 Days" 
-    ])
-
-    # In each tab, load or simulate data corresponding to that forecast horizon.
-    # Replace the dummy data and chart code below with your actual model predictions and metrics.
-
-    with tabs[0]:
-        
-        # Create a DataFrame to hold the data
-        data = pd.DataFrame({
-            "Feature": ["National Demand", "Solar Forecast", "Wind Forecast", "Carbon Intensity"],
-            "Model": ["XGBRegressor", "XGBRegressor", "XGBRegressor", "XGBRegressor"],
-            "R2": [0.9965, 0.9941, 0.9954, 0.9918],
-            "RMSE": [366.8971, 188.9431, 287.2552, 5.6111],
-            "Most Important Features": [
-            "Demand mean the previous hour.",
-            "Solar generation mean the previous hour.",
-            "Wind generation mean the previous hour.",
-            "Carbon intensity mean the previous hour."
-            ]
-        })
-
-        # Display the table
-        #st.markdown("### Model Results Summary")
-        #st.table(data)
-
-        st.markdown("### Forecast")
-        
-        # Generate predictions
-        target_cols = ["nd", "solar", "wind", "carbon_intensity"]
-        df = df[df["settlement_date"] >= pd.to_datetime("2021-01-01")]
-
-        # Simulate predictions for the last 30 minutes
-        for target in target_cols:
-            fig = plot_actual_vs_pred(df, target, False, word="30_min", key=f"1_{target}")
-            st.plotly_chart(fig, use_container_width=True, key=f"1_{target}")
-
-            one_week_df = df[
-                (df["settlement_date"] >= split_datetime) &
-                (df["settlement_date"] < split_datetime + pd.Timedelta(days=7))
-            ]
-            fig = plot_actual_vs_pred(one_week_df, target, True, word="30_min", key = f"11_{target}")
-            st.plotly_chart(fig, use_container_width=True, key=f"11_{target}")
-
-    with tabs[1]:
-        # Create a DataFrame to hold the data
-        data = pd.DataFrame({
-            "Feature": ["National Demand", "Solar Forecast", "Wind Forecast", "Carbon Intensity"],
-            "Model": ["XGBRegressor", "XGBRegressor", "XGBRegressor", "XGBRegressor"],
-            "R2": [0.9927, 0.988, 0.9898, 0.9823],
-            "RMSE": [528.4164, 269.938, 425.9937, 8.2712],
-            "Most Important Features": [
-            "Demand the previous hour.",
-            "Solar generation the previous hour.",
-            "Wind generation the previous hour.",
-            "Carbon intensity the previous hour."
-            ]
-        })
-
-        # Display the table
-        #st.markdown("### Model Results Summary")
-        #st.table(data)
-
-        st.markdown("### Forecast")
-        
-
-        # Generate predictions
-        target_cols = ["nd", "solar", "wind", "carbon_intensity"]
-     
-        # Simulate predictions for the last 30 minutes
-        for target in target_cols:
-            fig = plot_actual_vs_pred(df, target, False, word="1_hour", key = f"22_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"22_{target}")
-            one_week_df = df[
-                (df["settlement_date"] >= split_datetime) &
-                (df["settlement_date"] < split_datetime + pd.Timedelta(days=7))
-            ]
-            fig = plot_actual_vs_pred(one_week_df, target, True, word="1_hour", key = f"2_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"2_{target}")
-    with tabs[2]:
-        # Create a DataFrame to hold the data
-        data = pd.DataFrame({
-            "Feature": ["National Demand", "Solar Forecast", "Wind Forecast", "Carbon Intensity"],
-            "Model": ["XGBRegressor", "XGBRegressor", "XGBRegressor", "XGBRegressor"],
-            "R2": [0.9733, 0.9582, 0.9659, 0.9433],
-            "RMSE": [1014.6025, 503.197, 778.5678, 14.7921],
-            "Most Important Features": [
-            "Demand the previous week.",
-            "Solar generation the previous day.",
-            "Wind mean generation the previous hour.",
-            "Carbon intensity mean the previous hour."
-            ]
-        })
-
-        # Display the table
-        #st.markdown("### Model Results Summary")
-        #st.table(data)
-
-        st.markdown("### Forecast")
-        
-        # Generate predictions
-        target_cols = ["nd", "solar", "wind", "carbon_intensity"]
-     
-        # Simulate predictions for the last 30 minutes
-        for target in target_cols:
-            fig = plot_actual_vs_pred(df, target, False, word="2_hour", key = f"3_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"3_{target}")
-            one_week_df = df[
-                (df["settlement_date"] >= split_datetime) &
-                (df["settlement_date"] < split_datetime + pd.Timedelta(days=7))
-            ]
-            fig = plot_actual_vs_pred(one_week_df, target, True, word="2_hour", key = f"31_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"31_{target}")
-
-    with tabs[3]:
-        # Create a DataFrame to hold the data
-        data = pd.DataFrame({
-            "Feature": ["National Demand", "Solar Forecast", "Wind Forecast", "Carbon Intensity"],
-            "Model": ["XGBRegressor", "XGBRegressor", "XGBRegressor", "XGBRegressor"],
-            "R2": [0.9623, 0.9295, 0.9397, 0.9055],
-            "RMSE": [1203.9759, 653.9311, 1035.4401, 19.089],
-            "Most Important Features": [
-            "Demand the previous week.",
-            "Solar generation the previous day.",
-            "Wind generation the previous hour.",
-            "Carbon intensity the previous hour."
-            ]
-        })
-
-        # Display the table
-        #st.markdown("### Model Results Summary")
-        #st.table(data)
-
-        st.markdown("### Forecast")
-        
-        # Generate predictions
-        target_cols = ["nd", "solar", "wind", "carbon_intensity"]
-     
-        # Simulate predictions for the last 30 minutes
-        for target in target_cols:
-            fig = plot_actual_vs_pred(df, target, False, word="3_hour", key = f"4_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"4_{target}")
-            one_week_df = df[
-                (df["settlement_date"] >= split_datetime) &
-                (df["settlement_date"] < split_datetime + pd.Timedelta(days=7))
-            ]
-            fig = plot_actual_vs_pred(one_week_df, target, True, word="3_hour", key = f"41_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"41_{target}")
-
-    with tabs[4]:
-        # Create a DataFrame to hold the data
-        data = pd.DataFrame({
-            "Feature": ["National Demand", "Solar Forecast", "Wind Forecast", "Carbon Intensity"],
-            "Model": ["XGBRegressor", "XGBRegressor", "XGBRegressor", "XGBRegressor"],
-            "R2": [0.9623, 0.9295, 0.9397, 0.9055],
-            "RMSE": [1203.9759, 653.9311, 1035.4401, 19.089],
-            "Most Important Features": [
-            "Demand the previous week.",
-            "Solar generation the previous day.",
-            "Wind generation the previous hour.",
-            "Carbon intensity the previous hour."
-            ]
-        })
-
-        # Display the table
-        #st.markdown("### Model Results Summary")
-        #st.table(data)
-
-        st.markdown("### Forecast")
-        
-        # Generate predictions
-        target_cols = ["nd", "solar", "wind", "carbon_intensity"]
-     
-        # Simulate predictions for the last 30 minutes
-        for target in target_cols:
-            fig = plot_actual_vs_pred(df, target, False, word="6_hour", key = f"6_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"6_{target}")
-            one_week_df = df[
-                (df["settlement_date"] >= split_datetime) &
-                (df["settlement_date"] < split_datetime + pd.Timedelta(days=7))
-            ]
-            fig = plot_actual_vs_pred(one_week_df, target, True, word="6_hour", key = f"61_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"61_{target}")
-    with tabs[5]:
-        # Create a DataFrame to hold the data
-        data = pd.DataFrame({
-            "Feature": ["National Demand", "Solar Forecast", "Wind Forecast", "Carbon Intensity"],
-            "Model": ["XGBRegressor", "XGBRegressor", "XGBRegressor", "XGBRegressor"],
-            "R2": [0.9623, 0.9295, 0.9397, 0.9055],
-            "RMSE": [1203.9759, 653.9311, 1035.4401, 19.089],
-            "Most Important Features": [
-            "Demand the previous week.",
-            "Solar generation the previous day.",
-            "Wind generation the previous hour.",
-            "Carbon intensity the previous hour."
-            ]
-        })
-
-        # Display the table
-        #st.markdown("### Model Results Summary")
-        #st.table(data)
-
-        st.markdown("### Forecast")
-        
-        # Generate predictions
-        target_cols = ["nd", "solar", "wind", "carbon_intensity"]
-     
-        # Simulate predictions for the last 30 minutes
-        for target in target_cols:
-            fig = plot_actual_vs_pred(df, target, False, word="12_hour", key = f"12_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"12_{target}")
-            one_week_df = df[
-                (df["settlement_date"] >= split_datetime) &
-                (df["settlement_date"] < split_datetime + pd.Timedelta(days=7))
-            ]
-            fig = plot_actual_vs_pred(one_week_df, target, True, word="12_hour", key = f"121_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"121_{target}")
-    with tabs[6]:
-        # Create a DataFrame to hold the data
-        data = pd.DataFrame({
-            "Feature": ["National Demand", "Solar Forecast", "Wind Forecast", "Carbon Intensity"],
-            "Model": ["XGBRegressor", "XGBRegressor", "XGBRegressor", "XGBRegressor"],
-            "R2": [0.9623, 0.9295, 0.9397, 0.9055],
-            "RMSE": [1203.9759, 653.9311, 1035.4401, 19.089],
-            "Most Important Features": [
-            "Demand the previous week.",
-            "Solar generation the previous day.",
-            "Wind generation the previous hour.",
-            "Carbon intensity the previous hour."
-            ]
-        })
-
-        # Display the table
-        #st.markdown("### Model Results Summary")
-        #st.table(data)
-
-        st.markdown("### Forecast")
-        
-        # Generate predictions
-        target_cols = ["nd", "solar", "wind", "carbon_intensity"]
-     
-        # Simulate predictions for the last 30 minutes
-        for target in target_cols:
-            fig = plot_actual_vs_pred(df, target, False, word="1_day", key =f"1110_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"1110_{target}")
-            one_week_df = df[
-                (df["settlement_date"] >= split_datetime) &
-                (df["settlement_date"] < split_datetime + pd.Timedelta(days=7))
-            ]
-            fig = plot_actual_vs_pred(one_week_df, target, True, word="1_day", key = f"111_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"111_{target}")
-    with tabs[7]:
-        # Create a DataFrame to hold the data
-        data = pd.DataFrame({
-            "Feature": ["National Demand", "Solar Forecast", "Wind Forecast", "Carbon Intensity"],
-            "Model": ["XGBRegressor", "XGBRegressor", "XGBRegressor", "XGBRegressor"],
-            "R2": [0.9623, 0.9295, 0.9397, 0.9055],
-            "RMSE": [1203.9759, 653.9311, 1035.4401, 19.089],
-            "Most Important Features": [
-            "Demand the previous week.",
-            "Solar generation the previous day.",
-            "Wind generation the previous hour.",
-            "Carbon intensity the previous hour."
-            ]
-        })
-
-        # Display the table
-        #st.markdown("### Model Results Summary")
-        #st.table(data)
-
-        st.markdown("### Forecast")
-        
-        # Generate predictions
-        target_cols = ["nd", "solar", "wind", "carbon_intensity"]
-     
-        # Simulate predictions for the last 30 minutes
-        for target in target_cols:
-            fig = plot_actual_vs_pred(df, target, False, word="2_day", key = f"222_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"222_{target}")
-            one_week_df = df[
-                (df["settlement_date"] >= split_datetime) &
-                (df["settlement_date"] < split_datetime + pd.Timedelta(days=7))
-            ]
-            fig =plot_actual_vs_pred(one_week_df, target, True, word="1_day", key = f"2220_{target}")
-            st.plotly_chart(fig, use_container_width=True, key = f"2220_{target}")
+    # One tab per forecast horizon, only the figures of the selected one are built
+    labels = [horizon["label"] for horizon in horizons]
+    selected = st.radio("Forecast horizon", labels, horizontal=True, label_visibility="collapsed")
+    horizon = horizons[labels.index(selected)]
+
+    # Create a DataFrame to hold the data
+    data = pd.DataFrame({
+        "Feature": ["National Demand", "Solar Forecast", "Wind Forecast", "Carbon Intensity"],
+        "Model": ["XGBRegressor", "XGBRegressor", "XGBRegressor", "XGBRegressor"],
+        "R2": horizon["R2"],
+        "RMSE": horizon["RMSE"],
+        "Most Important Features": horizon["features"]
+    })
+
+    # Display the table
+    #st.markdown("### Model Results Summary")
+    #st.table(data)
+
+    st.markdown("### Forecast")
+
+    if horizon["word"] not in index:
+        st.info("No predictions available for this horizon.")
+        return
+
+    info = index[horizon["word"]]
+    st.caption(f"{info.get('predicted_rows', info['rows']):,} predictions from {info['start'][:10]} to {info['end'][:10]}.")
+
+    version = predictions.version(horizon["word"])
+    for target in target_cols:
+        fig = build_figure(horizon["word"], target, False, version)
+        st.plotly_chart(fig, use_container_width=True, key=f"{horizon['word']}_{target}")
+
+        fig = build_figure(horizon["word"], target, True, version)
+        st.plotly_chart(fig, use_container_width=True, key=f"{horizon['word']}_{target}_zoom")
+
     st.markdown("---")
     st.write("### Model: CatBoostRegressor")
     st.write("R2 vatiates between 0.99 and 0.6 for all models.")
@@ -4,7 +4,6 @@ from streamlit_option_menu import option_menu
 
 # Standard Libraries
 import os
-import pickle
 
 # Data Libraries
 import pandas as pd
@@ -15,18 +14,17 @@ import _pages.data_eda as eda
 import _pages.forecast as fore
 import _pages.model_results as ml
 
-# Custom API
-from data_collection import API as api
+# Background data refresh
+from data_collection import refresher
 
 # Paths
 script_dir = os.path.dirname(os.path.realpath(__file__))
 data_path = os.path.join(script_dir, "../data")
 models_path = os.path.join(script_dir, "./models")
 
-# Only run update once per session
-if 'script_ran' not in st.session_state:
-    api.update_database()
-    st.session_state.script_ran = True
+# Refresh the data in the background, one thread per process shared by all sessions. Called
+# on every run so the thread is restarted if it ever stops
+refresher.start_background_refresh()
 
 def main():
     st.set_page_config(page_title="EcoWatt Assistant", layout="wide", page_icon="💡", initial_sidebar_state="collapsed")
@@ -44,7 +42,7 @@ def main():
     with st.sidebar:
         selected = option_menu(
             menu_title=None, 
-            options=["Home", "Historical Demand Data", "Forecast Model Results"], 
+            options=["Home", "Historical Demand Data", "Forecasts", "Forecast Model Results"], 
             icons=['house', 'info-circle', 'bar-chart', 'robot'], 
             menu_icon="robot", 
             default_index=0,
@@ -63,8 +61,8 @@ def main():
     elif selected == "Historical Demand Data":
         eda.data_eda_page()
 
-    #elif selected == "Forecasts":
-    #    st.write("Please enter your OpenAI API Key in the sidebar to continue...")
+    elif selected == "Forecasts":
+        fore.forecast_page()
 
     elif selected == "Forecast Model Results":
         #ml.show_model_results()
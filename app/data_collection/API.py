@@ -3,22 +3,18 @@ import pandas as pd
 import os
 import glob
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from utils import data_cleaning as dc
+from utils import storage
+from utils import rollups
+from utils import weather
+from utils import weather_aggregates
 
-bank_holidays = ['01-01-2019', '19-04-2019', '22-04-2019', '06-05-2019', '27-05-2019',
-                '26-08-2019', '25-12-2019', '26-12-2019', '01-01-2020', '10-04-2020',
-                '13-04-2020', '08-05-2020', '25-05-2020', '31-08-2020', '25-12-2020',
-                '28-12-2020', '01-01-2021', '02-04-2021', '05-04-2021', '03-05-2021',
-                '31-05-2021', '30-08-2021', '27-12-2021', '28-12-2021','03-01-2022', 
-                '15-04-2022', '18-04-2022', '02-05-2022', '03-06-2022', '29-08-2022',
-                '26-12-2022', '27-12-2022', '02-01-2023', '07-04-2023', '10-04-2023', 
-                '01-05-2023', '08-05-2023', '29-05-2023', '28-08-2023', '25-12-2023',
-                '26-12-2023', '01-01-2024', '29-03-2024', '01-04-2024', '06-05-2024',
-                '27-05-2024', '26-08-2024', '25-12-2024', '26-12-2024', '01-01-2025',
-                '18-04-2025', '21-04-2025', '05-05-2025', '26-05-2025', '25-08-2025',
-                '25-12-2025', '26-12-2025', '01-01-2026', '03-04-2026', '06-04-2026',
-                '04-05-2026', '25-05-2026', '31-08-2026', '25-12-2026', '28-12-2026']
+from data_collection import profiler
 
 # Project directories
 script_dir = os.path.dirname(os.path.realpath(__file__))
@@ -29,37 +25,365 @@ uk_demand_path = os.path.join(demand_path, "uk")
 # Carbon mix data path
 carbon_mix_path = os.path.join(data_path, "carbon_intensity")
 uk_carbon_mix_path = os.path.join(carbon_mix_path, "uk")
-
-def collect_data(resource_id, SELECTED_COLUMNS, order_by):
+# Files kept for the CSV export
+csv_files = {
+  "demand": os.path.join(data_path, "uk_demand_merged_update.csv"),
+  "carbon_mix": os.path.join(data_path, "carbon_and_mix_update.csv"),
+  "merged": os.path.join(data_path, "data_uk_merged_generation_demand_update.csv"),
+}
+# Also write the datasets as CSV after each update
+export_csv = os.environ.get("ECOWATT_EXPORT_CSV", "0") == "1"
+# Backfill checkpoints
+checkpoint_path = os.path.join(data_path, ".backfill")
+
+# NESO datastore endpoint, can be pointed to a local stand-in
+api_url = os.environ.get("NESO_API_URL", "https://api.neso.energy/api/3/action/datastore_search_sql")
+
+# Open-Meteo archive endpoint, can be pointed to a local stand-in
+weather_url = os.environ.get("OPEN_METEO_URL", "https://archive-api.open-meteo.com/v1/archive")
+# Local Open-Meteo CSV file (one or several locations), read instead of the API when set
+weather_file = os.environ.get("OPEN_METEO_FILE")
+# First day of weather fetched when the weather dataset is empty
+weather_start_date = "2019-01-01"
+
+# Connect and read timeouts (seconds) for every request
+request_timeout = (5, 60)
+
+# Retries for failed requests, waiting 1s, 2s, 4s... between attempts
+max_retries = 4
+retry_backoff = 1.0
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+  '''
+  Returns the HTTP session shared by all the feeds.
+
+  The session keeps the connections to the NESO API alive between pages and feeds, and
+  retries connection errors and 429/5xx responses with exponential backoff.
+
+  Returns:
+      - requests.Session: The shared session.
+  '''
+  global _session
+  with _session_lock:
+    if _session is None:
+      retry = Retry(total=max_retries, backoff_factor=retry_backoff,
+                    status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+      adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=8)
+      session = requests.Session()
+      session.mount("https://", adapter)
+      session.mount("http://", adapter)
+      _session = session
+  return _session
+
+def _sql_literal(value):
+  # Quote a watermark value for the datastore SQL query
+  if isinstance(value, (int, float)):
+    return str(value)
+  return "'" + str(value).replace("'", "''") + "'"
+
+def _keyset_condition(key_columns, watermark):
+  # Row-value comparison so the whole key is used, e.g. (date, period) > ('2025-04-01', 12)
+  if watermark is None:
+    return ""
+  columns = ", ".join(key_columns)
+  values = ", ".join(_sql_literal(value) for value in watermark)
+  if len(key_columns) == 1:
+    return f"WHERE {columns} > {values}"
+  return f"WHERE ({columns}) > ({values})"
+
+def _checkpoint_paths(checkpoint):
+  return (os.path.join(checkpoint_path, f"{checkpoint}.json"),
+          os.path.join(checkpoint_path, f"{checkpoint}.csv"))
+
+def load_checkpoint(checkpoint, resource_id):
+  '''
+  Loads the progress of an interrupted backfill.
+
+  Parameters:
+      - checkpoint (str): Name of the checkpoint.
+      - resource_id (str): NESO resource the checkpoint must belong to.
+
+  Returns:
+      - tuple: (watermark or None, pd.DataFrame with the rows already fetched).
+  '''
+  state_file, rows_file = _checkpoint_paths(checkpoint)
+  if not os.path.exists(state_file):
+    return None, pd.DataFrame()
+
+  with open(state_file) as f:
+    state = json.load(f)
+  if state.get("resource_id") != resource_id or not os.path.exists(rows_file):
+    clear_checkpoint(checkpoint)
+    return None, pd.DataFrame()
+
+  print(f"Resuming backfill '{checkpoint}' after {state['watermark']} ({state['rows']} rows already fetched)")
+  return tuple(state["watermark"]), pd.read_csv(rows_file)
+
+def save_checkpoint(checkpoint, resource_id, watermark, page, rows):
+  '''
+  Appends a fetched page to the staging file and records the new watermark.
+
+  Parameters:
+      - checkpoint (str): Name of the checkpoint.
+      - resource_id (str): NESO resource being fetched.
+      - watermark (tuple): Key of the last fetched row.
+      - page (pd.DataFrame): Rows of the page just fetched.
+      - rows (int): Total number of rows fetched so far.
+  '''
+  os.makedirs(checkpoint_path, exist_ok=True)
+  state_file, rows_file = _checkpoint_paths(checkpoint)
+
+  page.to_csv(rows_file, mode="a", header=not os.path.exists(rows_file), index=False)
+
+  # Write the state atomically so a crash never leaves a truncated checkpoint
+  tmp_file = state_file + ".tmp"
+  with open(tmp_file, "w") as f:
+    json.dump({"resource_id": resource_id, "watermark": list(watermark), "rows": rows}, f)
+  os.replace(tmp_file, state_file)
+
+def clear_checkpoint(checkpoint):
+  '''Removes the checkpoint once the fetched rows have been stored.'''
+  for path in _checkpoint_paths(checkpoint):
+    if os.path.exists(path):
+      os.remove(path)
+
+def collect_data(resource_id, SELECTED_COLUMNS, key_columns, watermark=None, page_size=10000, checkpoint=None):
+  '''
+  Fetches all the rows of a NESO resource newer than the watermark using keyset pagination.
+
+  Each page asks for the rows whose key is greater than the last key seen, so the query
+  cost does not grow with the offset and nothing is cut off by a fixed LIMIT. When a
+  checkpoint name is given, every page is staged on disk and an interrupted backfill
+  resumes from the last stored key on the next call.
+
+  Parameters:
+      - resource_id (str): NESO datastore resource id.
+      - SELECTED_COLUMNS (str): Columns to select in the SQL query.
+      - key_columns (list): Quoted key columns, e.g. ['"SETTLEMENT_DATE"', '"SETTLEMENT_PERIOD"'].
+      - watermark (tuple, optional): Key of the last stored row. Only newer rows are fetched.
+      - page_size (int): Number of rows per request.
+      - checkpoint (str, optional): Name used to checkpoint the progress.
+
+  Returns:
+      - tuple: (pd.DataFrame with the new rows, True if the fetch completed).
+  '''
+
+  pages = []
+  rows = 0
+  if checkpoint is not None:
+    resumed_watermark, resumed = load_checkpoint(checkpoint, resource_id)
+    if resumed_watermark is not None:
+      watermark = resumed_watermark
+      pages.append(resumed)
+      rows = len(resumed)
+
+  # Key columns as they appear in the returned records
+  record_keys = [column.strip('"') for column in key_columns]
 
   try:
-    url = 'https://api.neso.energy/api/3/action/datastore_search_sql'
-    
-    sql = f'''
-          SELECT 
-            {SELECTED_COLUMNS}
-          FROM "{resource_id}" 
-          ORDER BY {order_by}
-          LIMIT 10000
-          '''
-    
-    params = {'sql': sql}
-
-    response = requests.get(url, params=params)
-    print("Response status code:", response.status_code)
-    data = response.json()
-    df = pd.DataFrame(data['result']['records'])
+    while True:
+      sql = f'''
+            SELECT 
+              {SELECTED_COLUMNS}
+            FROM "{resource_id}" 
+            {_keyset_condition(key_columns, watermark)}
+            ORDER BY {", ".join(f"{column} ASC" for column in key_columns)}
+            LIMIT {page_size}
+            '''
+      
+      params = {'sql': sql}
+
+      response = get_session().get(api_url, params=params, timeout=request_timeout)
+      print("Response status code:", response.status_code)
+      response.raise_for_status()
+      profiler.count("bytes_fetched", len(response.content))
+      data = response.json()
+      page = pd.DataFrame(data['result']['records'])
+
+      if len(page) == 0:
+        break
+
+      pages.append(page)
+      rows += len(page)
+      last_record = data['result']['records'][-1]
+      watermark = tuple(last_record[key] for key in record_keys)
+
+      if checkpoint is not None:
+        save_checkpoint(checkpoint, resource_id, watermark, page, rows)
+
+      if len(page) < page_size:
+        break
+
+    if len(pages) == 0:
+      return pd.DataFrame(), True
+
+    df = pd.concat(pages, ignore_index=True)
+
+    # A page fetched again after a crash between staging and checkpointing is dropped here
+    df = df.drop_duplicates(subset=record_keys, keep="last").reset_index(drop=True)
 
     return df, True
   except Exception as e:
     print("Error during API request or JSON parsing:", e)
     return pd.DataFrame(), False
-  
+
+def migrate_csv_to_store():
+  '''Loads the existing CSV files into the columnar store the first time it is used.'''
+  for name, file in csv_files.items():
+    if not storage.exists(name) and os.path.exists(file):
+      print(f"Importing {os.path.basename(file)} into the store")
+      storage.import_csv(file, name)
+
+def demand_watermark():
+  # Last stored demand period, as it is compared in the datastore
+  last = storage.last_settlement("demand")
+  if last is None:
+    return None
+  return (last[0].strftime("%Y-%m-%d"), last[1])
+
+def carbon_mix_watermark():
+  # Start of the last stored carbon mix period
+  last = storage.last_settlement("carbon_mix")
+  if last is None:
+    return None
+  last_datetime = last[0] + pd.Timedelta(minutes=30 * (last[1] - 1))
+  return (last_datetime.strftime("%Y-%m-%dT%H:%M:%S"),)
+
+# NESO feeds collected on every update
+feeds = {
+  "demand": {
+    "resource_id": "177f6fa4-ae49-4182-81ea-0c6b35f26ca6",
+    "columns": '''"SETTLEMENT_DATE", "SETTLEMENT_PERIOD", "ND", "TSD", "FORECAST_ACTUAL_INDICATOR"''',
+    "key_columns": ['"SETTLEMENT_DATE"', '"SETTLEMENT_PERIOD"'],
+    "watermark": demand_watermark,
+  },
+  "carbon_mix": {
+    "resource_id": "f93d1835-75bc-43e5-84ad-12472b180a98",
+    "columns": "*",
+    "key_columns": ['"DATETIME"'],
+    "watermark": carbon_mix_watermark,
+  },
+}
+
+def fetch_feeds(feeds):
+  '''
+  Collects several NESO feeds concurrently.
+
+  Each feed is fetched in its own thread over the shared session, so the total time is
+  the one of the slowest feed instead of the sum of all of them.
+
+  Parameters:
+      - feeds (dict): Feed name -> dict with resource_id, columns, key_columns and watermark.
+
+  Returns:
+      - dict: Feed name -> (pd.DataFrame with the new rows, True if the fetch completed).
+  '''
+
+  def fetch(name):
+    feed = feeds[name]
+    return collect_data(feed["resource_id"], feed["columns"], feed["key_columns"],
+                        feed["watermark"](), checkpoint=name)
+
+  with ThreadPoolExecutor(max_workers=len(feeds)) as executor:
+    # In a copy of the context, so the bytes fetched are counted in the running refresh
+    futures = {name: profiler.run_in_context(executor, fetch, name) for name in feeds}
+    return {name: future.result() for name, future in futures.items()}
+
+def weather_watermark():
+  # Day of the last stored weather period, fetched again as the archive revises its latest hours
+  last = storage.last_settlement("weather")
+  if last is None:
+    return pd.Timestamp(weather_start_date)
+  return last[0].normalize() - pd.Timedelta(days=1)
+
+def collect_weather(start):
+  '''
+  Fetches the hourly weather of every location from a start day, in one request.
+
+  The data comes from the Open-Meteo archive API as CSV, or from the local Open-Meteo CSV
+  file set in OPEN_METEO_FILE.
+
+  Parameters:
+      - start (pd.Timestamp): First day to fetch.
+
+  Returns:
+      - tuple: (pd.DataFrame with location, time (UTC) and the variables, True if the fetch completed).
+  '''
+
+  locations = weather.load_locations()
+  names = list(locations.index)
+  try:
+    if weather_file:
+      data = weather.read_open_meteo_csv(weather_file, locations=locations)
+      profiler.count("bytes_fetched", os.path.getsize(weather_file))
+      data = data[data["time"] >= start].reset_index(drop=True)
+    else:
+      params = {
+        "latitude": ",".join(str(lat) for lat in locations["latitude"]),
+        "longitude": ",".join(str(lon) for lon in locations["longitude"]),
+        "hourly": ",".join(weather.hourly_variables),
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": pd.Timestamp.now(tz="UTC").strftime("%Y-%m-%d"),
+        "timezone": "GMT",
+        "format": "csv",
+      }
+      response = get_session().get(weather_url, params=params, timeout=request_timeout)
+      print("Response status code:", response.status_code)
+      response.raise_for_status()
+      profiler.count("bytes_fetched", len(response.content))
+      data = weather.read_open_meteo_csv(response.text, names=names)
+
+    # The archive leaves the hours it does not have yet empty
+    variables = [col for col in data.columns if col not in ("location", "time")]
+    data = data.dropna(subset=variables, how="all").reset_index(drop=True)
+    return data, True
+  except Exception as e:
+    print("Error during weather request or CSV parsing:", e)
+    return pd.DataFrame(), False
+
+def filter_weather_data_update(dataframe):
+  '''
+  Cleans the fetched weather, aligns it to settlement periods and writes it to the store.
+
+  Parameters:
+      - dataframe (pd.DataFrame): Hourly weather from collect_weather.
+
+  Returns:
+      - pd.DataFrame: The settlement periods written, one row per period and location.
+  '''
+
+  if len(dataframe) == 0:
+    print("No new weather data to update.")
+    return dataframe
+
+  # Remove duplicated hours and fill the missing ones of each location
+  weather_update = weather.clean(dataframe)
+
+  # Hourly values -> settlement periods, in UK time
+  weather_update = weather.align_to_settlement_periods(weather_update)
+
+  # Only the monthly partitions of the fetched days are rewritten
+  with profiler.stage("weather.write") as stage:
+    storage.upsert(weather_update, "weather", keys=weather.KEY_COLUMNS)
+    stage["rows"] = len(weather_update)
+
+  print(f"Stored {len(weather_update)} weather periods for {weather_update['location'].nunique()} locations.")
+
+  # Capacity-weighted national features of the same periods
+  with profiler.stage("weather.national") as stage:
+    stage["rows"] = len(weather_aggregates.update(weather_update))
+
+  return weather_update
+
 def filter_demand_data_update(dataframe):
 
-  # Load the existing merged data
-  uk_demand_merged = pd.read_csv(os.path.join(data_path, "uk_demand_merged_update.csv"))
-  
+  if len(dataframe) == 0:
+    print("No new data to update.")
+    return dataframe
+
   # Copy the new data to avoid modifying the original dataframe
   df = dataframe.copy()
 
@@ -71,18 +395,18 @@ def filter_demand_data_update(dataframe):
 
   # Convert to datetime format
   uk_demand_update_cleaned = dc.convert_to_datetime(uk_demand_update_cleaned, columns=["settlement_date"]) 
-  uk_demand_merged = dc.convert_to_datetime(uk_demand_merged, columns=["settlement_date"])
 
   # Filter the data to include only the last updates
   uk_demand_update_cleaned = uk_demand_update_cleaned[(uk_demand_update_cleaned["forecast_actual_indicator"] == "A") & (uk_demand_update_cleaned["tsd"] > 500)]
 
-  last_date = uk_demand_merged["settlement_date"].max()
-  last_settlement_period = uk_demand_merged[uk_demand_merged["settlement_date"] == last_date]["settlement_period"].max()
+  # Last period already stored
+  last_date, last_settlement_period = storage.last_settlement("demand") or (pd.Timestamp.min, 48)
 
   if last_settlement_period < 48:
       uk_demand_update_cleaned = uk_demand_update_cleaned[
-          (uk_demand_update_cleaned["settlement_date"] == last_date) & 
-          (uk_demand_update_cleaned["settlement_period"] > last_settlement_period)
+          ((uk_demand_update_cleaned["settlement_date"] == last_date) & 
+           (uk_demand_update_cleaned["settlement_period"] > last_settlement_period)) |
+          (uk_demand_update_cleaned["settlement_date"] > last_date)
       ]
   else:
       uk_demand_update_cleaned = uk_demand_update_cleaned[
@@ -91,30 +415,30 @@ def filter_demand_data_update(dataframe):
   
   if len(uk_demand_update_cleaned) == 0:
     print("No new data to update.")
-    return uk_demand_merged
+    return uk_demand_update_cleaned
   else:
     print("New data available for update.")
     
     # Drop the forecast_actual_indicator column
     uk_demand_update_cleaned = uk_demand_update_cleaned.drop(columns=["forecast_actual_indicator"])
 
-    # Add holiday column
-    uk_demand_update_cleaned = dc.add_holiday_column(uk_demand_update_cleaned, bank_holidays) 
+    # Add holiday column, from the England and Wales calendar
+    uk_demand_update_cleaned = dc.add_holiday_column(uk_demand_update_cleaned)
 
-    # Concatenate the new data with the existing data
-    uk_demand_merged_update = pd.concat([uk_demand_merged, uk_demand_update_cleaned], ignore_index=True)
-    
-    # Rewrite the existing file with the new data
-    uk_demand_merged_update = uk_demand_merged_update.sort_values(by=["settlement_date", "settlement_period"])
-    uk_demand_merged_update = uk_demand_merged_update.reset_index(drop=True)
-    uk_demand_merged_update.to_csv(os.path.join(data_path, "uk_demand_merged_update.csv"), index=False)
+    # Append the new periods to the store, only their monthly partitions are rewritten
+    uk_demand_update_cleaned = uk_demand_update_cleaned.sort_values(by=["settlement_date", "settlement_period"])
+    uk_demand_update_cleaned = uk_demand_update_cleaned.reset_index(drop=True)
+    with profiler.stage("demand.write") as stage:
+      storage.upsert(uk_demand_update_cleaned, "demand")
+      stage["rows"] = len(uk_demand_update_cleaned)
 
-    return uk_demand_merged_update
+    return uk_demand_update_cleaned
 
 def filter_carbon_data_update(dataframe):
 
-  # Load the existing data
-  carbon_mix = pd.read_csv(os.path.join(data_path, "carbon_and_mix_update.csv"))
+  if len(dataframe) == 0:
+    print("No new data to update.")
+    return dataframe
   
   # Copy the new data to avoid modifying the original dataframe
   df = dataframe.copy()
@@ -126,7 +450,6 @@ def filter_carbon_data_update(dataframe):
   carbon_mix_update = dc.snake(df)
 
   # Convert to datetime format
-  carbon_mix = dc.convert_to_datetime(carbon_mix, columns=["settlement_date"])
   carbon_mix_update = dc.convert_to_datetime(carbon_mix_update, columns=["datetime"]) 
 
   # Drop the generation_perc column
@@ -139,9 +462,8 @@ def filter_carbon_data_update(dataframe):
   carbon_mix_update_cleaned = dc.extract_settlement_period_and_date(carbon_mix_update_cleaned, "datetime")
 
   # Filter the data to include only the last updates
-  last_date = carbon_mix["settlement_date"].max()
+  last_date, last_settlement_period = storage.last_settlement("carbon_mix") or (pd.Timestamp.min, 48)
   print("Last date:", last_date)
-  last_settlement_period = carbon_mix[carbon_mix["settlement_date"] == last_date]["settlement_period"].max()
   print("Last settlement period:", last_settlement_period)
 
   if last_settlement_period < 48:
@@ -158,7 +480,7 @@ def filter_carbon_data_update(dataframe):
   
   if len(carbon_mix_update_cleaned) == 0:
     print("No new data to update.")
-    return carbon_mix
+    return carbon_mix_update_cleaned
   else:
     print("New data available for update.")
 
@@ -178,42 +500,79 @@ def filter_carbon_data_update(dataframe):
     # Add carbon columns
     carbon_mix_update_cleaned = dc.create_carbon_columns(carbon_mix_update_cleaned)
 
-    # Concatenate the new data with the existing data
+    # Keep the stored columns
     carbon_mix_update_cleaned = carbon_mix_update_cleaned[numeric_columns + ["settlement_date", "settlement_period", "low_vs_fossil", 
                                                                              "zero_vs_fossil", "renewable_vs_fossil", "green_score"]]
-    
-    carbon_mix_update_cleaned_merge = pd.concat([carbon_mix, carbon_mix_update_cleaned], ignore_index=True)
 
-    # Rewrite the existing file with the new data
-    carbon_mix_update_cleaned_merge = carbon_mix_update_cleaned_merge.sort_values(by=["settlement_date", "settlement_period"])
-    carbon_mix_update_cleaned_merge = carbon_mix_update_cleaned_merge.reset_index(drop=True)
-    carbon_mix_update_cleaned_merge.to_csv(os.path.join(data_path, "carbon_and_mix_update.csv"), index=False)
+    # Append the new periods to the store, only their monthly partitions are rewritten
+    carbon_mix_update_cleaned = carbon_mix_update_cleaned.sort_values(by=["settlement_date", "settlement_period"])
+    carbon_mix_update_cleaned = carbon_mix_update_cleaned.reset_index(drop=True)
+    with profiler.stage("carbon_mix.write") as stage:
+      storage.upsert(carbon_mix_update_cleaned, "carbon_mix")
+      stage["rows"] = len(carbon_mix_update_cleaned)
 
-    return carbon_mix_update_cleaned_merge
+    return carbon_mix_update_cleaned
 
-def update_database():
-  # Collect the data for demand
-  resource_id = "177f6fa4-ae49-4182-81ea-0c6b35f26ca6"
-  SELECTED_COLUMNS = '''"SETTLEMENT_DATE", "SETTLEMENT_PERIOD", "ND", "TSD", "FORECAST_ACTUAL_INDICATOR"'''
-  order_by = '''"SETTLEMENT_DATE" ASC, "SETTLEMENT_PERIOD" ASC'''
-  # Merge with existing data
-  uk_demand_update, respd = collect_data(resource_id, SELECTED_COLUMNS, order_by)
-  
-  if respd == True:
-    # Filter the data
-    uk_demand_merged_update = filter_demand_data_update(uk_demand_update)
-
-  # Collect carbon mix data
-  resource_id = "f93d1835-75bc-43e5-84ad-12472b180a98"
-  SELECTED_COLUMNS = "*"
-  order_by = '''"DATETIME" DESC'''
-  carbon_mix_update, respc = collect_data(resource_id, SELECTED_COLUMNS, order_by)
-  
-  if respc == True:
+def merge_data_update(updates):
+  '''
+  Merges only the newly arrived settlement periods into the merged dataset.
+
+  The demand and carbon mix rows of the new (settlement_date, settlement_period) keys are
+  joined and upserted into the merged store. Demand periods that had no carbon mix data yet
+  are filled in when their carbon mix rows arrive, since those keys are new for the carbon mix.
 
-    # Filter the carbon mix data
-    carbon_mix_update_cleaned = filter_carbon_data_update(carbon_mix_update)
+  Parameters:
+      - updates (list): DataFrames with the new rows of each dataset.
+
+  Returns:
+      - pd.DataFrame: The merged rows written to the store.
+  '''
+
+  keys = ["settlement_date", "settlement_period"]
+
+  # New keys of all the datasets
+  new_keys = [update[keys] for update in updates if len(update) > 0 and set(keys).issubset(update.columns)]
+  if len(new_keys) == 0:
+    print("No new data to merge.")
+    return pd.DataFrame()
+  new_keys = pd.concat(new_keys, ignore_index=True)
+  new_keys = storage.cast_types(new_keys).drop_duplicates()
+
+  # Only read the stored days covering the new keys
+  start, end = new_keys["settlement_date"].min(), new_keys["settlement_date"].max()
+  with profiler.stage("merge.read") as stage:
+    uk_demand = storage.read("demand", start=start, end=end).merge(new_keys, on=keys)
+    carbon_mix = storage.read("carbon_mix", start=start, end=end)
+    stage["rows"] = len(uk_demand) + len(carbon_mix)
+
+  # Merge the two dataframes
+  data_uk_merged = pd.merge(uk_demand, carbon_mix, how="left", on=keys)
 
+  # Correcting time 
+  data_uk_merged = dc.add_time(data_uk_merged, "settlement_date")
+
+  # Rows still missing carbon mix data are merged again when it arrives
+  data_uk_merged = dc.drop_nan_rows(data_uk_merged)
+  data_uk_merged = data_uk_merged.reset_index(drop=True)
+  with profiler.stage("merge.write") as stage:
+    storage.upsert(data_uk_merged, "merged")
+    stage["rows"] = len(data_uk_merged)
+
+  # Recompute only the hours, days and weeks of the new periods
+  with profiler.stage("rollups"):
+    rollups.update(data_uk_merged)
+
+  print(f"Merged {len(data_uk_merged)} new settlement periods.")
+  return data_uk_merged
+
+def merge_data():
+  '''Rebuilds the whole merged dataset from the demand and carbon mix datasets.'''
+
+  uk_demand_merged_update = storage.read("demand")
+  carbon_mix_update_cleaned = storage.read("carbon_mix")
+  if len(uk_demand_merged_update) == 0 or len(carbon_mix_update_cleaned) == 0:
+    print("No demand or carbon mix data to merge.")
+    return
    
   # Merge the two dataframes
   data_uk_merged = pd.merge(uk_demand_merged_update, carbon_mix_update_cleaned, how="left", left_on=["settlement_date", "settlement_period"], right_on=["settlement_date", "settlement_period"])
@@ -221,8 +580,68 @@ def update_database():
   # Correcting time 
   data_uk_merged = dc.add_time(data_uk_merged, "settlement_date")
 
-  # Saving the data to a CSV file
+  # Saving the data to the store
   data_uk_merged = dc.drop_nan_rows(data_uk_merged)
   data_uk_merged = data_uk_merged.sort_values(by=["settlement_date", "settlement_period"])
   data_uk_merged = data_uk_merged.reset_index(drop=True)
-  data_uk_merged.to_csv(os.path.join(data_path, "data_uk_merged_generation_demand_update.csv"), index=False)
\ No newline at end of file
+  storage.write(data_uk_merged, "merged")
+  rollups.rebuild()
+
+def update_database():
+  # Every stage is timed, see profiler.py
+  with profiler.profile_refresh():
+
+    # Move the CSV history into the store on first use, under the refresh lock so only one process imports it
+    with profiler.stage("migrate"):
+      migrate_csv_to_store()
+
+    # Collect demand, carbon mix and weather data at the same time, only the periods after the last stored ones
+    with profiler.stage("fetch") as stage:
+      with ThreadPoolExecutor(max_workers=1) as executor:
+        weather_future = profiler.run_in_context(executor, collect_weather, weather_watermark())
+        results = fetch_feeds(feeds)
+        results["weather"] = weather_future.result()
+      stage["rows"] = sum(len(df) for df, _ in results.values())
+
+    updates = []
+    uk_demand_update, respd = results["demand"]
+    if respd == True:
+      # Filter the data and append it to the store
+      with profiler.stage("demand") as stage:
+        updates.append(filter_demand_data_update(uk_demand_update))
+        stage["rows"] = len(updates[-1])
+      clear_checkpoint("demand")
+
+    carbon_mix_update, respc = results["carbon_mix"]
+    if respc == True:
+
+      # Filter the carbon mix data and append it to the store
+      with profiler.stage("carbon_mix") as stage:
+        updates.append(filter_carbon_data_update(carbon_mix_update))
+        stage["rows"] = len(updates[-1])
+      clear_checkpoint("carbon_mix")
+
+    weather_update, respw = results["weather"]
+    if respw == True:
+
+      # Align the weather to settlement periods and append it to the store
+      with profiler.stage("weather") as stage:
+        stage["rows"] = len(filter_weather_data_update(weather_update))
+
+    # Join only the new periods, or build the merged dataset the first time
+    with profiler.stage("merge") as stage:
+      if storage.exists("merged"):
+        stage["rows"] = len(merge_data_update(updates))
+      else:
+        merge_data()
+
+    # Chart rollups of a store written before they existed
+    if not rollups.exists():
+      with profiler.stage("rollups"):
+        rollups.rebuild()
+
+    # Optional CSV export
+    if export_csv:
+      with profiler.stage("export_csv"):
+        for name, file in csv_files.items():
+          storage.export_csv(name, file)
@@ -0,0 +1,256 @@
+'''Profiling of the database refresh.
+
+update_database is split into stages (fetch, clean, write, merge...). Each stage records its
+wall time, the rows it produced, the bytes fetched from the API and read from or written to
+the store, and the memory of the process. Every stage is printed as one JSON line, and the
+whole refresh is saved to data/.refresh_profile.json so it can be collected as metrics.
+
+The environment variable ECOWATT_PROFILE adds more expensive measures, as a comma
+separated list:
+
+    - memory: peak Python memory of each stage with tracemalloc (slows the refresh down),
+    - cprofile: cProfile of the whole refresh, saved to data/.profiles and summarised,
+    - pyinstrument: pyinstrument profile of the whole refresh, if it is installed.
+
+Example:
+    ECOWATT_PROFILE=memory,cprofile streamlit run app/app.py'''
+
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import contextvars
+from datetime import datetime
+from contextlib import contextmanager
+
+from utils import storage
+
+# Not available on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Data folder of the app
+script_dir = os.path.dirname(os.path.realpath(__file__))
+data_path = os.path.join(script_dir, "../../data")
+profile_file = os.path.join(data_path, ".refresh_profile.json")
+profiles_path = os.path.join(data_path, ".profiles")
+
+profile_modes = {mode.strip() for mode in os.getenv("ECOWATT_PROFILE", "").split(",") if mode.strip()}
+
+_current = contextvars.ContextVar("refresh_profile", default=None)
+_counters_lock = threading.Lock()
+
+def count(name, value):
+    '''Adds a value to a counter of the running refresh, e.g. the bytes received from the API. Does nothing outside profile_refresh.'''
+    profile = _current.get()
+    if profile is not None:
+        with _counters_lock:
+            profile.counters[name] = profile.counters.get(name, 0) + value
+
+def run_in_context(executor, function, *args):
+    '''
+    Submits a function to a thread pool in a copy of the current context, so its reads, writes
+    and fetches are counted in the running refresh.
+
+    Parameters:
+        - executor (concurrent.futures.Executor): Thread pool.
+        - function (callable): Function to run.
+        - args: Arguments of the function.
+
+    Returns:
+        - concurrent.futures.Future: The future of the call.
+    '''
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+def _max_rss_mb():
+    # Peak resident memory of the process (KB on Linux)
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+class RefreshProfile:
+    '''
+    Stages of one refresh, with their time, rows, bytes and memory.
+
+    Parameters:
+        - name (str): Name of the profiled run.
+        - trace_memory (bool): Measure the peak Python memory of each stage with tracemalloc.
+    '''
+
+    def __init__(self, name, trace_memory=False):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.started = datetime.now()
+        self.stages = []
+        # Bytes fetched, read and written during this run only, by any of its threads
+        self.counters = {"bytes_fetched": 0, "bytes_read": 0, "bytes_written": 0}
+        # Peak memory of the running stages, outermost first
+        self._running = []
+
+    @contextmanager
+    def stage(self, name):
+        '''
+        Measures a stage. The caller can set the number of rows produced in the yielded dict.
+        Stages can be nested, the time and bytes of a stage include the ones of its inner stages.
+
+        Example:
+            with profile.stage("fetch") as stage:
+                df = fetch()
+                stage["rows"] = len(df)
+        '''
+
+        record = {"stage": name, "depth": len(self._running), "rows": None}
+        before = self._snapshot()
+        if self.trace_memory:
+            # Keep the peak of the outer stage before measuring this one from scratch
+            if self._running:
+                self._running[-1] = max(self._running[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._running.append(0)
+        start = time.perf_counter()
+
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            after = self._snapshot()
+            for key, value in after.items():
+                record[key] = value - before.get(key, 0)
+            record["max_rss_mb"] = _max_rss_mb()
+            peak = self._running.pop()
+            if self.trace_memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                record["peak_mb"] = round(peak / 2**20, 1)
+                if self._running:
+                    self._running[-1] = max(self._running[-1], peak)
+
+            self.stages.append(record)
+            print(json.dumps({"event": "refresh_stage", "run": self.name, **record}))
+
+    def _snapshot(self):
+        with _counters_lock:
+            return dict(self.counters)
+
+    def summary(self):
+        '''
+        Returns the profile as a dict.
+
+        Returns:
+            - dict: Run name, start time, total time, totals of the counters and the stages.
+        '''
+
+        # Inner stages are already counted in their outer stage
+        top_stages = [record for record in self.stages if record["depth"] == 0]
+        totals = {}
+        for record in top_stages:
+            for key in ["bytes_fetched", "bytes_read", "bytes_written"]:
+                totals[key] = totals.get(key, 0) + record.get(key, 0)
+
+        return {
+            "run": self.name,
+            "started": self.started.isoformat(),
+            "seconds": round(sum(record["seconds"] for record in top_stages), 4),
+            **totals,
+            "max_rss_mb": _max_rss_mb(),
+            "stages": self.stages,
+        }
+
+@contextmanager
+def stage(name):
+    '''
+    Measures a stage of the running refresh, does nothing outside profile_refresh.
+
+    Parameters:
+        - name (str): Stage name.
+
+    Yields:
+        - dict: Record of the stage, set 'rows' to the rows produced.
+    '''
+
+    profile = _current.get()
+    if profile is None:
+        yield {}
+        return
+
+    with profile.stage(name) as record:
+        yield record
+
+def _save(summary):
+    # Write to a temporary file and rename it, so readers never see a partial file
+    os.makedirs(data_path, exist_ok=True)
+    tmp_file = f"{profile_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp_file, profile_file)
+
+@contextmanager
+def profile_refresh(name="update_database"):
+    '''
+    Profiles a refresh: the stages run inside are recorded, then summarised and saved.
+
+    Parameters:
+        - name (str): Name of the run.
+
+    Yields:
+        - RefreshProfile: The profile of the run.
+    '''
+
+    profile = RefreshProfile(name, trace_memory="memory" in profile_modes)
+    token = _current.set(profile)
+    io_token = storage.io_counters.set(profile.counters)
+
+    tracing = profile.trace_memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+
+    profiler = None
+    if "cprofile" in profile_modes:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    instrument = None
+    if "pyinstrument" in profile_modes:
+        try:
+            from pyinstrument import Profiler
+            instrument = Profiler()
+            instrument.start()
+        except ImportError:
+            print("pyinstrument is not installed, install it to use ECOWATT_PROFILE=pyinstrument")
+
+    try:
+        yield profile
+    finally:
+        stamp = profile.started.strftime("%Y%m%d-%H%M%S")
+
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(profiles_path, exist_ok=True)
+            file = os.path.join(profiles_path, f"{name}-{stamp}.prof")
+            profiler.dump_stats(file)
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(20)
+            print(text.getvalue())
+            print(f"cProfile saved to {file}")
+
+        if instrument is not None:
+            instrument.stop()
+            os.makedirs(profiles_path, exist_ok=True)
+            file = os.path.join(profiles_path, f"{name}-{stamp}.html")
+            with open(file, "w") as f:
+                f.write(instrument.output_html())
+            print(f"pyinstrument profile saved to {file}")
+
+        if tracing:
+            tracemalloc.stop()
+        _current.reset(token)
+        storage.io_counters.reset(io_token)
+
+        summary = profile.summary()
+        print(json.dumps({"event": "refresh_summary", **{key: value for key, value in summary.items() if key != "stages"}}))
+        _save(summary)
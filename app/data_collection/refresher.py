@@ -0,0 +1,149 @@
+'''Background refresh of the dashboard data.
+
+The NESO feeds are updated once per 30-minute settlement period, so a single thread per
+process refreshes the store shortly after each period ends. An OS lock on a file in the data
+folder makes sure only one process (or Streamlit worker) runs the update at a time, and the update
+commits every file with an atomic rename, so sessions only ever read complete snapshots.'''
+
+import os
+import time
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from data_collection import API as api
+
+# Lock file shared by every process using the same data folder. The lock is an OS lock on
+# the open file, so it is released by the system if its owner dies and never goes stale
+lock_file = os.path.join(api.data_path, ".refresh.lock")
+
+# NESO publishes a period a few minutes after it ends
+refresh_offset = timedelta(minutes=5)
+
+# Wait after a failed iteration of the refresh loop
+retry_wait = timedelta(minutes=1)
+
+_refresh_thread = None
+_thread_lock = threading.Lock()
+
+def _try_lock(fd):
+    # Non-blocking exclusive lock on the file, False if another process holds it
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+def acquire_lock():
+    '''
+    Tries to take the refresh lock.
+
+    Returns:
+        - int or None: File descriptor holding the lock, to give to release_lock. None if another process is refreshing.
+    '''
+
+    fd = os.open(lock_file, os.O_CREAT | os.O_RDWR)
+    if not _try_lock(fd):
+        os.close(fd)
+        return None
+
+    # Owner of the lock, for information only
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{os.getpid()} {datetime.now().isoformat()}".encode())
+    return fd
+
+def release_lock(fd):
+    '''
+    Releases the refresh lock taken by acquire_lock.
+
+    Parameters:
+        - fd (int): File descriptor returned by acquire_lock.
+    '''
+
+    # The file is kept: removing it would let another process lock a new file while this one is still locked
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+def next_refresh_time(now):
+    '''
+    Returns the next refresh time, a few minutes after the end of the current settlement period.
+
+    Parameters:
+        - now (datetime): Current time.
+
+    Returns:
+        - datetime: Time of the next refresh.
+    '''
+
+    period_start = now.replace(minute=(now.minute // 30) * 30, second=0, microsecond=0)
+    refresh_at = period_start + refresh_offset
+    if refresh_at <= now:
+        refresh_at += timedelta(minutes=30)
+    return refresh_at
+
+def refresh_once():
+    '''
+    Updates the database unless another process is already doing it.
+
+    Returns:
+        - bool: True if this call ran the update.
+    '''
+
+    fd = acquire_lock()
+    if fd is None:
+        print("Refresh already running in another process, skipping.")
+        return False
+
+    try:
+        start = time.perf_counter()
+        api.update_database()
+        print(f"Database refreshed in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        print("Error during the database refresh:", e)
+    finally:
+        release_lock(fd)
+    return True
+
+def _refresh_loop():
+    # Refresh straight away, then once per settlement period
+    while True:
+        try:
+            refresh_once()
+            wait = (next_refresh_time(datetime.now()) - datetime.now()).total_seconds()
+        except Exception:
+            # Keep the thread alive, the data would otherwise stop updating for the life of the process
+            print("Error in the refresh loop:")
+            traceback.print_exc()
+            wait = retry_wait.total_seconds()
+        time.sleep(max(wait, 0))
+
+def start_background_refresh():
+    '''
+    Starts the refresh thread, once per process, or restarts it if it stopped. Cheap to call on every run of the app.
+
+    Returns:
+        - threading.Thread: The running refresh thread.
+    '''
+
+    global _refresh_thread
+    with _thread_lock:
+        if _refresh_thread is None or not _refresh_thread.is_alive():
+            _refresh_thread = threading.Thread(target=_refresh_loop, name="ecowatt-refresh", daemon=True)
+            _refresh_thread.start()
+    return _refresh_thread
@@ -0,0 +1,120 @@
+'''Forecast cache shared by all the sessions of a process.
+
+Forecasts only change when a new settlement period is stored or the models are replaced,
+while Streamlit reruns the page on every widget interaction. Each forecast is kept under
+the key (model version, horizon, target, last settlement date, last settlement period),
+in a bounded LRU cache. The cache also remembers the version of the merged dataset: when
+update_database writes to it (in this process or any other), the next lookup sees a new
+version and drops every entry, so late data for an already stored period is never hidden.'''
+
+# Standard Libraries
+import threading
+from collections import OrderedDict
+
+# Data Libraries
+import pandas as pd
+
+# Project libraries
+from utils import storage
+from inference import engine, registry
+
+class ForecastCache:
+    '''
+    Bounded LRU cache of forecasts, safe to use from several threads.
+
+    Parameters:
+        - max_entries (int): Number of forecasts kept, the least recently used ones are dropped first.
+    '''
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.data_version = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def check_version(self, data_version):
+        '''Drops every entry if the data has changed since they were computed.'''
+        with self.lock:
+            if data_version != self.data_version:
+                self.entries.clear()
+                self.data_version = data_version
+
+    def get(self, key):
+        '''Returns the cached value of a key, or None.'''
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+    def put(self, key, value):
+        '''Stores a value, dropping the least recently used entries above max_entries.'''
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        '''Drops every entry.'''
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        '''Returns the number of entries, hits and misses.'''
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+forecast_cache = ForecastCache()
+
+def get_forecasts(horizons=None, targets=None):
+    '''
+    Returns the forecasts of engine.forecast, computing only the ones not in the cache.
+
+    Parameters:
+        - horizons (list, optional): Horizons to forecast. All the horizons with models by default.
+        - targets (list, optional): Targets to forecast. All the targets by default.
+
+    Returns:
+        - pd.DataFrame: Same frame as engine.forecast. attrs also holds the number of cached forecasts used.
+    '''
+
+    horizons = list(horizons or registry.available_horizons())
+    targets = list(targets or registry.target_cols)
+    if not horizons:
+        raise ValueError("No trained models are available.")
+
+    forecast_cache.check_version(storage.version("merged"))
+    last = storage.last_settlement("merged")
+    if last is None:
+        raise ValueError("The merged dataset is empty, there is nothing to forecast from.")
+
+    keys = {(horizon, target): (registry.model_version(horizon), horizon, target) + last
+            for horizon in horizons for target in targets}
+    cached = {pair: forecast_cache.get(key) for pair, key in keys.items()}
+
+    # Compute the missing forecasts in one batch
+    missing = [pair for pair, entry in cached.items() if entry is None]
+    if missing:
+        computed = engine.forecast(
+            horizons=[horizon for horizon in horizons if any(pair[0] == horizon for pair in missing)],
+            targets=[target for target in targets if any(pair[1] == target for pair in missing)],
+        )
+        for row in computed.to_dict("records"):
+            pair = (row["horizon"], row["target"])
+            if pair in keys:
+                cached[pair] = (row, computed.attrs)
+                forecast_cache.put(keys[pair], cached[pair])
+
+    forecasts = pd.DataFrame([cached[pair][0] for pair in keys])
+    attrs = [cached[pair][1] for pair in keys]
+    forecasts.attrs["last_settlement_date"] = attrs[0]["last_settlement_date"]
+    forecasts.attrs["missing_inputs"] = sorted(set().union(*(entry["missing_inputs"] for entry in attrs)))
+    forecasts.attrs["seconds"] = computed.attrs["seconds"] if missing else 0.0
+    forecasts.attrs["cached"] = len(keys) - len(missing)
+
+    return forecasts
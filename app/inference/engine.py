@@ -0,0 +1,194 @@
+'''Live inference for the Forecast page.
+
+The features of the models are read from their booster feature names and computed once from
+the latest merged data. A rolling statistic of the last settlement period is the same
+feature for every horizon (it is only shifted by the horizon), so each statistic is
+computed once and shared by all the models. Each model then predicts its row with a
+single call, and the predictions are returned as a tidy frame:
+
+    horizon | target | settlement_date | settlement_period | prediction'''
+
+# Standard Libraries
+import re
+import time
+
+# Data Libraries
+import numpy as np
+import pandas as pd
+
+# Project libraries
+from utils import storage
+from utils import holidays
+from utils import weather
+from utils import calendar_features as cf
+from utils.data_cleaning import shift_label, shift_size, window_length
+from inference import registry
+
+# Horizon -> number of settlement periods ahead
+horizon_periods = {"30_min": 1, "1_hour": 2, "2_hour": 4, "3_hour": 6, "6_hour": 12, "12_hour": 24, "1_day": 48, "2_day": 96}
+
+# Time allowed for all the predictions, a warning is printed above it
+latency_budget = 0.1
+
+_rolling_name = re.compile(r"^(?P<column>.+)_rolling(?:_(?P<stat>std|max|min))?_(?P<size>\d+)_(?P<type>hours|days|weeks|months|years)_for_(?P<label>.+)$")
+_lag_name = re.compile(r"^(?P<column>.+)_lag_(?P<size>\d+)_(?P<type>hours|days|weeks|months|years)(?:_for_(?P<label>.+))?$")
+
+_plans = {}
+
+def parse_feature(name):
+    '''
+    Describes how to compute a model feature from its name.
+
+    Parameters:
+        - name (str): Feature name, e.g. 'nd_rolling_std_3_hours_for_30_min', 'nd_lag_1_days' or 'month'.
+
+    Returns:
+        - tuple: ('rolling', column, stat, window, shift), ('lag', column, periods back) or ('calendar', name).
+    '''
+
+    match = _rolling_name.match(name)
+    if match:
+        window = window_length(int(match["size"]), match["type"])
+        return ("rolling", match["column"], match["stat"] or "mean", window, shift_size[shift_label.index(match["label"])])
+
+    match = _lag_name.match(name)
+    if match:
+        shift = shift_size[shift_label.index(match["label"])] if match["label"] else 0
+        return ("lag", match["column"], window_length(int(match["size"]), match["type"]) + shift)
+
+    return ("calendar", name)
+
+def _plan(horizon):
+    # Parsed features of a horizon, built once since all its models share the feature names
+    key = (horizon, registry.model_version(horizon))
+    if key not in _plans:
+        names = registry.get_model(horizon, registry.target_cols[0]).get_booster().feature_names
+        _plans[key] = [parse_feature(name) for name in names]
+    return _plans[key]
+
+def _rolling_stat(values, stat, window):
+    # Same as pandas rolling(window) on the last row: NaN unless the window is full and has no NaN
+    values = values[-window:]
+    if len(values) < window or np.isnan(values).any():
+        return np.nan
+    if stat == "std":
+        return values.std(ddof=1) if window > 1 else np.nan
+    return getattr(values, stat)()
+
+def _calendar(target_time):
+    # Calendar features of the forecast settlement period, as built by preprocess_datetime and one_hot_encode
+    row = cf.calendar_features([target_time]).iloc[0]
+
+    features = {
+        "settlement_period": row["period_of_day"],
+        "is_bank_holiday": float(holidays.is_bank_holiday([target_time])[0]),
+    }
+    for col in ["year", "day", "month", "day_of_week", "period_sin", "period_cos", "week_sin", "week_cos", "year_sin", "year_cos"]:
+        features[col] = row[col]
+    for name in cf.season_names:
+        features[f"season_{name}"] = float(row["season"] == name)
+    return features
+
+def _history(plans):
+    # Only the periods covered by the longest window or lag are read
+    longest = max(spec[3] + spec[4] if spec[0] == "rolling" else spec[2]
+                  for plan in plans for spec in plan if spec[0] != "calendar")
+    last = storage.last_settlement("merged")
+    if last is None:
+        raise ValueError("The merged dataset is empty, there is nothing to forecast from.")
+
+    start = last[0] - pd.Timedelta(minutes=30 * (longest + 48))
+    history = storage.read("merged", start=start)
+
+    # Weather of the location the models are trained with, see training.py
+    history = history.merge(weather.read_location(start=start), on=storage.KEY_COLUMNS, how="left")
+    return history.tail(longest + 1).reset_index(drop=True)
+
+def forecast(horizons=None, targets=None, history=None):
+    '''
+    Forecasts every target for every horizon from the latest merged data.
+
+    Parameters:
+        - horizons (list, optional): Horizons to forecast. All the horizons with models by default.
+        - targets (list, optional): Targets to forecast. All the targets by default.
+        - history (pd.DataFrame, optional): Merged data sorted by settlement date, read from the store by default.
+
+    Returns:
+        - pd.DataFrame: One row per horizon and target, with the forecast settlement date and period.
+                        attrs holds the latency in seconds and the input columns missing from the data.
+    '''
+
+    start_time = time.perf_counter()
+    horizons = list(horizons or registry.available_horizons())
+    targets = list(targets or registry.target_cols)
+    if not horizons:
+        raise ValueError("No trained models are available.")
+
+    plans = {horizon: _plan(horizon) for horizon in horizons}
+    if history is None:
+        history = _history(plans.values())
+
+    last_time = pd.Timestamp(history["settlement_date"].iloc[-1])
+    columns = {}
+    missing = set()
+    rolling = {}
+
+    rows = []
+    for horizon in horizons:
+        periods = horizon_periods[horizon]
+        target_time = last_time + pd.Timedelta(minutes=30 * periods)
+        calendar = _calendar(target_time)
+
+        row = np.empty(len(plans[horizon]), dtype=np.float32)
+        for j, spec in enumerate(plans[horizon]):
+            if spec[0] == "calendar":
+                row[j] = calendar.get(spec[1], np.nan)
+                continue
+
+            column = spec[1]
+            if column not in columns:
+                if column in history.columns:
+                    columns[column] = history[column].to_numpy(dtype=np.float64)
+                else:
+                    columns[column] = None
+                    missing.add(column)
+            values = columns[column]
+            if values is None:
+                row[j] = np.nan
+
+            elif spec[0] == "rolling":
+                # The feature of the forecast period is the statistic of the period `periods` earlier
+                _, _, stat, window, shift = spec
+                end = len(values) - (shift - periods)
+                key = (column, stat, window, end)
+                if key not in rolling:
+                    rolling[key] = _rolling_stat(values[:end], stat, window) if 0 < end <= len(values) else np.nan
+                row[j] = rolling[key]
+
+            else:
+                # Value `back` periods before the forecast period, unknown if it is in the future
+                back = spec[2]
+                ago = back - periods
+                row[j] = values[-1 - ago] if 0 <= ago < len(values) else np.nan
+
+        # One call per model on the shared row
+        matrix = row.reshape(1, -1)
+        for target in targets:
+            prediction = registry.get_model(horizon, target).get_booster().inplace_predict(matrix)
+            rows.append({
+                "horizon": horizon,
+                "target": target,
+                "settlement_date": target_time,
+                "settlement_period": calendar["settlement_period"],
+                "prediction": float(prediction[0]),
+            })
+
+    forecasts = pd.DataFrame(rows)
+    forecasts.attrs["last_settlement_date"] = last_time
+    forecasts.attrs["missing_inputs"] = sorted(missing)
+    forecasts.attrs["seconds"] = time.perf_counter() - start_time
+
+    if forecasts.attrs["seconds"] > latency_budget:
+        print(f"Warning: {len(forecasts)} forecasts took {forecasts.attrs['seconds'] * 1000:.0f} ms, above the {latency_budget * 1000:.0f} ms budget.")
+
+    return forecasts
@@ -0,0 +1,197 @@
+'''Model registry for the forecasting models in app/models.
+
+Each file model_<horizon>.pkl holds one XGBRegressor per target (nd, solar, wind and
+carbon_intensity). The registry loads a horizon the first time it is used and keeps it for
+the whole process, so every Streamlit session shares the same models. When the models have
+been exported to the native XGBoost format (model_<horizon>_<target>.ubj) those files are
+loaded instead of the pickle, which is faster and does not run arbitrary pickled code.
+
+Models trained by training.py are saved in a versioned folder (app/models/<version>/) and
+current.json points every horizon to its latest version. Those models are used first, and
+a new training run is picked up on the next call since the model version changes.'''
+
+# Standard Libraries
+import os
+import json
+import time
+import pickle
+import threading
+
+# Machine learning libraries
+import xgboost as xgb
+
+# Models path
+script_dir = os.path.dirname(os.path.realpath(__file__))
+models_path = os.path.join(script_dir, "../models")
+
+# Targets, in the order of the models in each pickle
+target_cols = ["nd", "solar", "wind", "carbon_intensity"]
+
+# Horizon -> model file name (without extension)
+horizons = {
+    "30_min": "model_30_min",
+    "1_hour": "model_1_hour",
+    "2_hour": "model_2_hour",
+    "3_hour": "model_3_hour",
+    "6_hour": "model_6_hour",
+    "12_hour": "model_12_hour",
+    "1_day": "model_1_day",
+    "2_day": "model_2_day",
+}
+
+# Latest trained version of each horizon, written by training.py
+current_file = os.path.join(models_path, "current.json")
+
+_models = {}
+_versions = {}
+_load_stats = {}
+_locks = {horizon: threading.Lock() for horizon in horizons}
+
+def _native_file(horizon, target):
+    return os.path.join(models_path, f"{horizons[horizon]}_{target}.ubj")
+
+def _model_size(model):
+    # Size of the serialized booster, close to the memory used by the trees
+    return len(model.get_booster().save_raw(raw_format="ubj"))
+
+def version_path(version):
+    '''Returns the folder of a trained version of the models.'''
+    return os.path.join(models_path, version)
+
+def current_versions():
+    '''
+    Returns the latest trained version of each horizon.
+
+    Returns:
+        - dict: Horizon -> version folder name. Empty before the first training run.
+    '''
+
+    if not os.path.exists(current_file):
+        return {}
+    with open(current_file) as f:
+        return json.load(f)
+
+def _model_files(horizon):
+    # Trained version, then native files when all of them exist, the pickle otherwise
+    version = current_versions().get(horizon)
+    if version is not None:
+        trained_files = [os.path.join(version_path(version), f"{horizons[horizon]}_{target}.ubj") for target in target_cols]
+        if all(os.path.exists(file) for file in trained_files):
+            return "ubj", trained_files
+
+    native_files = [_native_file(horizon, target) for target in target_cols]
+    if all(os.path.exists(file) for file in native_files):
+        return "ubj", native_files
+    return "pickle", [os.path.join(models_path, f"{horizons[horizon]}.pkl")]
+
+def available_horizons():
+    '''
+    Lists the horizons that have models.
+
+    Returns:
+        - list: Horizons, in the order of horizons.
+    '''
+    return [horizon for horizon in horizons if all(os.path.exists(file) for file in _model_files(horizon)[1])]
+
+def _load(horizon):
+    start = time.perf_counter()
+
+    file_format, files = _model_files(horizon)
+    if file_format == "ubj":
+        models = {}
+        for target, file in zip(target_cols, files):
+            model = xgb.XGBRegressor()
+            model.load_model(file)
+            models[target] = model
+    else:
+        with open(files[0], "rb") as f:
+            models = dict(zip(target_cols, pickle.load(f)))
+
+    _load_stats[horizon] = {
+        "format": file_format,
+        "load_seconds": time.perf_counter() - start,
+        "model_bytes": {target: _model_size(model) for target, model in models.items()},
+    }
+    print(f"Loaded {horizon} models from {file_format} in {_load_stats[horizon]['load_seconds']:.2f}s")
+
+    return models
+
+def get_models(horizon):
+    '''
+    Returns the models of a horizon, loading them the first time or when their files change.
+
+    Parameters:
+        - horizon (str): Forecast horizon, one of the keys of horizons.
+
+    Returns:
+        - dict: Target -> XGBRegressor.
+    '''
+
+    if horizon not in horizons:
+        raise ValueError(f"Invalid horizon. Choose from {list(horizons)}.")
+
+    # Reload when the model files have been replaced, e.g. by a new training run
+    version = model_version(horizon)
+    if _versions.get(horizon) != version:
+        # Only one thread loads a horizon, the others wait for it
+        with _locks[horizon]:
+            if _versions.get(horizon) != version:
+                _models[horizon] = _load(horizon)
+                _versions[horizon] = version
+
+    return _models[horizon]
+
+def get_model(horizon, target):
+    '''
+    Returns the model of a horizon and target.
+
+    Parameters:
+        - horizon (str): Forecast horizon.
+        - target (str): Target column, one of target_cols.
+
+    Returns:
+        - xgb.XGBRegressor: The model.
+    '''
+    return get_models(horizon)[target]
+
+def model_version(horizon):
+    '''
+    Returns a version of the model files of a horizon, which changes when they are replaced.
+
+    Parameters:
+        - horizon (str): Forecast horizon.
+
+    Returns:
+        - str: File format and latest modification time of the files.
+    '''
+
+    file_format, files = _model_files(horizon)
+    return f"{file_format}-{max(os.stat(file).st_mtime_ns for file in files)}"
+
+def load_stats():
+    '''
+    Returns the load time and size of the models loaded so far.
+
+    Returns:
+        - dict: Horizon -> dict with the file format, the load time in seconds and the size of each model in bytes.
+    '''
+    return dict(_load_stats)
+
+def export_native(horizon=None):
+    '''
+    Saves the pickled models in the native XGBoost UBJ format, next to the pickles.
+
+    Parameters:
+        - horizon (str, optional): Horizon to export. All the horizons with a pickle by default.
+    '''
+
+    pickled = [name for name in horizons if os.path.exists(os.path.join(models_path, f"{horizons[name]}.pkl"))]
+    for name in [horizon] if horizon is not None else pickled:
+        with open(os.path.join(models_path, f"{horizons[name]}.pkl"), "rb") as f:
+            models = dict(zip(target_cols, pickle.load(f)))
+        for target, model in models.items():
+            model.save_model(_native_file(name, target))
+        print(f"Exported {name} models to UBJ")
+
+if __name__ == "__main__":
+    export_native()
@@ -0,0 +1,402 @@
+'''Parallel training of the forecasting models.
+
+One XGBoost model is trained per horizon and target (8 horizons x 4 targets = 32 fits).
+The fits are independent, so they run in a pool of worker processes:
+
+    - the features of every horizon are built once, from the merged and weather datasets,
+      into one float32 memory-mapped matrix (data/.training/<version>/features.npy). Each
+      horizon is a contiguous block of columns, computed from rolling statistics shared by
+      all the horizons,
+    - the workers open the matrix read-only, so it is shared through the page cache instead
+      of being copied to every process,
+    - each fit uses a fixed number of XGBoost threads, so workers x threads matches the CPUs,
+    - the models are saved in a new version folder, app/models/<version>/, with a manifest of
+      the features, parameters and test metrics, and current.json then points the registry
+      to it. The app picks the new models up on its next forecast.
+
+Run it from the app folder, with the project installed:
+
+    python -m inference.training --workers 4 --threads 2'''
+
+# Standard Libraries
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Data Libraries
+import numpy as np
+import pandas as pd
+
+# Project libraries
+from utils import storage
+from utils import weather
+from utils import holidays
+from utils import calendar_features as cf
+from utils.features import rolling_stats, rolling_feature_name
+from utils.data_cleaning import shift_label, shift_size, window_length
+from inference import registry
+from inference.engine import horizon_periods
+
+# Training folders
+script_dir = os.path.dirname(os.path.realpath(__file__))
+training_path = os.path.join(script_dir, "../../data/.training")
+
+# Columns with rolling and lag features, as in the first models
+feature_columns = [
+    "nd", "tsd", "gas", "coal", "nuclear", "wind", "wind_emb", "hydro", "imports", "biomass",
+    "other", "solar", "storage", "generation", "carbon_intensity", "low_carbon", "zero_carbon",
+    "renewable", "fossil", "low_vs_fossil", "zero_vs_fossil", "renewable_vs_fossil", "green_score",
+    "temperature_2m_°c", "relative_humidity_2m_%", "apparent_temperature_°c", "precipitation_mm",
+    "cloud_cover_%", "wind_speed_10m_km/h", "wind_speed_100m_km/h", "wind_direction_10m_°",
+    "wind_direction_100m_°", "global_tilted_irradiance_w/m²", "direct_radiation_w/m²",
+    "terrestrial_radiation_w/m²", "shortwave_radiation_w/m²", "direct_normal_irradiance_w/m²",
+    "diffuse_radiation_w/m²",
+]
+
+# Windows of the rolling statistics and lags
+windows = [(3, "hours"), (1, "hours"), (12, "hours"), (6, "hours"), (1, "days"), (3, "days"),
+           (2, "days"), (5, "days"), (1, "weeks"), (2, "weeks")]
+rolling_stat_names = ["mean", "std"]
+
+calendar_columns = ["settlement_period", "is_bank_holiday", "year", "day", "month", "day_of_week",
+                    "season_Autumn", "season_Spring", "season_Summer", "season_Winter"]
+
+# XGBoost parameters of every fit, the thread count is set per worker
+model_params = {
+    "objective": "reg:squarederror",
+    "tree_method": "hist",
+    "learning_rate": 0.05,
+    "max_depth": 8,
+    "subsample": 0.8,
+    "colsample_bytree": 0.8,
+}
+num_boost_round = 1000
+early_stopping_rounds = 50
+
+# Share of the latest periods kept to test the models, and of the periods before them used
+# for early stopping, so the test metrics come from periods the fit never saw
+test_fraction = 0.2
+validation_fraction = 0.1
+
+def horizon_label(horizon):
+    '''Returns the label of a horizon in the feature names, e.g. '3_hours' for '3_hour'.'''
+    return shift_label[shift_size.index(horizon_periods[horizon])]
+
+def feature_names(horizon, columns=feature_columns):
+    '''
+    Lists the features of the models of a horizon.
+
+    Lags shorter than the horizon are left out, as they are not known when forecasting.
+
+    Parameters:
+        - horizon (str): Forecast horizon, one of the keys of engine.horizon_periods.
+        - columns (list): Columns with rolling and lag features.
+
+    Returns:
+        - list: Feature names, as parsed by engine.parse_feature.
+    '''
+
+    pos = shift_label.index(horizon_label(horizon))
+    names = list(calendar_columns)
+    for column in columns:
+        for window_size, type in windows:
+            names += [rolling_feature_name(column, stat, window_size, type, pos) for stat in rolling_stat_names]
+    for column in columns:
+        for window_size, type in windows:
+            if window_length(window_size, type) >= horizon_periods[horizon]:
+                names.append(f"{column}_lag_{window_size}_{type}")
+    return names
+
+def load_training_data(location=None):
+    '''
+    Reads the merged data with the weather of one location.
+
+    Parameters:
+        - location (str, optional): Weather location. The first location of weather.load_locations() by default.
+
+    Returns:
+        - pd.DataFrame: One row per settlement period, sorted by settlement date.
+    '''
+
+    data = storage.read("merged")
+    data = data.merge(weather.read_location(location), on=storage.KEY_COLUMNS, how="left")
+
+    return data.sort_values(storage.KEY_COLUMNS).reset_index(drop=True)
+
+def _shifted(values, shift):
+    # values shifted down by `shift` rows, NaN above
+    shifted = np.full(len(values), np.nan, dtype=np.float32)
+    if shift < len(values):
+        shifted[shift:] = values[:len(values) - shift]
+    return shifted
+
+def build_features(data, horizons, run_path):
+    '''
+    Writes the features of several horizons to one memory-mapped float32 matrix.
+
+    Each horizon is a contiguous block of columns. Every rolling statistic is computed once
+    per column and window, then shifted into the block of each horizon.
+
+    Parameters:
+        - data (pd.DataFrame): Training data from load_training_data.
+        - horizons (list): Horizons to build.
+        - run_path (str): Folder of the matrix.
+
+    Returns:
+        - dict: Matrix layout, with the rows, the file and the columns of each horizon (start and names).
+    '''
+
+    columns = [col for col in feature_columns if col in data.columns]
+    skipped = [col for col in feature_columns if col not in data.columns]
+    if skipped:
+        print(f"Warning: {len(skipped)} feature columns are not in the data and are left out: {', '.join(skipped)}")
+
+    blocks = {}
+    start = 0
+    for horizon in horizons:
+        names = feature_names(horizon, columns)
+        blocks[horizon] = {"start": start, "names": names}
+        start += len(names)
+
+    rows = len(data)
+    os.makedirs(run_path, exist_ok=True)
+    file = os.path.join(run_path, "features.npy")
+    # Column-major, so each feature and each horizon block is contiguous on disk
+    matrix = np.lib.format.open_memmap(file, mode="w+", dtype=np.float32, shape=(rows, start), fortran_order=True)
+    positions = {horizon: {name: block["start"] + j for j, name in enumerate(block["names"])} for horizon, block in blocks.items()}
+
+    # Calendar features of the period itself
+    calendar = cf.calendar_features(data["settlement_date"], data["settlement_period"], cyclical=False)
+    values = {
+        "settlement_period": data["settlement_period"].to_numpy(),
+        "is_bank_holiday": holidays.is_bank_holiday(data["settlement_date"]),
+        **{col: calendar[col].to_numpy() for col in ["year", "day", "month", "day_of_week"]},
+        **{f"season_{name}": (calendar["season"] == name).to_numpy() for name in cf.season_names},
+    }
+    for name, column in values.items():
+        for horizon in horizons:
+            matrix[:, positions[horizon][name]] = column
+
+    # Rolling statistics computed once, shifted for every horizon
+    for column in columns:
+        series = data[column].to_numpy(dtype=np.float64)
+        for window_size, type in windows:
+            window = window_length(window_size, type)
+            computed = rolling_stats(series, window, rolling_stat_names)
+            lagged = _shifted(series, window)
+            for horizon in horizons:
+                pos = shift_label.index(horizon_label(horizon))
+                for stat in rolling_stat_names:
+                    name = rolling_feature_name(column, stat, window_size, type, pos)
+                    matrix[:, positions[horizon][name]] = _shifted(computed[stat], shift_size[pos])
+                name = f"{column}_lag_{window_size}_{type}"
+                if name in positions[horizon]:
+                    matrix[:, positions[horizon][name]] = lagged
+
+    matrix.flush()
+    del matrix
+
+    return {"file": file, "rows": rows, "blocks": blocks}
+
+def _fit(task):
+    # Trains one horizon and target in a worker process, on a read-only view of the shared matrix
+    import xgboost as xgb
+
+    start_time = time.perf_counter()
+    matrix = np.load(task["matrix"], mmap_mode="r")
+    block = matrix[:, task["start"]:task["start"] + len(task["names"])]
+    target = np.load(task["targets"], mmap_mode="r")[:, task["target_index"]]
+
+    # The latest periods are the test set and the periods before them the validation set of the
+    # early stopping. Row ranges keep the data views of the memory map, periods without a target
+    # (if any) are dropped with a copy
+    test_start = int(len(target) * (1 - test_fraction))
+    validation_start = int(len(target) * (1 - test_fraction - validation_fraction))
+    bounds = [0, validation_start, test_start, len(target)]
+    known = ~np.isnan(target)
+    if known.all():
+        train_rows, validation_rows, test_rows = [slice(start, end) for start, end in zip(bounds, bounds[1:])]
+    else:
+        train_rows, validation_rows, test_rows = [start + np.flatnonzero(known[start:end]) for start, end in zip(bounds, bounds[1:])]
+
+    def dmatrix(rows, ref=None):
+        return xgb.QuantileDMatrix(block[rows], label=target[rows], ref=ref, feature_names=task["names"], nthread=task["threads"])
+
+    train = dmatrix(train_rows)
+    validation = dmatrix(validation_rows, ref=train)
+    test = dmatrix(test_rows, ref=train)
+
+    params = dict(model_params, nthread=task["threads"])
+    booster = xgb.train(params, train, num_boost_round=task["num_boost_round"], evals=[(validation, "validation")],
+                        early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+
+    # Keep only the trees up to the best iteration, so the saved model is the one scored below
+    best_iteration = booster.best_iteration
+    booster = booster[:best_iteration + 1]
+
+    actual = np.asarray(target[test_rows], dtype=np.float64)
+    errors = actual - booster.predict(test)
+    rmse = float(np.sqrt(np.mean(errors ** 2)))
+    r2 = float(1 - np.sum(errors ** 2) / np.sum((actual - actual.mean()) ** 2))
+
+    # Write to a temporary file and rename it, so the registry never sees a partial model
+    tmp_file = f"{task['file']}.{os.getpid()}.tmp.ubj"
+    booster.save_model(tmp_file)
+    os.replace(tmp_file, task["file"])
+
+    return {
+        "horizon": task["horizon"],
+        "target": task["target"],
+        "file": os.path.basename(task["file"]),
+        "rmse": rmse,
+        "r2": r2,
+        "best_iteration": int(best_iteration),
+        "train_rows": int(train.num_row()),
+        "validation_rows": int(validation.num_row()),
+        "test_rows": int(test.num_row()),
+        "seconds": round(time.perf_counter() - start_time, 2),
+    }
+
+def _init_worker(threads):
+    # OpenMP and BLAS threads of each worker, so the workers do not oversubscribe the CPUs
+    for variable in ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]:
+        os.environ[variable] = str(threads)
+
+def _write_json(data, file):
+    # Write to a temporary file and rename it, so readers never see a partial file
+    tmp_file = f"{file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_file, file)
+
+def train(horizons=None, targets=None, workers=None, threads=None, location=None, rounds=num_boost_round, keep_matrix=False):
+    '''
+    Trains the models of several horizons and targets in parallel and publishes them as a new version.
+
+    Parameters:
+        - horizons (list, optional): Horizons to train. All the horizons of the registry by default.
+        - targets (list, optional): Targets to train. All the targets of the registry by default.
+        - workers (int, optional): Worker processes. One per CPU by default, at most one per fit.
+        - threads (int, optional): XGBoost threads per worker. The CPUs divided by the workers by default.
+        - location (str, optional): Weather location of the features. The first one by default.
+        - rounds (int): Largest number of boosting rounds, early stopping on the validation set.
+        - keep_matrix (bool): Keep the feature matrix after training, in data/.training/<version>.
+
+    Returns:
+        - dict: The manifest of the new version.
+    '''
+
+    horizons = list(horizons or registry.horizons)
+    targets = list(targets or registry.target_cols)
+    cpus = os.cpu_count() or 1
+    workers = workers or min(cpus, len(horizons) * len(targets))
+    threads = threads or max(1, cpus // workers)
+
+    version = datetime.now().strftime("%Y%m%d-%H%M%S")
+    run_path = os.path.join(training_path, version)
+    model_path = registry.version_path(version)
+    os.makedirs(model_path, exist_ok=True)
+
+    start_time = time.perf_counter()
+    data = load_training_data(location)
+    if len(data) == 0:
+        raise ValueError("The merged dataset is empty, there is nothing to train on.")
+    layout = build_features(data, horizons, run_path)
+
+    missing_targets = [target for target in targets if target not in data.columns]
+    if missing_targets:
+        raise ValueError(f"Targets not in the data: {missing_targets}")
+    target_file = os.path.join(run_path, "targets.npy")
+    np.save(target_file, data[targets].to_numpy(dtype=np.float32))
+    print(f"Built {sum(len(block['names']) for block in layout['blocks'].values())} features for {layout['rows']} periods "
+          f"in {time.perf_counter() - start_time:.1f}s")
+
+    tasks = [{
+        "horizon": horizon,
+        "target": target,
+        "target_index": i,
+        "matrix": layout["file"],
+        "targets": target_file,
+        "start": layout["blocks"][horizon]["start"],
+        "names": layout["blocks"][horizon]["names"],
+        "threads": threads,
+        "num_boost_round": rounds,
+        "file": os.path.join(model_path, f"{registry.horizons[horizon]}_{target}.ubj"),
+    } for horizon in horizons for i, target in enumerate(targets)]
+
+    # Spawned workers, as forking a process that already started OpenMP threads can hang
+    results = []
+    failed = []
+    context = multiprocessing.get_context("spawn")
+    print(f"Training {len(tasks)} models with {workers} workers x {threads} threads")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(threads,)) as executor:
+        futures = {executor.submit(_fit, task): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Training of {task['horizon']} {task['target']} failed: {e}")
+                failed.append((task["horizon"], task["target"]))
+                continue
+            results.append(result)
+            print(f"{result['horizon']:>8} {result['target']:<17} RMSE {result['rmse']:10.3f}  R2 {result['r2']:.4f}  "
+                  f"{result['best_iteration'] + 1} rounds  {result['seconds']}s")
+
+    manifest = {
+        "version": version,
+        "created": datetime.now().isoformat(),
+        "data": {
+            "rows": layout["rows"],
+            "start": str(data["settlement_date"].iloc[0]),
+            "end": str(data["settlement_date"].iloc[-1]),
+            "weather_location": location or weather.load_locations().index[0],
+        },
+        "params": dict(model_params, num_boost_round=rounds, early_stopping_rounds=early_stopping_rounds,
+                       validation_fraction=validation_fraction, test_fraction=test_fraction),
+        "workers": workers,
+        "threads": threads,
+        "seconds": round(time.perf_counter() - start_time, 2),
+        "horizons": {horizon: {"features": layout["blocks"][horizon]["names"],
+                               "models": {result["target"]: result for result in results if result["horizon"] == horizon}}
+                     for horizon in horizons},
+        "failed": failed,
+    }
+    _write_json(manifest, os.path.join(model_path, "manifest.json"))
+
+    # Point the registry to the horizons with all their targets trained
+    trained = [horizon for horizon in horizons if all((horizon, target) not in failed for target in targets)]
+    if set(targets) == set(registry.target_cols) and trained:
+        current = registry.current_versions()
+        current.update({horizon: version for horizon in trained})
+        _write_json(current, registry.current_file)
+        print(f"Models of {', '.join(trained)} published as version {version}")
+    else:
+        print(f"Models saved in {model_path}, not published as only some targets were trained")
+
+    if not keep_matrix:
+        for file in [layout["file"], target_file]:
+            os.remove(file)
+        os.rmdir(run_path)
+
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Trains the forecasting models of every horizon and target in parallel.")
+    parser.add_argument("--horizons", nargs="+", choices=list(registry.horizons), help="Horizons to train, all by default.")
+    parser.add_argument("--targets", nargs="+", choices=registry.target_cols, help="Targets to train, all by default.")
+    parser.add_argument("--workers", type=int, help="Worker processes, one per CPU by default.")
+    parser.add_argument("--threads", type=int, help="XGBoost threads per worker, CPUs / workers by default.")
+    parser.add_argument("--location", help="Weather location of the features, the first one by default.")
+    parser.add_argument("--rounds", type=int, default=num_boost_round, help="Largest number of boosting rounds.")
+    parser.add_argument("--keep-matrix", action="store_true", help="Keep the feature matrix in data/.training.")
+    args = parser.parse_args()
+
+    train(args.horizons, args.targets, args.workers, args.threads, args.location, args.rounds, args.keep_matrix)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+'''Benchmarks of the data_cleaning hot paths on synthetic UK settlement data.
+
+Each function runs on 1, 5 and 15 years of data (see synthetic.py). The wall time is the
+best of a few runs, and the peak memory is measured with tracemalloc in a separate run so
+it does not slow down the timed ones. Results can be saved as a baseline and compared
+against it later, all offline:
+
+    python benchmarks/run_benchmarks.py --save
+    python benchmarks/run_benchmarks.py --compare
+
+Run them from the project root with the project installed (pip install -e .).
+
+--compare exits with status 1 when a function is slower (or uses more memory) than the
+baseline by more than the tolerance.'''
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+from utils import data_cleaning as dc
+from utils import calendar_features as cf
+
+import synthetic
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+baseline_file = os.path.join(script_dir, "baselines", "baseline.json")
+
+def _inputs(years):
+    # Data of each benchmark, built once per size and not timed
+    demand = synthetic.demand_data(years)
+    with redirect_stdout(io.StringIO()):
+        normalised = dc.adjust_dst_periods(demand)
+    return {
+        "demand": demand,
+        "text_dates": synthetic.demand_text_dates(demand),
+        "weather": synthetic.weather_data(years),
+        "normalised": normalised,
+    }
+
+# Benchmark name -> (input, function)
+benchmarks = {
+    "convert_to_datetime": ("text_dates", lambda df: dc.convert_to_datetime(df, ["settlement_date"])),
+    "adjust_dst_periods": ("demand", dc.adjust_dst_periods),
+    "check_time_increase_in_weather": ("weather", lambda df: dc.check_time_increase_in_weather(df, "time")),
+    "create_rolling_features": ("normalised", lambda df: dc.create_rolling_features(df, ["nd", "tsd"], "hours", 3, pos=0)),
+    "create_lag_features": ("normalised", lambda df: dc.create_lag_features(df, ["nd", "tsd"], "days", 1, pos=0)),
+    "preprocess_datetime": ("normalised", lambda df: dc.preprocess_datetime(df, "settlement_date")),
+    "add_time": ("normalised", lambda df: dc.add_time(df, "settlement_date")),
+    "calendar_features": ("normalised", lambda df: cf.calendar_features(df["settlement_date"], df["settlement_period"])),
+}
+
+def measure(function, data_frame, repeat=3):
+    '''
+    Measures the wall time and peak memory of a function.
+
+    Parameters:
+        - function (callable): Function of one DataFrame.
+        - data_frame (pd.DataFrame): Input of the function.
+        - repeat (int): Number of timed runs, the best one is kept.
+
+    Returns:
+        - dict: Best time in seconds and peak memory in MB.
+    '''
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            function(data_frame)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    with redirect_stdout(io.StringIO()):
+        function(data_frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": min(times), "peak_mb": peak / 2**20}
+
+def run(years_list, names=None, repeat=3):
+    '''
+    Runs the benchmarks for each data size.
+
+    Parameters:
+        - years_list (list): Years of data of each size.
+        - names (list, optional): Benchmarks to run. All of them by default.
+        - repeat (int): Number of timed runs per benchmark.
+
+    Returns:
+        - dict: Environment and results, by years then benchmark name.
+    '''
+
+    results = {}
+    for years in years_list:
+        inputs = _inputs(years)
+        results[str(years)] = {}
+        for name in names or benchmarks:
+            input_name, function = benchmarks[name]
+            data_frame = inputs[input_name]
+            result = measure(function, data_frame, repeat)
+            result["rows"] = len(data_frame)
+            results[str(years)][name] = result
+            print(f"{years:>3} years  {name:<32} {result['seconds']:9.3f}s  {result['peak_mb']:9.1f} MB  ({len(data_frame):,} rows)")
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+
+def compare(current, baseline, tolerance=1.5, min_seconds=0.01):
+    '''
+    Compares results with a baseline.
+
+    Parameters:
+        - current (dict): Results of run.
+        - baseline (dict): Saved results of run.
+        - tolerance (float): Largest accepted ratio to the baseline, for time and memory.
+        - min_seconds (float): Times below this are too noisy to compare and never count as regressions.
+
+    Returns:
+        - list: (years, name, metric, ratio) of every regression.
+    '''
+
+    regressions = []
+    for years, results in current["results"].items():
+        for name, result in results.items():
+            base = baseline["results"].get(years, {}).get(name)
+            if base is None:
+                continue
+            for metric in ["seconds", "peak_mb"]:
+                ratio = result[metric] / base[metric] if base[metric] > 0 else 1.0
+                regression = ratio > tolerance and not (metric == "seconds" and result[metric] < min_seconds)
+                flag = "  REGRESSION" if regression else ""
+                print(f"{years:>3} years  {name:<32} {metric:<8} {ratio:6.2f}x{flag}")
+                if regression:
+                    regressions.append((years, name, metric, ratio))
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the data_cleaning functions on synthetic data.")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 15], help="Years of data of each size.")
+    parser.add_argument("--only", nargs="+", choices=list(benchmarks), help="Benchmarks to run.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark.")
+    parser.add_argument("--save", nargs="?", const=baseline_file, help="Save the results as a baseline.")
+    parser.add_argument("--compare", nargs="?", const=baseline_file, help="Compare the results with a baseline.")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Largest accepted ratio to the baseline.")
+    args = parser.parse_args()
+
+    current = run(args.years, args.only, args.repeat)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions above {args.tolerance}x the baseline")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
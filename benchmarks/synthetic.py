@@ -0,0 +1,125 @@
+'''Synthetic UK settlement data for the benchmarks.
+
+The data looks like what the NESO and Open-Meteo feeds give the cleaning functions, without
+any network access:
+
+    - half-hourly demand with 46-period days on the last Sunday of March and 50-period days
+      on the last Sunday of October,
+    - settlement dates as text in the formats seen in the feeds,
+    - hourly weather in UTC with duplicated hours and gaps.
+
+The values follow daily and yearly cycles with noise, and a seed makes every run identical.'''
+
+import numpy as np
+import pandas as pd
+
+# Date formats used by the feeds, parsed by convert_to_datetime
+date_formats = ["%Y-%m-%d", "%d-%b-%Y", "%Y-%m-%dT%H:%M:%S"]
+
+def _dst_change_days(years):
+    # Last Sunday of March and October of each year
+    march = {(pd.Timestamp(year, 3, 31) - pd.Timedelta(days=(pd.Timestamp(year, 3, 31).dayofweek + 1) % 7)).normalize() for year in years}
+    october = {(pd.Timestamp(year, 10, 31) - pd.Timedelta(days=(pd.Timestamp(year, 10, 31).dayofweek + 1) % 7)).normalize() for year in years}
+    return march, october
+
+def demand_data(years, start="2009-01-01", gap_rate=0.0005, seed=0):
+    '''
+    Generates half-hourly demand data.
+
+    Parameters:
+        - years (int): Number of years of data.
+        - start (str): First settlement date.
+        - gap_rate (float): Share of settlement periods dropped, outside the DST change days.
+        - seed (int): Random seed.
+
+    Returns:
+        - pd.DataFrame: settlement_date (datetime64), settlement_period, nd and tsd.
+    '''
+
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, periods=int(round(365.25 * years)), freq="D")
+    short_days, long_days = _dst_change_days(sorted(set(days.year)))
+
+    # Periods per day, 46 and 50 on the DST change days
+    periods = np.full(len(days), 48)
+    periods[days.isin(list(short_days))] = 46
+    periods[days.isin(list(long_days))] = 50
+
+    settlement_date = np.repeat(days.to_numpy(), periods)
+    settlement_period = np.arange(periods.sum()) - np.repeat(np.cumsum(periods) - periods, periods) + 1
+
+    # Daily and yearly cycles plus noise
+    hours = (settlement_period - 1) / 2
+    day_of_year = pd.DatetimeIndex(settlement_date).dayofyear.to_numpy()
+    nd = (28000 + 6000 * np.cos(2 * np.pi * day_of_year / 365.25) - 5000 * np.cos(2 * np.pi * hours / 24)
+          + rng.normal(0, 800, len(hours)))
+    tsd = nd + 1500 + rng.normal(0, 300, len(hours))
+
+    df = pd.DataFrame({
+        "settlement_date": settlement_date,
+        "settlement_period": settlement_period,
+        "nd": nd.round().astype("int64"),
+        "tsd": tsd.round().astype("int64"),
+    })
+
+    # Random gaps, the DST change days keep all their periods
+    on_change_day = np.repeat(periods != 48, periods)
+    dropped = (rng.random(len(df)) < gap_rate) & ~on_change_day
+    return df[~dropped].reset_index(drop=True)
+
+def demand_text_dates(data_frame, seed=0):
+    '''
+    Returns the demand data with settlement_date as text in a mix of the feed formats.
+
+    Parameters:
+        - data_frame (pd.DataFrame): Demand data from demand_data.
+        - seed (int): Random seed.
+
+    Returns:
+        - pd.DataFrame: The data with a text settlement_date column.
+    '''
+
+    rng = np.random.default_rng(seed)
+    df = data_frame.copy()
+    dates = df["settlement_date"]
+
+    # One format per day, as each feed page uses one format
+    day_format = rng.integers(0, len(date_formats), dates.dt.normalize().nunique())
+    codes = day_format[pd.factorize(dates)[0]]
+    text = np.empty(len(df), dtype=object)
+    for i, date_format in enumerate(date_formats):
+        text[codes == i] = dates[codes == i].dt.strftime(date_format).to_numpy()
+    df["settlement_date"] = text
+    return df
+
+def weather_data(years, start="2009-01-01", gap_rate=0.001, duplicate_rate=0.001, seed=0):
+    '''
+    Generates hourly weather data in UTC, with duplicated hours and gaps.
+
+    Parameters:
+        - years (int): Number of years of data.
+        - start (str): First hour.
+        - gap_rate (float): Share of hours dropped.
+        - duplicate_rate (float): Share of hours repeated.
+        - seed (int): Random seed.
+
+    Returns:
+        - pd.DataFrame: time (UTC) and a few weather columns.
+    '''
+
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, periods=int(round(365.25 * years * 24)), freq="h", tz="UTC")
+    hours = np.arange(len(times))
+
+    df = pd.DataFrame({
+        "time": times,
+        "temperature_2m_°c": 10 - 7 * np.cos(2 * np.pi * hours / (24 * 365.25)) - 4 * np.cos(2 * np.pi * hours / 24) + rng.normal(0, 2, len(times)),
+        "wind_speed_100m_km/h": np.abs(rng.normal(20, 10, len(times))),
+        "cloud_cover_%": rng.uniform(0, 100, len(times)),
+        "shortwave_radiation_w/m²": np.clip(400 * np.sin(2 * np.pi * (hours % 24 - 6) / 24), 0, None) * rng.uniform(0.3, 1, len(times)),
+    })
+
+    dropped = rng.random(len(df)) < gap_rate
+    repeated = rng.random(len(df)) < duplicate_rate
+    df = pd.concat([df[~dropped], df[repeated & ~dropped]]).sort_values("time", kind="stable")
+    return df.reset_index(drop=True)
@@ -0,0 +1,74 @@
+'''adjust_dst_periods must give the same result as processing the DST change days one by one.'''
+
+import io
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+from utils import data_cleaning as dc
+
+def demand(days, seed=0):
+    # 48 periods a day, 46 on the last Sunday of March and 50 on the last Sunday of October
+    rng = np.random.default_rng(seed)
+    rows = []
+    for day in pd.date_range(*days):
+        last_sunday = day.weekday() == 6 and (day + pd.Timedelta(days=7)).month != day.month
+        periods = {3: 46, 10: 50}.get(day.month, 48) if last_sunday else 48
+        for period in range(1, periods + 1):
+            rows.append((day, period))
+    df = pd.DataFrame(rows, columns=["settlement_date", "settlement_period"])
+    df["nd"] = rng.integers(20000, 30000, len(df))
+    df["tsd"] = df["nd"] + rng.integers(1000, 2000, len(df))
+    return df
+
+def reference(df):
+    # The days one by one, as the first version of adjust_dst_periods, with the rows kept in date order
+    days = []
+    for date, day in df.groupby("settlement_date"):
+        day = day.sort_values("settlement_period").copy()
+        if len(day) == 46:
+            day.loc[day["settlement_period"].between(3, 46), "settlement_period"] += 2
+            previous = pd.concat(days) if days else day.iloc[:0]
+            added = []
+            for period in [3, 4]:
+                same_period = previous[previous["settlement_period"] == period].tail(21)
+                added.append({"settlement_date": date, "settlement_period": period,
+                              "nd": int(same_period["nd"].mean()), "tsd": int(same_period["tsd"].mean())})
+            day = pd.concat([day, pd.DataFrame(added)]).sort_values("settlement_period", kind="stable")
+        elif len(day) == 50:
+            values = day.set_index("settlement_period")[["nd", "tsd"]]
+            for period, repeated in [(3, 5), (4, 6)]:
+                day.loc[day["settlement_period"] == period, ["nd", "tsd"]] = ((values.loc[period] + values.loc[repeated]) / 2).astype(int).to_numpy()
+            day = day[~day["settlement_period"].isin([5, 6])]
+            day["settlement_period"] -= 2 * (day["settlement_period"] >= 7)
+        days.append(day)
+    return pd.concat(days).reset_index(drop=True)
+
+def adjusted(df):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return dc.adjust_dst_periods(df)
+
+def test_matches_day_by_day_reference():
+    # Three years, so the later 46-period days use the days filled before them
+    df = demand(("2021-01-01", "2023-12-31"))
+    result = adjusted(df)
+    expected = reference(df)
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert (result.groupby("settlement_date").size() == 48).all()
+    assert result["nd"].dtype == np.int64
+
+def test_day_with_missing_periods_keeps_its_last_periods():
+    # A normal day missing two periods also has 46 rows, only periods 3-46 are moved
+    df = demand(("2024-01-01", "2024-01-30"))
+    df = df[~((df["settlement_date"] == "2024-01-30") & df["settlement_period"].isin([10, 11]))]
+    result = adjusted(df)
+
+    last_day = result[result["settlement_date"] == "2024-01-30"]
+    assert last_day["settlement_period"].tolist()[-4:] == [47, 47, 48, 48]
+    pd.testing.assert_frame_equal(result, reference(df), check_dtype=False)
+
+def test_without_dst_days_is_unchanged():
+    df = demand(("2024-01-01", "2024-01-31"))
+    pd.testing.assert_frame_equal(adjusted(df), df.reset_index(drop=True))
@@ -0,0 +1,158 @@
+'''Keyset pagination, checkpoints and watermarks of API.collect_data, against a local stand-in of the NESO datastore.'''
+
+import re
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+import pytest
+
+from data_collection import API as api
+
+resource_id = "177f6fa4-ae49-4182-81ea-0c6b35f26ca6"
+columns = '''"SETTLEMENT_DATE", "SETTLEMENT_PERIOD", "ND"'''
+key_columns = ['"SETTLEMENT_DATE"', '"SETTLEMENT_PERIOD"']
+
+def demand_records(start, end):
+    # 48 periods a day, 46 on the day the clocks go forward
+    records = []
+    for day in pd.date_range(start, end):
+        periods = 46 if day == pd.Timestamp("2025-03-30") else 48
+        for period in range(1, periods + 1):
+            records.append({"SETTLEMENT_DATE": day.strftime("%Y-%m-%dT00:00:00"), "SETTLEMENT_PERIOD": period,
+                            "ND": 20000 + period})
+    return records
+
+class StandIn:
+    '''datastore_search_sql of one demand resource, with the requests received and an optional failing request.'''
+
+    def __init__(self, records):
+        self.records = records
+        self.queries = []
+        self.fail_on = None
+
+    def handle(self, sql):
+        self.queries.append(sql)
+        if self.fail_on == len(self.queries):
+            return 503, {}
+
+        rows = self.records
+        watermark = re.search(r"WHERE \(.*\) > \('([^']*)', (\d+)\)", sql)
+        if watermark:
+            key = (watermark.group(1)[:10], int(watermark.group(2)))
+            rows = [row for row in rows if (row["SETTLEMENT_DATE"][:10], row["SETTLEMENT_PERIOD"]) > key]
+        limit = int(re.search(r"LIMIT (\d+)", sql).group(1))
+        return 200, {"result": {"records": rows[:limit]}}
+
+@pytest.fixture
+def stand_in(tmp_path, monkeypatch):
+    server_state = StandIn(demand_records("2025-03-28", "2025-03-31"))
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            status, body = server_state.handle(parse_qs(urlparse(self.path).query)["sql"][0])
+            self.send_response(status)
+            self.end_headers()
+            self.wfile.write(json.dumps(body).encode())
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setattr(api, "api_url", f"http://127.0.0.1:{server.server_port}/")
+    monkeypatch.setattr(api, "checkpoint_path", str(tmp_path / ".backfill"))
+    # No retries, so a failing request ends the fetch straight away
+    monkeypatch.setattr(api, "max_retries", 0)
+    monkeypatch.setattr(api, "_session", None)
+
+    yield server_state
+
+    server.shutdown()
+    server.server_close()
+
+def _keys(df):
+    return list(zip(df["SETTLEMENT_DATE"].str[:10], df["SETTLEMENT_PERIOD"]))
+
+def test_fetches_every_page(stand_in):
+    df, ok = api.collect_data(resource_id, columns, key_columns, page_size=50)
+
+    assert ok
+    assert _keys(df) == _keys(pd.DataFrame(stand_in.records))
+    assert df.groupby(df["SETTLEMENT_DATE"].str[:10]).size().to_dict() == {
+        "2025-03-28": 48, "2025-03-29": 48, "2025-03-30": 46, "2025-03-31": 48}
+
+    # 190 rows in pages of 50, each page after the last key of the previous one
+    assert len(stand_in.queries) == 4
+    assert "WHERE" not in stand_in.queries[0]
+    assert '("SETTLEMENT_DATE", "SETTLEMENT_PERIOD") > (\'2025-03-29T00:00:00\', 2)' in stand_in.queries[1]
+
+def test_full_last_page_asks_for_one_more(stand_in):
+    df, ok = api.collect_data(resource_id, columns, key_columns, page_size=len(stand_in.records))
+
+    assert ok
+    assert len(df) == len(stand_in.records)
+    assert len(stand_in.queries) == 2
+
+def test_resumes_from_checkpoint_after_failure(stand_in):
+    stand_in.fail_on = 3
+    df, ok = api.collect_data(resource_id, columns, key_columns, page_size=50, checkpoint="demand")
+
+    assert not ok
+    assert len(df) == 0
+    watermark, staged = api.load_checkpoint("demand", resource_id)
+    assert watermark == ("2025-03-30T00:00:00", 4)
+    assert len(staged) == 100
+
+    # The next run only asks for the rows after the checkpoint
+    stand_in.fail_on = None
+    stand_in.queries.clear()
+    df, ok = api.collect_data(resource_id, columns, key_columns, page_size=50, checkpoint="demand")
+
+    assert ok
+    assert "> ('2025-03-30T00:00:00', 4)" in stand_in.queries[0]
+    assert len(stand_in.queries) == 2
+    assert _keys(df) == _keys(pd.DataFrame(stand_in.records))
+
+    api.clear_checkpoint("demand")
+    watermark, staged = api.load_checkpoint("demand", resource_id)
+    assert watermark is None
+    assert len(staged) == 0
+
+def test_checkpoint_of_another_resource_is_ignored(stand_in):
+    stand_in.fail_on = 2
+    api.collect_data("another-resource", columns, key_columns, page_size=50, checkpoint="demand")
+
+    stand_in.fail_on = None
+    stand_in.queries.clear()
+    df, ok = api.collect_data(resource_id, columns, key_columns, page_size=50, checkpoint="demand")
+
+    assert ok
+    assert "WHERE" not in stand_in.queries[0]
+    assert len(df) == len(stand_in.records)
+
+def test_second_run_fetches_only_new_periods(stand_in):
+    first, ok = api.collect_data(resource_id, columns, key_columns, page_size=50)
+    assert ok
+
+    # A new day is published, the second run starts from the last stored key, as demand_watermark gives it
+    stand_in.records = stand_in.records + demand_records("2025-04-01", "2025-04-01")
+    last = first.iloc[-1]
+    watermark = (last["SETTLEMENT_DATE"][:10], int(last["SETTLEMENT_PERIOD"]))
+
+    second, ok = api.collect_data(resource_id, columns, key_columns, watermark=watermark, page_size=50)
+
+    assert ok
+    assert _keys(second) == [("2025-04-01", period) for period in range(1, 49)]
+    assert not set(_keys(first)) & set(_keys(second))
+
+    # Nothing new: one empty page
+    stand_in.queries.clear()
+    last = second.iloc[-1]
+    third, ok = api.collect_data(resource_id, columns, key_columns, watermark=(last["SETTLEMENT_DATE"][:10], int(last["SETTLEMENT_PERIOD"])))
+    assert ok
+    assert len(third) == 0
+    assert len(stand_in.queries) == 1
@@ -0,0 +1,15 @@
+'''The forecasts need trained models.'''
+
+import pytest
+
+pytest.importorskip("xgboost")
+
+from inference import cache, engine, registry
+
+def test_no_models_is_a_value_error(monkeypatch):
+    monkeypatch.setattr(registry, "available_horizons", lambda: [])
+
+    with pytest.raises(ValueError, match="No trained models"):
+        cache.get_forecasts()
+    with pytest.raises(ValueError, match="No trained models"):
+        engine.forecast()
@@ -0,0 +1,93 @@
+'''The online features must match the batch feature functions on the same data.'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import data_cleaning as dc
+from utils.features import ROLLING_STATS, build_feature_matrix
+from utils.online_features import OnlineFeatureEngine
+
+columns = ["nd", "wind"]
+rolling_windows = [(1, "hours"), (3, "hours"), (1, "days")]
+lag_windows = [(1, "hours"), (1, "days")]
+positions = [0, 1, 3]
+
+def _data(periods=400, level=25000.0, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "settlement_date": pd.date_range("2024-01-01", periods=periods, freq="30min"),
+        "nd": level + 3000 * np.sin(np.arange(periods) / 7) + rng.normal(0, 500, periods),
+        "wind": rng.uniform(0, 10000, periods),
+    })
+    # Gaps of one and several periods, inside and across the windows
+    df.loc[150, "nd"] = np.nan
+    df.loc[230:236, "wind"] = np.nan
+    return df
+
+def _online(df, seed_rows):
+    # Features of the last seeded period, then of every period added with update()
+    engine = OnlineFeatureEngine(columns, rolling_windows, lag_windows, positions)
+    rows = [engine.seed(df.iloc[:seed_rows])]
+    for _, row in df.iloc[seed_rows:].iterrows():
+        rows.append(engine.update(row[columns].to_dict()))
+    return engine, pd.DataFrame(rows).reset_index(drop=True)
+
+def _batch(df):
+    # The same features from create_rolling_features / create_lag_features
+    batch = df
+    for window_size, type in rolling_windows:
+        for pos in positions:
+            batch = dc.create_rolling_features(batch, columns, type=type, window_size=window_size, pos=pos)
+    for window_size, type in lag_windows:
+        for pos in positions:
+            batch = dc.create_lag_features(batch, columns, type=type, window_size=window_size, pos=pos)
+    return batch
+
+@pytest.mark.parametrize("level", [25000.0, 1e7])
+def test_matches_build_feature_matrix(level):
+    df = _data(level=level)
+    seed_rows = 120
+    engine, online = _online(df, seed_rows)
+
+    batch = build_feature_matrix(df, columns, rolling_windows, lag_windows, positions)
+    expected = batch[engine.names].iloc[seed_rows - 1:].reset_index(drop=True)
+
+    assert list(online.columns) == engine.names
+    np.testing.assert_allclose(online.to_numpy(np.float64), expected.to_numpy(np.float64), rtol=1e-5, atol=1e-3)
+
+def test_matches_create_rolling_and_lag_features():
+    df = _data()
+    seed_rows = 120
+    engine, online = _online(df, seed_rows)
+
+    batch = _batch(df).iloc[seed_rows - 1:].reset_index(drop=True)
+    for name in engine.names:
+        np.testing.assert_allclose(online[name].to_numpy(np.float64), batch[name].to_numpy(np.float64),
+                                   rtol=1e-5, atol=1e-3, err_msg=name)
+
+def test_resync_boundaries():
+    # Every window is recomputed exactly when (index + 1) is a multiple of its length, compare
+    # the periods just before, at and after each of them, over several window lengths
+    df = _data(periods=600, level=1e7, seed=1)
+    seed_rows = 100
+    engine, online = _online(df, seed_rows)
+
+    batch = build_feature_matrix(df, columns, rolling_windows, lag_windows, positions)
+    expected = batch[engine.names].iloc[seed_rows - 1:].reset_index(drop=True)
+
+    for size, type in rolling_windows:
+        window = dc.window_length(size, type)
+        # Engine index of each row of `online` (the seed starts at the tail of the seeded history)
+        first_index = engine.index - (len(online) - 1)
+        rows = [row for row in range(len(online)) if (first_index + row + 1) % window in (window - 1, 0, 1)]
+        assert rows
+        names = [name for name in engine.names if f"_{size}_{type}_for_" in name and "_rolling" in name]
+        np.testing.assert_allclose(online.loc[rows, names].to_numpy(np.float64), expected.loc[rows, names].to_numpy(np.float64),
+                                   rtol=1e-5, atol=1e-3)
+
+def test_all_stats_are_built():
+    engine = OnlineFeatureEngine(["nd"], [(1, "hours")], positions=[0])
+    assert [name.split("_for_")[0] for name in engine.names] == [
+        "nd_rolling_1_hours", "nd_rolling_std_1_hours", "nd_rolling_max_1_hours", "nd_rolling_min_1_hours"]
+    assert len(engine.names) == len(ROLLING_STATS)
@@ -0,0 +1,89 @@
+'''This file builds the calendar features of settlement periods with integer arithmetic.
+
+The features come straight from the datetime64 values and settlement_period, without
+day names, per-row functions or date strings:
+
+    - year, month, day and day_of_week (1 = Monday), as small integers,
+    - season, as a categorical of season_names,
+    - period_of_day, the settlement period (1 to 48),
+    - sin/cos encodings of the period of the day, the day of the week and the day of the year,
+    - settlement_date, the full datetime of the start of the settlement period.'''
+
+import numpy as np
+import pandas as pd
+
+# Alphabetical, so one_hot_encode gives the season columns in the order the models were trained with
+season_names = ["Autumn", "Spring", "Summer", "Winter"]
+
+# Month (1 to 12) -> index in season_names, index 0 is unused
+month_season = np.array([3, 3, 3, 1, 1, 1, 2, 2, 2, 0, 0, 0, 3], dtype=np.int8)
+
+periods_per_day = 48
+
+def _days(dates):
+    # Days since 1970-01-01 of datetime-like values, as datetime64[D]
+    return pd.DatetimeIndex(dates).to_numpy().astype("datetime64[D]")
+
+def settlement_datetime(dates, periods):
+    '''
+    Combines settlement dates and periods into the datetime of the start of each period.
+
+    Parameters:
+        - dates (array-like): Settlement dates, the time of the day is ignored.
+        - periods (array-like): Settlement periods, 1 is 00:00.
+
+    Returns:
+        - np.ndarray: datetime64[ns] values.
+    '''
+
+    minutes = (np.asarray(periods, dtype=np.int64) - 1) * 30
+    return _days(dates).astype("datetime64[ns]") + minutes.astype("timedelta64[m]")
+
+def calendar_features(dates, periods=None, cyclical=True):
+    '''
+    Builds the calendar features of settlement periods.
+
+    Parameters:
+        - dates (array-like): Settlement dates or datetimes (without time zone).
+        - periods (array-like, optional): Settlement periods. By default they come from the time of the day of dates.
+        - cyclical (bool): Add the sin/cos encodings.
+
+    Returns:
+        - pd.DataFrame: The features, one row per date, with a RangeIndex.
+    '''
+
+    values = pd.DatetimeIndex(dates).to_numpy()
+    days = values.astype("datetime64[D]")
+    months = days.astype("datetime64[M]")
+    years = days.astype("datetime64[Y]")
+
+    if periods is None:
+        periods = (values - days.astype(values.dtype)).astype("timedelta64[m]").astype(np.int64) // 30 + 1
+    periods = np.asarray(periods, dtype=np.int64)
+
+    month = (months - years.astype(months.dtype)).astype(np.int64) + 1
+    day_of_week = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday, 0 = Monday
+
+    features = pd.DataFrame({
+        "year": (years.astype(np.int64) + 1970).astype(np.int16),
+        "month": month.astype(np.int8),
+        "day": ((days - months.astype(days.dtype)).astype(np.int64) + 1).astype(np.int8),
+        "day_of_week": (day_of_week + 1).astype(np.int8),
+        "season": pd.Categorical.from_codes(month_season[month], season_names),
+        "period_of_day": periods.astype(np.int8),
+    })
+
+    if cyclical:
+        day_of_year = (days - years.astype(days.dtype)).astype(np.int64)
+        angles = {
+            "period": 2 * np.pi * (periods - 1) / periods_per_day,
+            "week": 2 * np.pi * day_of_week / 7,
+            "year": 2 * np.pi * day_of_year / 365.25,
+        }
+        for name, angle in angles.items():
+            features[f"{name}_sin"] = np.sin(angle).astype(np.float32)
+            features[f"{name}_cos"] = np.cos(angle).astype(np.float32)
+
+    features["settlement_date"] = days.astype("datetime64[ns]") + ((periods - 1) * 30).astype("timedelta64[m]")
+
+    return features
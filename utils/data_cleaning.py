@@ -1,8 +1,11 @@
 '''This file groups functions for data cleaning, such as 
     formatting columns to a consistent format.'''
 
+import numpy as np
 import pandas as pd
-from datetime import datetime
+
+from utils import holidays as bank_holiday_calendar
+from utils import calendar_features as cf
 
 def extract_columns(demand_dict, columns):
     """
@@ -41,6 +44,9 @@ def snake(data_frame):
 def convert_to_datetime(data_frame, columns):
     '''
     Converts specified columns to datetime.date format using multiple known formats.
+
+    Every distinct value is parsed only once (each date appears 48 times in the settlement data),
+    and each format is tried over all the values still unparsed at once.
     
     Parameters:
         - data_frame (pd.DataFrame): The input DataFrame.
@@ -62,45 +68,56 @@ def convert_to_datetime(data_frame, columns):
         "%Y-%m-%d %H:%M:%S"
     ]
 
-    def try_parsing_date(text):
-        original = str(text).strip().replace('"', '').replace("'", "")
-        
-        # Convert the month abbreviation to title case (e.g., "DEC" -> "Dec")
-        original = original.title()
+    data_frame_copy = data_frame.copy()
+
+    for col in columns:
+        # Distinct values and the position of each row in them
+        codes, uniques = pd.factorize(data_frame_copy[col], use_na_sentinel=False)
+
+        # Clean the text and convert the month abbreviation to title case (e.g., "DEC" -> "Dec")
+        text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+        text = text.str.replace('"', '', regex=False).str.replace("'", '', regex=False).str.title()
 
+        parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
         for fmt in formats_to_try:
-            # Try parsing with each format, catching any exceptions that occur
-            try:
-                return pd.to_datetime(original, format=fmt)
-            except ValueError:
-                continue  # If a format fails, continue trying the next format
-        print(f"Warning: Unable to parse date '{original}'. Returning NaT.") 
-        return pd.NaT  # Return NaT if nothing matches
+            # Only the values not matched by the previous formats are tried
+            remaining = parsed.isna()
+            if not remaining.any():
+                break
+            parsed[remaining] = pd.to_datetime(text[remaining], format=fmt, errors="coerce")
 
-    data_frame_copy = data_frame.copy()
+        failed = parsed.isna()
+        if failed.any():
+            rows = int(failed.to_numpy()[codes].sum())
+            examples = ", ".join(f"'{value}'" for value in text[failed].head(5))
+            print(f"Warning: Unable to parse {rows} dates in '{col}' ({failed.sum()} distinct values, e.g. {examples}). Returning NaT.")
 
-    for col in columns:
-        data_frame_copy[col] = data_frame_copy[col].apply(try_parsing_date)
-        data_frame_copy[col] = data_frame_copy[col]
+        data_frame_copy[col] = pd.Series(parsed.to_numpy()[codes], index=data_frame_copy.index)
 
     return data_frame_copy
 
-def add_holiday_column(df, holidays):
+def add_holiday_column(df, holidays=None):
     """
     Adds a binary column 'is_bank_holiday' indicating if the settlement_date is a UK bank holiday.
 
     Parameters:
         - df (DataFrame): The demand data.
-        - holidays (list): List of bank holiday dates in 'DD-MM-YYYY' format.
+        - holidays (list, optional): List of bank holiday dates in 'DD-MM-YYYY' format. By default the
+          England and Wales calendar of utils.holidays is used, for any year.
 
     Returns:
         - DataFrame: Original DataFrame with added 'is_bank_holiday' column.
     """
-    # Convert strings to datetime.date
-    holidays = [datetime.strptime(date, "%d-%m-%Y").date() for date in holidays]
+    if holidays is None:
+        df['is_bank_holiday'] = bank_holiday_calendar.is_bank_holiday(df['settlement_date'])
+        return df
+
+    # Compare day numbers instead of datetime.date objects
+    holiday_days = pd.to_datetime(holidays, format="%d-%m-%Y").to_numpy().astype("datetime64[D]").astype(np.int64)
+    days = df['settlement_date'].to_numpy().astype("datetime64[D]").astype(np.int64)
 
     # Add new column
-    df['is_bank_holiday'] = df['settlement_date'].dt.date.isin(holidays)
+    df['is_bank_holiday'] = np.isin(days, holiday_days)
 
     return df
 
@@ -145,47 +162,13 @@ def preprocess_datetime(data_frame, column):
 
     df = data_frame.copy()
 
-    # Mapping days to numbers
-    day_mapping = {
-        'Monday': 1,
-        'Tuesday': 2,
-        'Wednesday': 3,
-        'Thursday': 4,
-        'Friday': 5,
-        'Saturday': 6,
-        'Sunday': 7
-    }
-
-    df['year'] = df[column].dt.year
-    df['day'] = df[column].dt.day
-    df['month'] = df[column].dt.month
-    df['day_of_week'] = df[column].dt.day_name()
-    df['day_of_week'] = df['day_of_week'].map(day_mapping)
-
-    # Add a season column based on the month
-    def get_season(month):
-        if month in [12, 1, 2]:
-            return 'Winter'
-        elif month in [3, 4, 5]:
-            return 'Spring'
-        elif month in [6, 7, 8]:
-            return 'Summer'
-        elif month in [9, 10, 11]:
-            return 'Autumn'
-
-    df['season'] = df['month'].apply(get_season)
-
-    # Ensure 'settlement_date' is a datetime (date only)
-    df['settlement_date'] = pd.to_datetime(df['settlement_date']).dt.date
-
-    # Create a timedelta column based on settlement_period (each period is 30 min)
-    df['settlement_time'] = pd.to_timedelta((df['settlement_period'] - 1) * 30, unit='m')
-
-    # Combine date and time into full datetime
-    df['settlement_date'] = pd.to_datetime(df['settlement_date'].astype(str)) + df['settlement_time']
-
-    # Drop the helper column if not needed
-    df.drop(columns='settlement_time', inplace=True)
+    # Year, day, month, day of the week (1 = Monday) and season, from integer arithmetic on the dates
+    features = cf.calendar_features(df[column], periods=df['settlement_period'], cyclical=False)
+    for col in ['year', 'day', 'month', 'day_of_week', 'season']:
+        df[col] = features[col].array
+
+    # Combine date and settlement period into full datetime
+    df['settlement_date'] = cf.settlement_datetime(df['settlement_date'], df['settlement_period'])
 
     # Optional: sort by new datetime
     df = df.sort_values(by='settlement_date')
@@ -194,28 +177,19 @@ def preprocess_datetime(data_frame, column):
 
 def add_time(data_frame, column):
     '''
-    Extracts time-based features from column, including a season column based on the month.
+    Combines settlement_date and settlement_period into the full datetime of each period.
     
     Parameters:
         - data_frame (pd.DataFrame): The dataset containing the date column.
     
     Returns:
-        - pd.DataFrame: The modified dataframe with new time-based columns.
+        - pd.DataFrame: The modified dataframe, sorted by the new settlement_date.
     '''
 
     df = data_frame.copy()
 
-    # Ensure 'settlement_date' is a datetime (date only)
-    df['settlement_date'] = pd.to_datetime(df['settlement_date']).dt.date
-
-    # Create a timedelta column based on settlement_period (each period is 30 min)
-    df['settlement_time'] = pd.to_timedelta((df['settlement_period'] - 1) * 30, unit='m')
-
-    # Combine date and time into full datetime
-    df['settlement_date'] = pd.to_datetime(df['settlement_date'].astype(str)) + df['settlement_time']
-
-    # Drop the helper column if not needed
-    df.drop(columns='settlement_time', inplace=True)
+    # Combine date and settlement period into full datetime
+    df['settlement_date'] = cf.settlement_datetime(df['settlement_date'], df['settlement_period'])
 
     # Optional: sort by new datetime
     df = df.sort_values(by=["settlement_date", "settlement_period"])
@@ -223,106 +197,83 @@ def add_time(data_frame, column):
     return df
 
 def adjust_dst_periods(df):
-    
-    # Iterate through the rows to identify DST changes (usually in March and October)
-    for date in df['settlement_date'].unique():
-        
-        # Check if the length of data for the given date is 46 (indicating DST change)
-        if len(df.loc[(df['settlement_date'] == date)]) == 46:
-            print(f"Adjusting periods for date: {date}")
-            # If there are 46 periods, it means DST has been applied
-            
-            # Add a temporary column to store the updated settlement_period values
-            df['temp_settlement_period'] = df['settlement_period']
-
-            # Shift periods from 3 to 5, 4 to 6, etc., for periods 3 to 46
-            for period in range(3, 47):
-                df.loc[(df['settlement_date'] == date) & (df['settlement_period'] == period), 'temp_settlement_period'] = period + 2
-
-            # After the loop, update the original column with the new values
-            df['settlement_period'] = df['temp_settlement_period']
-
-            # Drop the temporary column
-            df.drop('temp_settlement_period', axis=1, inplace=True)
-
-            # Now add rows for periods 2 and 3 (new periods after the shift)
-            new_data = [
-                {'settlement_date': date, 'settlement_period': 3, 'nd': None, 'tsd': None},
-                {'settlement_date': date, 'settlement_period': 4, 'nd': None, 'tsd': None}
-            ]
-
-            # Add the new rows to the DataFrame
-            df = pd.concat([df, pd.DataFrame(new_data)], ignore_index=True)
-
-            # Calculate the average for periods 2 and 3 for the DST change
-            for period in [3, 4]:
-                # Calculate the mean for 'ND' and 'TSD' columns using the last 3 weeks of data for the same period
-                avg_nd_value = df.loc[(df['settlement_date'] < date) & 
-                                          (df['settlement_period'] == period), 'nd'].tail(21).mean()
-                avg_tsd_value = df.loc[(df['settlement_date'] < date) & 
-                                           (df['settlement_period'] == period), 'tsd'].tail(21).mean()
-
-                # Assign the calculated average to the current date and period for both 'ND' and 'TSD'
-                df.loc[(df['settlement_date'] == date) & (df['settlement_period'] == period), 'nd'] = int(avg_nd_value)
-                df.loc[(df['settlement_date'] == date) & (df['settlement_period'] == period), 'tsd'] = int(avg_tsd_value)
-
+    '''
+    Normalises the settlement periods of the daylight saving time change days to 48 periods.
 
-            print(f"New legth for date {date} is {len(df.loc[(df['settlement_date'] == date)])}")
+    On the 46-period days (March) periods 3-46 are moved to 5-48 and periods 3 and 4 are added
+    with the mean of the same period over the previous 21 days. On the 50-period days (October)
+    periods 7-50 are moved to 5-48, periods 3 and 4 take the mean of the repeated hour and the
+    first rows of periods 5 and 6 are dropped. The means are truncated to integers.
 
-        # Check if the length of data for the given date is 50 (indicating the DST end)
-        if len(df.loc[(df['settlement_date'] == date)]) == 50:
-            print(f"Adjusting periods for date: {date}")
+    Parameters:
+        - df (pd.DataFrame): Demand data with settlement_date, settlement_period, nd and tsd columns.
 
-            # Implement the logic to adjust periods for DST end (October)
-            for period in range(7, 51):
-                df.loc[(df['settlement_date'] == date) & (df['settlement_period'] == period), 'settlement_period'] = period - 2
+    Returns:
+        - pd.DataFrame: The data with 48 settlement periods on the DST change days, sorted by settlement_date and settlement_period.
+    '''
 
-            # Step 3: Handle duplicates of 5 and 6
-            # Find the rows where settlement_period is 3, 5, and 4, 6
-            rows_3 = df[(df['settlement_date'] == date) & (df['settlement_period'] == 3)]
-            rows_5 = df[(df['settlement_date'] == date) & (df['settlement_period'] == 5)]
-            rows_4 = df[(df['settlement_date'] == date) & (df['settlement_period'] == 4)]
-            rows_6 = df[(df['settlement_date'] == date) & (df['settlement_period'] == 6)]
+    value_columns = ['nd', 'tsd']
+    integer_columns = [col for col in value_columns if pd.api.types.is_integer_dtype(df[col])]
 
-            avg_nd_3_5 = (rows_3['nd'].values[0] + rows_5['nd'].values[0]) / 2
-            avg_tsd_3_5 = (rows_3['tsd'].values[0] + rows_5['tsd'].values[0]) / 2
+    df = df.sort_values(['settlement_date', 'settlement_period'], kind='stable').reset_index(drop=True)
+    day_size = df.groupby('settlement_date')['settlement_period'].transform('size').to_numpy()
+    short_day, long_day = day_size == 46, day_size == 50
+    period = df['settlement_period'].to_numpy()
 
-            avg_nd_4_6 = (rows_4['nd'].values[0] + rows_6['nd'].values[0]) / 2
-            avg_tsd_4_6 = (rows_4['tsd'].values[0] + rows_6['tsd'].values[0]) / 2
+    # Long days: periods 3 and 4 take the mean with the repeated hour, two rows later, which is dropped
+    averaged = long_day & np.isin(period, [3, 4])
+    for col in value_columns:
+        values = df[col].to_numpy(dtype=float)
+        df[col] = np.where(averaged, np.trunc((values + np.roll(values, -2)) / 2), values)
+    repeated = long_day & np.isin(period, [5, 6])
 
-            # Assign these averages to settlement_period 3 and 4
-            df.loc[(df['settlement_date'] == date) & (df['settlement_period'] == 3), 'nd'] = int(avg_nd_3_5)
-            df.loc[(df['settlement_date'] == date) & (df['settlement_period'] == 3), 'tsd'] = int(avg_tsd_3_5)
+    # Shift periods 3-46 to 5-48 on short days and 7-50 to 5-48 on long days
+    df['settlement_period'] = period + np.where(short_day & (period >= 3) & (period <= 46), 2, 0) - np.where(long_day & (period >= 7), 2, 0)
+    df = df[~repeated]
 
-            df.loc[(df['settlement_date'] == date) & (df['settlement_period'] == 4), 'nd'] = int(avg_nd_4_6)
-            df.loc[(df['settlement_date'] == date) & (df['settlement_period'] == 4), 'tsd'] = int(avg_tsd_4_6)
+    # Short days: add periods 3 and 4, with the mean of the same period over the previous 21 days
+    short_days = df.loc[short_day[~repeated], 'settlement_date'].unique()
+    if len(short_days) > 0:
+        added = pd.DataFrame({'settlement_date': np.repeat(short_days, 2), 'settlement_period': np.tile([3, 4], len(short_days))})
+        added_labels = np.arange(len(df), len(df) + len(added))
+        df = pd.concat([df, added], ignore_index=True).sort_values(['settlement_date', 'settlement_period'], kind='stable')
 
-            # Remove the first occurrences of 5 and 6
-            df = df.drop(rows_5.index[0])  # Drop first 5
-            df = df.drop(rows_6.index[0])  # Drop first 6
+        # The added rows are empty, so a window of 22 rows ending on them averages the 21 rows before
+        means = df.groupby('settlement_period')[value_columns].rolling(22, min_periods=1).mean().droplevel(0)
+        df.loc[added_labels, value_columns] = np.trunc(means.loc[added_labels])
+    df = df.reset_index(drop=True)
 
-            print(f"New legth for date {date} is {len(df.loc[(df['settlement_date'] == date)])}")
+    print(f"Adjusted periods for {len(short_days)} days with 46 periods and {int(long_day.sum() // 50)} days with 50 periods")
 
-    df['nd'] = pd.to_numeric(df['nd'], errors='coerce') 
-    df['tsd'] = pd.to_numeric(df['tsd'], errors='coerce')
+    # Integer columns stay integers when no value is missing
+    for col in integer_columns:
+        if not df[col].isna().any():
+            df[col] = df[col].astype('int64')
 
     return df
 
 def resample(data_frame, col = 'time'):
-    weather_copy = data_frame.copy()
+    '''
+    Upsamples hourly data to 30 minutes, each half hour takes the value of the last hour.
+
+    Parameters:
+        - data_frame (pd.DataFrame): Hourly data sorted by the time column.
+        - col (str): The name of the time column.
 
-    # Dummy row at 23:30:00 with NaNs (will be filled by ffill)
-    last_time = weather_copy[col].max()
-    next_half_hour = last_time + pd.Timedelta(minutes=60)
+    Returns:
+        - pd.DataFrame: The data every 30 minutes, up to half an hour after the last hour. Integer columns are
+          returned as float64 and boolean columns as object, as with the first version.
+    '''
 
-    dummy_row = pd.DataFrame([{col: next_half_hour}])
-    weather_copy = pd.concat([weather_copy, dummy_row], ignore_index=True)
+    times = pd.date_range(data_frame[col].min(), data_frame[col].max() + pd.Timedelta(minutes=30), freq='30min', name=col)
 
-    # Now resample
-    data_frame = weather_copy.set_index(col).resample('30min').ffill().reset_index()
-    data_frame = data_frame.drop(data_frame.index[-1])
+    # Last row at or before each half hour
+    resampled = pd.merge_asof(pd.DataFrame({col: times}), data_frame, on=col, direction='backward')
 
-    return data_frame
+    # Same types as the padded resample of the first version: integers as floats and booleans as objects
+    types = {name: 'float64' for name in data_frame.columns if name != col and pd.api.types.is_integer_dtype(data_frame[name])}
+    types.update({name: object for name in data_frame.columns if name != col and pd.api.types.is_bool_dtype(data_frame[name])})
+    return resampled.astype(types)
 
 def one_hot_encode(data_frame, column):
     '''
@@ -369,6 +320,35 @@ def create_carbon_columns(data_frame):
 
     return df
 
+# Forecast horizons: label used in the feature names and shift in settlement periods
+shift_label = ["30_min", "1_hour", "2_hour", "3_hours", "6_hours", "12_hours", "1_day", "2_days", "3_days", "5_days", "1_week", "2_week"]
+shift_size = [1, 2, 4, 6, 12, 24, 48, 96, 144, 240, 336, 672]
+
+def window_length(window_size, type='hours'):
+    '''
+    Converts a window size in hours, days, weeks, months or years to a number of settlement periods.
+
+    Parameters:
+        - window_size (int): Size of the window in the given unit.
+        - type (str): Unit of the window, 'hours', 'days', 'weeks', 'months' or 'years'.
+
+    Returns:
+        - int: Number of 30-minute settlement periods in the window.
+    '''
+
+    if type == 'weeks':
+        return window_size * 7 * 48
+    elif type == 'hours':
+        return window_size * 2
+    elif type == 'days':
+        return window_size * 48
+    elif type == 'months':
+        return window_size * 48 * 30
+    elif type == 'years':
+        return window_size * 48 * 365
+    else:
+        raise ValueError("Invalid type. Choose from 'weeks', 'hours', 'days', 'months', or 'years'.")
+
 def create_rolling_features(data_frame, columns, type= 'hours', window_size=48, pos = 10):
     '''
     Creates rolling mean and standard deviation features for specified columns.
@@ -386,21 +366,7 @@ def create_rolling_features(data_frame, columns, type= 'hours', window_size=48,
 
     # Create rolling mean and std features
     for column in columns:
-        if type == 'weeks':
-            window = window_size*7*48
-        elif type == 'hours':
-            window = window_size * 2
-        elif type == 'days':
-            window = window_size * 48
-        elif type == 'months':
-            window = window_size * 48 * 30
-        elif type == 'years':
-            window = window_size * 48 * 365
-        else:
-            raise ValueError("Invalid type. Choose from 'weeks', 'hours', 'days', 'months', or 'years'.")
-        
-        shift_label = ["30_min", "1_hour", "2_hour", "3_hours", "6_hours", "12_hours", "1_day", "2_days", "3_days", "5_days", "1_week", "2_week"]
-        shift_size = [1, 2, 4, 6, 12, 24, 48, 96, 144, 240, 336, 672]
+        window = window_length(window_size, type)
 
         df[f'{column}_rolling_{window_size}_{type}_for_{shift_label[pos]}'] = df[column].rolling(window=window).mean().shift(shift_size[pos])
         df[f'{column}_rolling_std_{window_size}_{type}_for_{shift_label[pos]}'] = df[column].rolling(window=window).std().shift(shift_size[pos])
@@ -409,6 +375,64 @@ def create_rolling_features(data_frame, columns, type= 'hours', window_size=48,
     
     return df
 
+def fill_time_gaps(data_frame, time_col, value_cols=None, freq='1h', window='21D'):
+    '''
+    Fills missing timestamps and collapses duplicated ones in a regular time series.
+
+    Duplicated timestamps are collapsed into one row with the mean of the value columns. Each
+    missing timestamp is added with the mean of the value columns over the trailing window before
+    it, computed for all the gaps at once with a time-based rolling window.
+
+    Parameters:
+        - data_frame (pd.DataFrame): The input DataFrame with a time column.
+        - time_col (str): The name of the time column.
+        - value_cols (list, optional): Columns to average and fill. All the other columns by default.
+        - freq (str): Expected step between timestamps (default is one hour).
+        - window (str): Trailing window used to fill the missing rows (default is 3 weeks).
+
+    Returns:
+        - tuple: (pd.DataFrame with one row per timestamp, dict with the 'filled' and 'deduplicated' timestamps).
+    '''
+
+    df = data_frame.sort_values(by=[time_col], kind='stable').reset_index(drop=True)
+
+    if value_cols is None:
+        value_cols = [col for col in df.columns if col != time_col]
+
+    # Rows used for the trailing means, before collapsing the duplicates
+    history = df.set_index(time_col)[value_cols]
+
+    # Collapse duplicated timestamps, keeping the other columns of the first row
+    duplicated = df[time_col].duplicated(keep='first')
+    deduplicated = pd.DatetimeIndex(df.loc[duplicated, time_col].unique())
+    if duplicated.any():
+        df[value_cols] = df.groupby(time_col)[value_cols].transform('mean')
+        df = df[~duplicated]
+
+    # Missing timestamps between consecutive rows
+    step = pd.Timedelta(freq)
+    times = df[time_col].to_numpy()
+    gaps = np.diff(times) // step.to_timedelta64()
+    n_missing = np.where(gaps > 1, gaps - 1, 0).astype(int)
+    total = int(n_missing.sum())
+    offsets = np.arange(total) - np.repeat(np.cumsum(n_missing) - n_missing, n_missing) + 1
+    filled = pd.DatetimeIndex(np.repeat(times[:-1], n_missing) + offsets * step.to_timedelta64())
+
+    if total > 0:
+        # Trailing means over [t - window, t) for every missing timestamp at once
+        missing = pd.DataFrame(np.nan, index=filled, columns=value_cols)
+        combined = pd.concat([history, missing])
+        is_missing = np.concatenate([np.zeros(len(history), dtype=bool), np.ones(total, dtype=bool)])
+        order = np.argsort(combined.index.to_numpy(), kind='stable')
+        means = combined.iloc[order].rolling(window, closed='left').mean()
+
+        new_rows = means[is_missing[order]].rename_axis(time_col).reset_index()
+        df = pd.concat([df, new_rows], ignore_index=True)
+
+    df = df.sort_values(by=[time_col], kind='stable').reset_index(drop=True)
+
+    return df, {'filled': filled, 'deduplicated': deduplicated}
+
 def check_time_increase(data_frame, time_col, price_col):
     '''
     Checks if the time column increases by one hour. If not, it fills in missing rows with average prices.
@@ -422,109 +446,37 @@ def check_time_increase(data_frame, time_col, price_col):
         - pd.DataFrame: The modified DataFrame with filled missing rows and adjusted prices.
     '''
 
-    df = data_frame.copy()
-    df2 = df.copy()
-
-    # Sort the DataFrame by time
-    df.sort_values(by=[time_col], inplace=True)
-
-    # Check for missing hours and duplicates
-    for i in range(1, len(df)):
-        current_time = df.iloc[i][time_col]
-        previous_time = df.iloc[i - 1][time_col]
-
-        # Check if the time difference is greater than 1 hour
-        if current_time - previous_time > pd.Timedelta(hours=1):
-            # Calculate the number of missing hours
-            missing_hours = int((current_time - previous_time).total_seconds() / 3600) - 1
-
-            # Create new rows for the missing hours
-            for j in range(1, missing_hours + 1):
-                new_time = previous_time + pd.Timedelta(hours=j)
-                # Calculate the average price for the previous 3 weeks
-                avg_price = df[(df[time_col] < new_time) & (df[time_col] >= new_time - pd.Timedelta(weeks=3))][price_col].mean()
-                new_row = {time_col: new_time, price_col: avg_price}
-                df2 = pd.concat([df2, pd.DataFrame([new_row])], ignore_index=False)
-
-                print(f"Added missing row for time: {new_time} with average price: {avg_price}")
-        elif current_time - previous_time == pd.Timedelta(hours=0):
-            # If the time is duplicated, calculate the average price and keep one row
-            avg_price = (df.iloc[i][price_col] + df.iloc[i - 1][price_col]) / 2
-            prev_index = df.index[i - 1]
-            dup_index = df.index[i]
-            df2.at[prev_index, price_col] = avg_price
-            df2.drop(index=dup_index, inplace=True)
-            print(f"Removed duplicate row for time: {current_time} and set average price: {avg_price}")
-
-    df2.sort_values(by=[time_col], inplace=True)
-    return df2.reset_index(drop=True)
+    df, report = fill_time_gaps(data_frame, time_col, value_cols=[price_col])
+
+    print(f"Added {len(report['filled'])} missing rows with the average price of the previous 3 weeks")
+    print(f"Removed duplicates for {len(report['deduplicated'])} times and set the average price")
+
+    return df
 
 def check_time_increase_in_weather(data_frame, time_col):
     '''
-    Checks if the time column increases by one hour. If not, it fills in missing rows with average prices.
+    Checks if the time column increases by one hour. If not, it fills in missing rows with the
+    average of the previous 3 weeks and averages the duplicated rows.
     
     Parameters:
-        - data_frame (pd.DataFrame): The input DataFrame with time and price columns.
+        - data_frame (pd.DataFrame): The input DataFrame with a time column and numeric columns.
         - time_col (str): The name of the time column.
-        - price_col (str): The name of the price column.
     
     Returns:
-        - pd.DataFrame: The modified DataFrame with filled missing rows and adjusted prices.
+        - pd.DataFrame: The modified DataFrame with filled missing rows and averaged duplicates.
     '''
 
     df = data_frame.copy()
-    df2 = df.copy()
 
     # Remove timezone for logic checks
     df[time_col] = pd.to_datetime(df[time_col]).dt.tz_localize(None)
-    df2[time_col] = pd.to_datetime(df2[time_col]).dt.tz_localize(None)
-
-    # Sort by time
-    df.sort_values(by=[time_col], inplace=True)
-    df2.sort_values(by=[time_col], inplace=True)
 
-    # Get numeric columns to process
-    numeric_cols = df.drop(columns=[time_col]).columns.tolist()
-
-    # Loop through and check for time issues
-    for i in range(1, len(df)):
-        current_time = df.iloc[i][time_col]
-        previous_time = df.iloc[i - 1][time_col]
-
-        # Case 1: Missing hour(s)
-        if current_time - previous_time > pd.Timedelta(hours=1):
-            missing_hours = int((current_time - previous_time).total_seconds() / 3600) - 1
-            for j in range(1, missing_hours + 1):
-                new_time = previous_time + pd.Timedelta(hours=j)
-                new_row = {time_col: new_time}
-
-                for col in numeric_cols:
-                    avg_val = df[
-                        (df[time_col] < new_time) &
-                        (df[time_col] >= new_time - pd.Timedelta(weeks=3))
-                    ][col].mean()
-                    new_row[col] = avg_val
-
-                df2 = pd.concat([df2, pd.DataFrame([new_row])], ignore_index=False)
-                print(f"🕑 Added missing row for: {new_time} → interpolated values")
-
-        # Case 2: Duplicate time
-        elif current_time == previous_time:
-            prev_index = df.index[i - 1]
-            dup_index = df.index[i]
-
-            for col in numeric_cols:
-                avg_val = (df.iloc[i][col] + df.iloc[i - 1][col]) / 2
-                df2.at[prev_index, col] = avg_val
-
-            df2.drop(index=dup_index, inplace=True)
-            print(f"⚠️ Removed duplicate for time: {current_time} → averaged values")
-
-    # Final sort & reset index
-    df2.sort_values(by=[time_col], inplace=True)
-    return df2.reset_index(drop=True)
+    df, report = fill_time_gaps(df, time_col)
 
+    print(f"🕑 Added {len(report['filled'])} missing rows → interpolated values")
+    print(f"⚠️ Removed duplicates for {len(report['deduplicated'])} times → averaged values")
 
+    return df
 
 def create_lag_features(data_frame, columns, type= 'hours', window_size=48,pos = 0):
 
@@ -532,22 +484,7 @@ def create_lag_features(data_frame, columns, type= 'hours', window_size=48,pos =
 
     # Create rolling mean and std features
     for column in columns:
-        if type == 'weeks':
-            window = window_size*7*48
-        elif type == 'hours':
-            window = window_size * 2
-        elif type == 'days':
-            window =window_size * 48
-        elif type == 'months':
-            window = window_size * 48 * 30
-        elif type == 'years':
-            window = window_size * 48 * 365
-        else:
-            raise ValueError("Invalid type. Choose from 'weeks', 'hours', 'days', 'months', or 'years'.")
-        
-
-        shift_label = ["30_min", "1_hour", "2_hour", "3_hours", "6_hours", "12_hours", "1_day", "2_days", "3_days", "5_days", "1_week", "2_week"]
-        shift_size = [1, 2, 4, 6, 12, 24, 48, 96, 144, 240, 336, 672]
+        window = window_length(window_size, type)
 
         df[f'{column}_lag_{window_size}_{type}_for_{shift_label[pos]}'] = df[column].shift(shift_size[pos]).shift(window)    
 
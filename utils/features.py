@@ -0,0 +1,113 @@
+'''This file groups functions to build the feature matrix used by the forecasting models.
+
+The features are the same as the ones of data_cleaning.create_rolling_features and
+data_cleaning.create_lag_features, with the same names, but they are built in one pass
+from a feature spec: every rolling statistic is computed once per column and window, then
+shifted for each forecast horizon directly into a preallocated float32 matrix.'''
+
+import numpy as np
+import pandas as pd
+
+from utils.data_cleaning import shift_label, shift_size, window_length
+
+# Rolling statistics, in the order they are created by create_rolling_features
+ROLLING_STATS = ["mean", "std", "max", "min"]
+
+def rolling_feature_name(column, stat, window_size, type, pos):
+    '''Returns the name of a rolling feature, as created by create_rolling_features.'''
+    stat_part = "" if stat == "mean" else f"_{stat}"
+    return f'{column}_rolling{stat_part}_{window_size}_{type}_for_{shift_label[pos]}'
+
+def lag_feature_name(column, window_size, type, pos):
+    '''Returns the name of a lag feature, as created by create_lag_features.'''
+    return f'{column}_lag_{window_size}_{type}_for_{shift_label[pos]}'
+
+def feature_names(columns, rolling_windows=(), lag_windows=(), positions=(0,), stats=ROLLING_STATS):
+    '''
+    Lists the features described by a feature spec, in the order they are built.
+
+    Parameters:
+        - columns (list): Columns to create features for.
+        - rolling_windows (list): (window_size, type) pairs of the rolling features.
+        - lag_windows (list): (window_size, type) pairs of the lag features.
+        - positions (list): Forecast horizons, as positions in shift_label / shift_size.
+        - stats (list): Rolling statistics to create, from 'mean', 'std', 'max' and 'min'.
+
+    Returns:
+        - list: Feature names.
+    '''
+
+    names = []
+    for column in columns:
+        for window_size, type in rolling_windows:
+            for pos in positions:
+                names += [rolling_feature_name(column, stat, window_size, type, pos) for stat in stats]
+        for window_size, type in lag_windows:
+            for pos in positions:
+                names.append(lag_feature_name(column, window_size, type, pos))
+    return names
+
+def rolling_stats(values, window, stats=ROLLING_STATS):
+    '''
+    Computes several rolling statistics of an array over one shared rolling window.
+
+    Parameters:
+        - values (np.ndarray): Values in time order.
+        - window (int): Number of values in the window.
+        - stats (list): Statistics to compute, from 'mean', 'std', 'max' and 'min'.
+
+    Returns:
+        - dict: Statistic name -> np.ndarray aligned with values.
+    '''
+
+    rolling = pd.Series(values, dtype=np.float64).rolling(window=window)
+    return {stat: getattr(rolling, stat)().to_numpy() for stat in stats}
+
+def _shift_into(matrix, j, values, shift):
+    # matrix[:, j] = values shifted down by `shift` rows
+    if shift < len(values):
+        matrix[shift:, j] = values[:len(values) - shift]
+
+def build_feature_matrix(data_frame, columns, rolling_windows=(), lag_windows=(), positions=(0,), stats=ROLLING_STATS):
+    '''
+    Builds the rolling and lag features of several columns, windows and horizons in one pass.
+
+    Gives the same columns as calling create_rolling_features and create_lag_features for every
+    window and horizon, but each rolling statistic is computed once per column and window,
+    the features are written into one preallocated float32 matrix and the base frame is
+    copied only once.
+
+    Parameters:
+        - data_frame (pd.DataFrame): The input DataFrame, sorted by time.
+        - columns (list): Columns to create features for.
+        - rolling_windows (list): (window_size, type) pairs of the rolling features, e.g. [(3, 'hours'), (1, 'days')].
+        - lag_windows (list): (window_size, type) pairs of the lag features.
+        - positions (list): Forecast horizons, as positions in shift_label / shift_size.
+        - stats (list): Rolling statistics to create, from 'mean', 'std', 'max' and 'min'.
+
+    Returns:
+        - pd.DataFrame: The input DataFrame with the new feature columns.
+    '''
+
+    names = feature_names(columns, rolling_windows, lag_windows, positions, stats)
+    matrix = np.full((len(data_frame), len(names)), np.nan, dtype=np.float32)
+
+    j = 0
+    for column in columns:
+        values = data_frame[column].to_numpy(dtype=np.float64)
+
+        for window_size, type in rolling_windows:
+            computed = rolling_stats(values, window_length(window_size, type), stats)
+            for pos in positions:
+                for stat in stats:
+                    _shift_into(matrix, j, computed[stat], shift_size[pos])
+                    j += 1
+
+        for window_size, type in lag_windows:
+            window = window_length(window_size, type)
+            for pos in positions:
+                _shift_into(matrix, j, values, shift_size[pos] + window)
+                j += 1
+
+    features = pd.DataFrame(matrix, columns=names, index=data_frame.index)
+    return pd.concat([data_frame, features], axis=1)
@@ -0,0 +1,169 @@
+'''This file generates the bank holidays of England and Wales for any range of years.
+
+The holidays are computed from the rules of the Banking and Financial Dealings Act 1971 (the
+early May holiday is included from 1978):
+
+    - New Year's Day, Christmas Day and Boxing Day, moved to the next weekdays when they
+      fall on a weekend (substitute days),
+    - Good Friday and Easter Monday, from the date of Easter (Gregorian computus),
+    - the early May, spring and summer holidays, on the first Monday of May and the last
+      Mondays of May and August.
+
+Holidays moved or added by proclamation (jubilees, royal events...) are listed in
+moved_holidays and extra_holidays. For fast tagging, holiday_days returns the holidays
+as a sorted int64 array of days since 1970-01-01, so a column of dates is tagged with one
+np.isin.'''
+
+from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Holidays moved from their usual date: (year, name) -> new date
+moved_holidays = {
+    (1995, "early_may"): date(1995, 5, 8),
+    (2002, "spring"): date(2002, 6, 4),
+    (2012, "spring"): date(2012, 6, 4),
+    (2020, "early_may"): date(2020, 5, 8),
+    (2022, "spring"): date(2022, 6, 2),
+}
+
+# One-off holidays
+extra_holidays = [
+    date(1981, 7, 29),   # Royal wedding
+    date(1999, 12, 31),  # Millennium
+    date(2002, 6, 3),    # Golden Jubilee
+    date(2011, 4, 29),   # Royal wedding
+    date(2012, 6, 5),    # Diamond Jubilee
+    date(2022, 6, 3),    # Platinum Jubilee
+    date(2022, 9, 19),   # State funeral of Queen Elizabeth II
+    date(2023, 5, 8),    # Coronation of King Charles III
+]
+
+# Default range of the lookup index
+first_year = 1978
+last_year = 2100
+
+def easter(year):
+    '''
+    Returns the date of Easter Sunday (anonymous Gregorian algorithm).
+
+    Parameters:
+        - year (int): Year.
+
+    Returns:
+        - datetime.date: Easter Sunday.
+    '''
+
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _first_monday(year, month):
+    first = date(year, month, 1)
+    return first + timedelta(days=(7 - first.weekday()) % 7)
+
+def _last_monday(year, month):
+    last = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=last.weekday())
+
+def _next_weekday(day):
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+def year_holidays(year):
+    '''
+    Returns the bank holidays of a year in England and Wales.
+
+    Parameters:
+        - year (int): Year.
+
+    Returns:
+        - dict: Holiday name -> date, including the substitute days and the one-off holidays.
+    '''
+
+    holidays = {
+        "new_year": _next_weekday(date(year, 1, 1)),
+        "good_friday": easter(year) - timedelta(days=2),
+        "easter_monday": easter(year) + timedelta(days=1),
+        "spring": _last_monday(year, 5),
+        "summer": _last_monday(year, 8),
+    }
+    if year >= 1978:
+        holidays["early_may"] = _first_monday(year, 5)
+
+    # Christmas and Boxing Day on a weekend move to the next free weekdays
+    christmas = _next_weekday(date(year, 12, 25))
+    boxing_day = _next_weekday(max(date(year, 12, 26), christmas + timedelta(days=1)))
+    holidays["christmas"] = christmas
+    holidays["boxing_day"] = boxing_day
+
+    for (moved_year, name), moved_date in moved_holidays.items():
+        if moved_year == year and name in holidays:
+            holidays[name] = moved_date
+
+    for number, extra in enumerate(day for day in extra_holidays if day.year == year):
+        holidays[f"extra_{number + 1}"] = extra
+
+    return holidays
+
+def bank_holidays(start_year=first_year, end_year=last_year):
+    '''
+    Lists the bank holidays of a range of years.
+
+    Parameters:
+        - start_year (int): First year.
+        - end_year (int): Last year, included.
+
+    Returns:
+        - list: Sorted datetime.date of every bank holiday.
+    '''
+    return sorted(day for year in range(start_year, end_year + 1) for day in year_holidays(year).values())
+
+@lru_cache(maxsize=8)
+def holiday_days(start_year=first_year, end_year=last_year):
+    '''
+    Returns the bank holidays of a range of years as day numbers, for vectorized lookups.
+
+    Parameters:
+        - start_year (int): First year.
+        - end_year (int): Last year, included.
+
+    Returns:
+        - np.ndarray: Sorted int64 days since 1970-01-01, read-only.
+    '''
+
+    days = np.array(bank_holidays(start_year, end_year), dtype="datetime64[D]").astype(np.int64)
+    days.flags.writeable = False
+    return days
+
+def is_bank_holiday(dates):
+    '''
+    Tags the dates that are bank holidays, any time of the day.
+
+    Parameters:
+        - dates (array-like): Dates or datetimes (datetime64, pd.Series or pd.DatetimeIndex, without time zone).
+
+    Returns:
+        - np.ndarray: Boolean array, True on the bank holidays.
+    '''
+
+    days = pd.DatetimeIndex(dates).to_numpy().astype("datetime64[D]").astype(np.int64)
+    if len(days) == 0:
+        return np.zeros(0, dtype=bool)
+
+    # The index covers the default range, extended to the years of the dates
+    min_year, max_year = np.array([days.min(), days.max()]).astype("datetime64[D]").astype("datetime64[Y]").astype(int) + 1970
+    index = holiday_days(min(first_year, int(min_year)), max(last_year, int(max_year)))
+
+    return np.isin(days, index)
@@ -0,0 +1,238 @@
+'''This file contains the online version of the rolling and lag features.
+
+When a single settlement period arrives, OnlineFeatureEngine updates every feature in
+constant time instead of recomputing the rolling windows over the whole history:
+
+    - ring buffers keep the last values of each column for the windows and the lags,
+    - running sums with Welford's update (and downdate) keep the mean and std of each window,
+      recomputed exactly once per window length so rounding errors do not build up,
+    - monotonic deques keep the max and min of each window,
+    - short histories of each statistic give the features shifted for each horizon.
+
+The features have the same names and values as features.build_feature_matrix (and so as
+data_cleaning.create_rolling_features / create_lag_features) on the same data.'''
+
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from utils.data_cleaning import shift_size, window_length
+from utils.features import ROLLING_STATS, feature_names
+
+class _RingBuffer:
+    '''Fixed size buffer of the last values of a column, with O(1) access by age.'''
+
+    def __init__(self, size):
+        self.values = np.full(size, np.nan)
+        self.size = size
+        self.length = 0
+        self.position = -1
+
+    def append(self, value):
+        self.position = (self.position + 1) % self.size
+        self.values[self.position] = value
+        self.length = min(self.length + 1, self.size)
+
+    def ago(self, periods):
+        '''Value added `periods` periods before the last one, or None if it is not in the buffer.'''
+        if periods >= self.length:
+            return None
+        return self.values[(self.position - periods) % self.size]
+
+    def last(self, n):
+        '''The last n values, oldest first.'''
+        n = min(n, self.length)
+        return self.values[np.arange(self.position - n + 1, self.position + 1) % self.size]
+
+class _RollingWindow:
+    '''Running mean, std, max and min of the last `window` values of a column.'''
+
+    def __init__(self, window, history):
+        self.window = window
+        self.seen = 0
+        self.missing = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.maxima = deque()
+        self.minima = deque()
+        # Value of each statistic for the last `history` periods, newest last
+        self.history = {stat: deque([math.nan] * history, maxlen=history) for stat in ROLLING_STATS}
+
+    def _add(self, index, value):
+        if math.isnan(value):
+            self.missing += 1
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        # Keep the deques decreasing (max) and increasing (min)
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((index, value))
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((index, value))
+
+    def _remove(self, index, value):
+        if math.isnan(value):
+            self.missing -= 1
+            return
+        self.count -= 1
+        if self.count == 0:
+            self.mean, self.m2 = 0.0, 0.0
+        else:
+            delta = value - self.mean
+            self.mean -= delta / self.count
+            self.m2 -= delta * (value - self.mean)
+
+        if self.maxima and self.maxima[0][0] <= index:
+            self.maxima.popleft()
+        if self.minima and self.minima[0][0] <= index:
+            self.minima.popleft()
+
+    def resync(self, values):
+        '''Recomputes the mean and M2 from the values in the window, to drop the rounding drift of the downdates.'''
+        valid = values[~np.isnan(values)]
+        self.count = len(valid)
+        self.mean = float(valid.mean()) if self.count > 0 else 0.0
+        self.m2 = float(((valid - self.mean) ** 2).sum())
+
+    def update(self, index, value, leaving, window_values=None):
+        '''
+        Adds the value of period `index` and removes `leaving` (the value of period index - window) if any.
+        When the values in the window are given, the mean and M2 are recomputed from them.
+        '''
+
+        self._add(index, value)
+        self.seen += 1
+        if leaving is not None:
+            self._remove(index - self.window, leaving)
+        if window_values is not None:
+            self.resync(window_values)
+
+        # As with pandas, the window needs `window` values and no missing one
+        if self.seen < self.window or self.missing > 0:
+            stats = dict.fromkeys(ROLLING_STATS, math.nan)
+        else:
+            variance = max(self.m2, 0.0) / (self.window - 1) if self.window > 1 else math.nan
+            stats = {
+                "mean": self.mean,
+                "std": math.sqrt(variance),
+                "max": self.maxima[0][1],
+                "min": self.minima[0][1],
+            }
+
+        for stat, value in stats.items():
+            self.history[stat].append(value)
+
+class OnlineFeatureEngine:
+    '''
+    Keeps the rolling and lag features of a feature spec up to date, one settlement period at a time.
+
+    Parameters:
+        - columns (list): Columns to create features for.
+        - rolling_windows (list): (window_size, type) pairs of the rolling features.
+        - lag_windows (list): (window_size, type) pairs of the lag features.
+        - positions (list): Forecast horizons, as positions in shift_label / shift_size.
+        - stats (list): Rolling statistics to create, from 'mean', 'std', 'max' and 'min'.
+
+    Example:
+        engine = OnlineFeatureEngine(["nd"], [(3, 'hours')], [(1, 'days')], positions=[0, 1])
+        engine.seed(history)
+        features = engine.update({"nd": 25000.0})
+    '''
+
+    def __init__(self, columns, rolling_windows=(), lag_windows=(), positions=(0,), stats=ROLLING_STATS):
+        self.columns = list(columns)
+        self.rolling_windows = list(rolling_windows)
+        self.lag_windows = list(lag_windows)
+        self.positions = list(positions)
+        self.stats = list(stats)
+        self.names = feature_names(self.columns, self.rolling_windows, self.lag_windows, self.positions, self.stats)
+
+        max_shift = max(shift_size[pos] for pos in self.positions)
+        windows = [window_length(size, type) for size, type in self.rolling_windows]
+        lags = [window_length(size, type) + max_shift for size, type in self.lag_windows]
+
+        # Periods needed to rebuild the state: the longest window plus the longest shift
+        self.buffer_size = max(windows + lags + [0]) + max_shift + 1
+
+        self.index = -1
+        self.values = {column: _RingBuffer(self.buffer_size) for column in self.columns}
+        self.windows = {
+            (column, size, type): _RollingWindow(window_length(size, type), max_shift + 1)
+            for column in self.columns for size, type in self.rolling_windows
+        }
+
+    def seed(self, data_frame):
+        '''
+        Builds the state from the history, only the last periods needed by the windows are read.
+
+        Parameters:
+            - data_frame (pd.DataFrame): History sorted by time, with the feature columns.
+
+        Returns:
+            - pd.Series: The features of the last period of the history.
+        '''
+
+        tail = data_frame[self.columns].iloc[-self.buffer_size:]
+        features = None
+        for row in tail.to_numpy(dtype=np.float64):
+            features = self.update(dict(zip(self.columns, row)))
+        return features
+
+    def update(self, values):
+        '''
+        Adds a new settlement period and returns its features.
+
+        Parameters:
+            - values (dict): Value of each column for the new period.
+
+        Returns:
+            - pd.Series: The features of the new period, by feature name.
+        '''
+
+        self.index += 1
+        for column in self.columns:
+            value = float(values[column])
+            buffer = self.values[column]
+            buffer.append(value)
+
+            for size, type in self.rolling_windows:
+                rolling = self.windows[(column, size, type)]
+
+                # Exact recompute once per window length, so the cost stays O(1) per period on average
+                window_values = buffer.last(rolling.window) if (self.index + 1) % rolling.window == 0 else None
+                rolling.update(self.index, value, buffer.ago(rolling.window), window_values)
+
+        return self.features()
+
+    def features(self):
+        '''
+        Returns the features of the last period added.
+
+        Returns:
+            - pd.Series: Feature values (float32), in the order of features.feature_names.
+        '''
+
+        output = []
+        for column in self.columns:
+            buffer = self.values[column]
+
+            for size, type in self.rolling_windows:
+                history = self.windows[(column, size, type)].history
+                for pos in self.positions:
+                    output += [history[stat][-1 - shift_size[pos]] for stat in self.stats]
+
+            for size, type in self.lag_windows:
+                for pos in self.positions:
+                    lag = shift_size[pos] + window_length(size, type)
+                    value = buffer.ago(lag)
+                    output.append(math.nan if value is None else value)
+
+        return pd.Series(output, index=self.names, dtype=np.float32)
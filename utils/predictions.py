@@ -0,0 +1,152 @@
+'''This file groups functions for the model predictions shown on the model results page.
+
+Instead of one CSV with the actual values and the predictions of every horizon, each
+horizon has its own Parquet file with only settlement_date, the targets and its
+<target>_predicted_<horizon> columns:
+
+    data/predictions/30_min.parquet
+    data/predictions/index.json
+
+The index keeps the columns, row count and date range of every file, so the page can list
+the horizons without opening them, and reads only the file (and columns) it shows. It also
+keeps the modification time of the CSV, so the files are split again when it changes.'''
+
+import os
+import re
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Predictions directory
+script_dir = os.path.dirname(os.path.realpath(__file__))
+predictions_path = os.path.join(script_dir, "../data/predictions")
+index_file = os.path.join(predictions_path, "index.json")
+
+_predicted_column = re.compile(r"^(?P<target>.+)_predicted_(?P<horizon>.+)$")
+
+def horizon_file(horizon):
+    '''Returns the Parquet file of a horizon.'''
+    return os.path.join(predictions_path, f"{horizon}.parquet")
+
+def load_index():
+    '''
+    Reads the metadata index of the prediction files.
+
+    Returns:
+        - dict: Horizon -> dict with the file columns, row count, first and last settlement date. Empty if there are no files.
+    '''
+
+    if not os.path.exists(index_file):
+        return {}
+    with open(index_file) as f:
+        return json.load(f)
+
+def source_version(file):
+    '''Returns the modification time of a predictions CSV in nanoseconds, 0 if it does not exist.'''
+    return os.stat(file).st_mtime_ns if os.path.exists(file) else 0
+
+def split_csv(file):
+    '''
+    Splits a predictions CSV with every horizon into one Parquet file per horizon.
+
+    Every file keeps all the rows of the CSV, with the actual values, including the rows
+    without a prediction for the horizon.
+
+    Parameters:
+        - file (str): CSV file with settlement_date, the targets and <target>_predicted_<horizon> columns.
+
+    Returns:
+        - dict: The new metadata index.
+    '''
+
+    version = source_version(file)
+    df = pd.read_csv(file)
+    df["settlement_date"] = pd.to_datetime(df["settlement_date"])
+    df = df.sort_values("settlement_date").reset_index(drop=True)
+
+    # Prediction columns of each horizon, and the targets they predict
+    horizons = {}
+    for col in df.columns:
+        match = _predicted_column.match(col)
+        if match:
+            horizons.setdefault(match["horizon"], []).append(col)
+    predicted_targets = {_predicted_column.match(col)["target"] for cols in horizons.values() for col in cols}
+    targets = [col for col in df.columns if col in predicted_targets]
+
+    os.makedirs(predictions_path, exist_ok=True)
+    index = {}
+    for horizon, predicted in horizons.items():
+        part = df[["settlement_date"] + targets + predicted]
+        part = part.astype({col: "float32" for col in part.columns[1:]})
+
+        # Write to a temporary file and rename it, so readers never see a partial file
+        tmp_file = f"{horizon_file(horizon)}.{os.getpid()}.tmp"
+        pq.write_table(pa.Table.from_pandas(part, preserve_index=False), tmp_file, compression="zstd")
+        os.replace(tmp_file, horizon_file(horizon))
+
+        index[horizon] = {
+            "columns": list(part.columns),
+            "rows": len(part),
+            "predicted_rows": int(part[predicted].notna().any(axis=1).sum()),
+            "start": str(part["settlement_date"].min()),
+            "end": str(part["settlement_date"].max()),
+            "source_version": version,
+        }
+
+    tmp_file = f"{index_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_file, index_file)
+
+    return index
+
+def update(file):
+    '''
+    Splits a predictions CSV if it was never split or has changed since.
+
+    Parameters:
+        - file (str): Predictions CSV file.
+
+    Returns:
+        - dict: The metadata index.
+    '''
+
+    index = load_index()
+    version = source_version(file)
+    if version and (not index or any(entry.get("source_version") != version for entry in index.values())):
+        print(f"Splitting {os.path.basename(file)} into one file per horizon")
+        index = split_csv(file)
+    return index
+
+def read(horizon, columns=None, start=None, end=None):
+    '''
+    Reads the predictions of a horizon.
+
+    Parameters:
+        - horizon (str): Horizon, e.g. '30_min'.
+        - columns (list, optional): Columns to read, settlement_date is always read. All the columns by default.
+        - start (datetime-like, optional): Only rows with settlement_date >= start.
+        - end (datetime-like, optional): Only rows with settlement_date < end.
+
+    Returns:
+        - pd.DataFrame: The rows sorted by settlement date.
+    '''
+
+    if columns is not None:
+        columns = ["settlement_date"] + [col for col in columns if col != "settlement_date"]
+
+    filters = []
+    if start is not None:
+        filters.append(("settlement_date", ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append(("settlement_date", "<", pd.Timestamp(end)))
+
+    table = pq.read_table(horizon_file(horizon), columns=columns, filters=filters or None)
+    return table.to_pandas()
+
+def version(horizon):
+    '''Returns the modification time of the file of a horizon, 0 if it does not exist.'''
+    file = horizon_file(horizon)
+    return os.stat(file).st_mtime_ns if os.path.exists(file) else 0
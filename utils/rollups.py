@@ -0,0 +1,135 @@
+'''This file groups functions for the downsampled copies of the merged dataset used by the charts.
+
+The merged data is half-hourly, so a multi-year chart would send hundreds of thousands of
+points per series to the browser. The mean of every numeric column is also stored per
+hour, day and week, as datasets of the store (merged_hourly, merged_daily, merged_weekly),
+and a chart reads the finest resolution that keeps the selected range under a few
+thousand points. The rollups are updated with the merged data: only the hours, days and
+weeks touched by the new settlement periods are recomputed.'''
+
+import pandas as pd
+
+from utils import storage
+
+# Resolution -> (dataset, bucket length), from the finest to the coarsest
+resolutions = {
+    "half_hourly": ("merged", pd.Timedelta(minutes=30)),
+    "hourly": ("merged_hourly", pd.Timedelta(hours=1)),
+    "daily": ("merged_daily", pd.Timedelta(days=1)),
+    "weekly": ("merged_weekly", pd.Timedelta(weeks=1)),
+}
+
+# Points per series above which a coarser resolution is used
+max_points = 5000
+
+def bucket_start(dates, resolution):
+    '''
+    Returns the start of the bucket of each date, weeks start on Monday.
+
+    Parameters:
+        - dates (pd.Series): Datetimes.
+        - resolution (str): 'hourly', 'daily' or 'weekly'.
+
+    Returns:
+        - pd.Series: Bucket start of each date.
+    '''
+
+    if resolution == "hourly":
+        return dates.dt.floor("h")
+    elif resolution == "daily":
+        return dates.dt.floor("D")
+    elif resolution == "weekly":
+        return dates.dt.floor("D") - pd.to_timedelta(dates.dt.dayofweek, unit="D")
+    else:
+        raise ValueError("Invalid resolution. Choose from 'hourly', 'daily' or 'weekly'.")
+
+def _aggregate(data_frame, resolution):
+    # Mean of the numeric columns per bucket, settlement_period is the first period of the bucket
+    values = [col for col in data_frame.columns
+              if col not in storage.KEY_COLUMNS and pd.api.types.is_numeric_dtype(data_frame[col])
+              and not pd.api.types.is_bool_dtype(data_frame[col])]
+
+    buckets = bucket_start(data_frame["settlement_date"], resolution)
+    rollup = data_frame[values].groupby(buckets.rename("settlement_date")).mean()
+    rollup["points"] = data_frame.groupby(buckets.rename("settlement_date")).size()
+    rollup = rollup.reset_index()
+    rollup["settlement_period"] = rollup["settlement_date"].dt.hour * 2 + rollup["settlement_date"].dt.minute // 30 + 1
+
+    return rollup[storage.KEY_COLUMNS + values + ["points"]]
+
+def exists():
+    '''Checks if every rollup has been written to the store.'''
+    return all(storage.exists(name) for name, _ in resolutions.values())
+
+def rebuild():
+    '''Rebuilds every rollup from the whole merged dataset.'''
+
+    merged = storage.read("merged")
+    if len(merged) == 0:
+        return
+
+    for resolution, (name, _) in resolutions.items():
+        if name != "merged":
+            storage.write(_aggregate(merged, resolution), name)
+
+def update(new_rows):
+    '''
+    Updates the rollups with new or changed merged rows.
+
+    Only the merged rows of the buckets containing the new rows are read and aggregated again.
+
+    Parameters:
+        - new_rows (pd.DataFrame): Merged rows just written to the store, with a settlement_date column.
+    '''
+
+    if len(new_rows) == 0:
+        return
+    if not exists():
+        rebuild()
+        return
+
+    dates = pd.to_datetime(new_rows["settlement_date"])
+    for resolution, (name, length) in resolutions.items():
+        if name == "merged":
+            continue
+
+        start = bucket_start(dates, resolution).min()
+        end = bucket_start(dates, resolution).max() + length - pd.Timedelta(microseconds=1)
+        storage.upsert(_aggregate(storage.read("merged", start=start, end=end), resolution), name)
+
+def choose_resolution(start, end):
+    '''
+    Returns the finest resolution giving at most max_points points between two dates.
+
+    Parameters:
+        - start (datetime-like): Start of the range.
+        - end (datetime-like): End of the range.
+
+    Returns:
+        - str: Resolution name, a key of resolutions.
+    '''
+
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    for resolution, (name, length) in resolutions.items():
+        if span / length <= max_points and (name == "merged" or storage.exists(name)):
+            return resolution
+
+    # The coarsest rollup available
+    return next((resolution for resolution, (name, _) in reversed(resolutions.items()) if storage.exists(name)), "half_hourly")
+
+def read(start, end, columns=None, resolution=None):
+    '''
+    Reads the merged data between two dates at a resolution suited to a chart.
+
+    Parameters:
+        - start (datetime-like): Start of the range.
+        - end (datetime-like): End of the range.
+        - columns (list, optional): Columns to read. All the columns by default.
+        - resolution (str, optional): Resolution to read, chosen with choose_resolution by default.
+
+    Returns:
+        - pd.DataFrame: Rows sorted by settlement date, one per bucket.
+    '''
+
+    resolution = resolution or choose_resolution(start, end)
+    return storage.read(resolutions[resolution][0], columns=columns, start=start, end=end)
@@ -0,0 +1,312 @@
+'''This file groups functions for the columnar data store used by the app.
+
+Each dataset (demand, carbon mix, merged...) is stored as typed, zstd compressed Parquet
+files partitioned by month of settlement_date:
+
+    data/store/<dataset>/year=2025/month=04/data.parquet
+
+New settlement periods only rewrite the partition of their month, so a refresh costs
+O(month) instead of O(history). Reads can select columns and push date filters down to
+the partitions and row groups. CSV files are only kept as an optional export.'''
+
+import os
+import shutil
+import threading
+import contextvars
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Store directory
+script_dir = os.path.dirname(os.path.realpath(__file__))
+store_path = os.path.join(script_dir, "../data/store")
+
+# Columns identifying a settlement period
+KEY_COLUMNS = ["settlement_date", "settlement_period"]
+
+# Columns added by the partitioning, not part of the data
+PARTITION_COLUMNS = ["year", "month"]
+
+PARTITION_FILE = "data.parquet"
+
+# Bytes of the files read and written, added to the dict set by the refresh profiler for its
+# run. Reads outside a profiled run (e.g. the pages of other sessions) are not counted
+io_counters = contextvars.ContextVar("io_counters", default=None)
+_io_lock = threading.Lock()
+
+def _count_io(key, value):
+    counters = io_counters.get()
+    if counters is not None:
+        with _io_lock:
+            counters[key] = counters.get(key, 0) + value
+
+def dataset_path(name):
+    '''Returns the directory of a dataset in the store.'''
+    return os.path.join(store_path, name)
+
+def exists(name):
+    '''
+    Checks if a dataset has been written to the store.
+
+    Parameters:
+        - name (str): Dataset name.
+
+    Returns:
+        - bool: True if the dataset has at least one partition.
+    '''
+    return len(_partitions(name)) > 0
+
+def cast_types(data_frame):
+    '''
+    Casts a DataFrame to the compact types used in the store.
+
+    settlement_date becomes datetime64, settlement_period int8, booleans are kept and every
+    other numeric column becomes float32.
+
+    Parameters:
+        - data_frame (pd.DataFrame): The input DataFrame.
+
+    Returns:
+        - pd.DataFrame: The DataFrame with compact types.
+    '''
+
+    df = data_frame.copy()
+
+    for col in df.columns:
+        if col == "settlement_date":
+            df[col] = pd.to_datetime(df[col]).astype("datetime64[ns]")
+        elif col == "settlement_period":
+            df[col] = df[col].astype("int8")
+        elif pd.api.types.is_bool_dtype(df[col]):
+            continue
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype("float32")
+
+    return df
+
+def _partition_dir(name, year, month):
+    return os.path.join(dataset_path(name), f"year={year}", f"month={month:02d}")
+
+def _partitions(name):
+    # (year, month, file) of every partition, oldest first
+    partitions = []
+    root = dataset_path(name)
+    if not os.path.isdir(root):
+        return partitions
+
+    for year_dir in os.listdir(root):
+        if not year_dir.startswith("year="):
+            continue
+        for month_dir in os.listdir(os.path.join(root, year_dir)):
+            file = os.path.join(root, year_dir, month_dir, PARTITION_FILE)
+            if month_dir.startswith("month=") and os.path.exists(file):
+                partitions.append((int(year_dir[5:]), int(month_dir[6:]), file))
+
+    return sorted(partitions)
+
+def _write_partition(data_frame, file):
+    # Write to a temporary file and rename it, so readers never see a partial file
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    tmp_file = f"{file}.{os.getpid()}.tmp"
+    table = pa.Table.from_pandas(data_frame, preserve_index=False)
+    pq.write_table(table, tmp_file, compression="zstd")
+    _count_io("bytes_written", os.path.getsize(tmp_file))
+    os.replace(tmp_file, file)
+
+def upsert(data_frame, name, keys=KEY_COLUMNS):
+    '''
+    Inserts new rows, or replaces the rows with the same keys, in a dataset.
+
+    Only the monthly partitions touched by the new rows are read and rewritten.
+
+    Parameters:
+        - data_frame (pd.DataFrame): Rows to write, with a settlement_date column.
+        - name (str): Dataset name.
+        - keys (list): Columns identifying a row.
+
+    Returns:
+        - int: Number of partitions rewritten.
+    '''
+
+    if len(data_frame) == 0:
+        return 0
+
+    df = cast_types(data_frame)
+    dates = df["settlement_date"]
+
+    rewritten = 0
+    for (year, month), new_rows in df.groupby([dates.dt.year, dates.dt.month], sort=True):
+        file = os.path.join(_partition_dir(name, year, month), PARTITION_FILE)
+
+        if os.path.exists(file):
+            stored = pd.read_parquet(file)
+            _count_io("bytes_read", os.path.getsize(file))
+            new_rows = pd.concat([stored, new_rows], ignore_index=True)
+
+        # The new rows win over the stored ones
+        new_rows = new_rows.drop_duplicates(subset=keys, keep="last")
+        new_rows = new_rows.sort_values(by=keys).reset_index(drop=True)
+        _write_partition(cast_types(new_rows), file)
+        rewritten += 1
+
+    return rewritten
+
+def write(data_frame, name):
+    '''
+    Replaces a whole dataset with the given data.
+
+    Parameters:
+        - data_frame (pd.DataFrame): Data to write, with a settlement_date column.
+        - name (str): Dataset name.
+    '''
+
+    df = cast_types(data_frame).sort_values(by=KEY_COLUMNS).reset_index(drop=True)
+    dates = df["settlement_date"]
+
+    written = set()
+    for (year, month), part in df.groupby([dates.dt.year, dates.dt.month], sort=True):
+        file = os.path.join(_partition_dir(name, year, month), PARTITION_FILE)
+        _write_partition(part.reset_index(drop=True), file)
+        written.add(file)
+
+    # Remove the partitions that are no longer part of the data
+    for _, _, file in _partitions(name):
+        if file not in written:
+            os.remove(file)
+
+def _date_filter(start, end):
+    # Filter on settlement_date, plus the partition columns so whole months are skipped
+    expression = None
+
+    if start is not None:
+        start = pd.Timestamp(start)
+        condition = (ds.field("settlement_date") >= pa.scalar(start.to_pydatetime(), type=pa.timestamp("ns"))) & (
+            (ds.field("year") > start.year) |
+            ((ds.field("year") == start.year) & (ds.field("month") >= start.month))
+        )
+        expression = condition
+
+    if end is not None:
+        end = pd.Timestamp(end)
+        condition = (ds.field("settlement_date") <= pa.scalar(end.to_pydatetime(), type=pa.timestamp("ns"))) & (
+            (ds.field("year") < end.year) |
+            ((ds.field("year") == end.year) & (ds.field("month") <= end.month))
+        )
+        expression = condition if expression is None else expression & condition
+
+    return expression
+
+def read(name, columns=None, start=None, end=None):
+    '''
+    Reads a dataset from the store.
+
+    Parameters:
+        - name (str): Dataset name.
+        - columns (list, optional): Columns to read. All the columns by default.
+        - start (datetime-like, optional): Only rows with settlement_date >= start.
+        - end (datetime-like, optional): Only rows with settlement_date <= end.
+
+    Returns:
+        - pd.DataFrame: The rows sorted by settlement date and period.
+    '''
+
+    partitions = _partitions(name)
+    if len(partitions) == 0:
+        return pd.DataFrame(columns=columns)
+
+    dataset = ds.dataset([file for _, _, file in partitions], format="parquet",
+                         partitioning=ds.partitioning(pa.schema([("year", pa.int32()), ("month", pa.int32())]), flavor="hive"),
+                         partition_base_dir=dataset_path(name))
+
+    if columns is None:
+        columns = [col for col in dataset.schema.names if col not in PARTITION_COLUMNS]
+
+    expression = _date_filter(start, end)
+    table = dataset.to_table(columns=columns, filter=expression)
+    if io_counters.get() is not None:
+        _count_io("bytes_read", sum(os.path.getsize(fragment.path) for fragment in dataset.get_fragments(filter=expression)))
+    df = table.to_pandas()
+
+    # Partitions are read oldest first, so the rows are already in order
+    sort_by = [col for col in KEY_COLUMNS if col in df.columns]
+    if len(sort_by) == len(KEY_COLUMNS) and not df["settlement_date"].is_monotonic_increasing:
+        df = df.sort_values(by=sort_by)
+
+    return df.reset_index(drop=True)
+
+def last_settlement(name):
+    '''
+    Returns the (settlement_date, settlement_period) of the last row of a dataset.
+
+    Only the key columns of the latest partition are read.
+
+    Parameters:
+        - name (str): Dataset name.
+
+    Returns:
+        - tuple or None: Last settlement date and period, or None if the dataset is empty.
+    '''
+
+    partitions = _partitions(name)
+    if len(partitions) == 0:
+        return None
+
+    last = pd.read_parquet(partitions[-1][2], columns=KEY_COLUMNS)
+    _count_io("bytes_read", os.path.getsize(partitions[-1][2]))
+    if len(last) == 0:
+        return None
+
+    last = last.sort_values(by=KEY_COLUMNS).iloc[-1]
+    return pd.Timestamp(last["settlement_date"]), int(last["settlement_period"])
+
+def version(name):
+    '''
+    Returns a version of a dataset, which changes every time one of its partitions is written.
+
+    Parameters:
+        - name (str): Dataset name.
+
+    Returns:
+        - int: Latest modification time of the partitions in nanoseconds, 0 if the dataset is empty.
+    '''
+    return max((os.stat(file).st_mtime_ns for _, _, file in _partitions(name)), default=0)
+
+def import_csv(file, name, date_format=None):
+    '''
+    Loads a CSV file into the store, replacing the dataset. The dataset appears all at once.
+
+    Parameters:
+        - file (str): CSV file with settlement_date and settlement_period columns.
+        - name (str): Dataset name.
+        - date_format (str, optional): Format of settlement_date in the file.
+    '''
+
+    df = pd.read_csv(file)
+    df["settlement_date"] = pd.to_datetime(df["settlement_date"], format=date_format)
+
+    # Write the partitions to a temporary dataset and rename its folder, so readers never see a half-imported dataset
+    tmp_name = f".{name}.{os.getpid()}.tmp"
+    shutil.rmtree(dataset_path(tmp_name), ignore_errors=True)
+    write(df, tmp_name)
+
+    old_path = dataset_path(f".{name}.{os.getpid()}.old")
+    if os.path.isdir(dataset_path(name)):
+        os.replace(dataset_path(name), old_path)
+    os.replace(dataset_path(tmp_name), dataset_path(name))
+    shutil.rmtree(old_path, ignore_errors=True)
+
+def export_csv(name, file):
+    '''
+    Exports a dataset to a CSV file.
+
+    Parameters:
+        - name (str): Dataset name.
+        - file (str): Destination CSV file.
+    '''
+
+    df = read(name)
+    tmp_file = f"{file}.{os.getpid()}.tmp"
+    df.to_csv(tmp_file, index=False)
+    os.replace(tmp_file, file)
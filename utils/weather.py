@@ -0,0 +1,294 @@
+'''This file groups functions for the Open-Meteo weather data of the forecasting features.
+
+Open-Meteo returns hourly data in UTC, as CSV (downloaded files or format=csv requests):
+
+    - one location: a metadata block (latitude, longitude, elevation...), an empty line
+      and a block with time and one column per variable,
+    - several locations: the same blocks with a location_id column.
+
+Both are read into one long table (location, time, variables), then aligned to the
+settlement periods of the demand data: the UTC hours are converted to UK wall-clock time
+and each settlement period takes the last hourly value (as resample did) or a linear
+interpolation between the hours. All the locations are aligned at once and written to the
+'weather' dataset of the store, one row per settlement period and location.'''
+
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils import data_cleaning as dc
+from utils import storage
+
+# Grid points of the weather data: name -> (latitude, longitude)
+locations = {
+    "penrith": (54.727592, -2.8458557),
+}
+
+# Optional list of grid points with the wind and solar capacity around them, replaces locations:
+# name,latitude,longitude,wind_capacity_mw,solar_capacity_mw
+script_dir = os.path.dirname(os.path.realpath(__file__))
+locations_file = os.path.join(script_dir, "../data/weather/uk/locations.csv")
+
+# Hourly Open-Meteo variables used by the models
+hourly_variables = [
+    "temperature_2m", "relative_humidity_2m", "apparent_temperature", "precipitation",
+    "cloud_cover", "wind_speed_10m", "wind_speed_100m", "wind_direction_10m",
+    "wind_direction_100m", "shortwave_radiation", "direct_radiation", "diffuse_radiation",
+    "direct_normal_irradiance", "global_tilted_irradiance", "terrestrial_radiation",
+]
+
+# Columns identifying a row of the weather dataset
+KEY_COLUMNS = ["settlement_date", "settlement_period", "location"]
+
+# Time zone of the settlement periods
+local_timezone = "Europe/London"
+
+# A settlement period further than this from the previous hour is left empty. Above one
+# hour so the periods after the spring clock change (no weather hour 01:00-02:00) are filled.
+max_gap = pd.Timedelta(minutes=90)
+
+def location_name(latitude, longitude):
+    '''Returns the name of a grid point as in the Open-Meteo file names, e.g. '54.73N2.85W'.'''
+    return f"{abs(latitude):.2f}{'N' if latitude >= 0 else 'S'}{abs(longitude):.2f}{'E' if longitude >= 0 else 'W'}"
+
+def load_locations(file=locations_file):
+    '''
+    Returns the grid points of the weather data, with their wind and solar capacity.
+
+    Parameters:
+        - file (str): CSV file with name, latitude, longitude, wind_capacity_mw and solar_capacity_mw columns.
+          If it does not exist, the locations above are used with the same capacity.
+
+    Returns:
+        - pd.DataFrame: One row per location, indexed by name.
+    '''
+
+    if os.path.exists(file):
+        df = pd.read_csv(file).set_index("name")
+    else:
+        df = pd.DataFrame.from_dict(locations, orient="index", columns=["latitude", "longitude"])
+        df.index.name = "name"
+
+    for col in ["wind_capacity_mw", "solar_capacity_mw"]:
+        df[col] = df[col].fillna(0.0) if col in df.columns else 1.0
+    return df
+
+def nearest_names(latitudes, longitudes, locations, max_distance=0.25):
+    '''
+    Names grid points after the nearest configured location, as Open-Meteo moves the requested coordinates to its grid.
+
+    Parameters:
+        - latitudes (array-like): Latitudes of the grid points.
+        - longitudes (array-like): Longitudes of the grid points.
+        - locations (pd.DataFrame): Locations from load_locations.
+        - max_distance (float): Largest distance in degrees to a configured location.
+
+    Returns:
+        - list: Unique name of each grid point. The grid point itself (e.g. '54.73N2.85W') when no location is
+          close enough, or when a closer grid point already has the name of the location.
+    '''
+
+    latitudes = np.asarray(latitudes, dtype=float)[:, None]
+    longitudes = np.asarray(longitudes, dtype=float)[:, None]
+    distance = np.hypot(latitudes - locations["latitude"].to_numpy(), longitudes - locations["longitude"].to_numpy())
+    nearest = distance.argmin(axis=1)
+    nearest_distance = distance[np.arange(len(nearest)), nearest]
+
+    names = [location_name(lat, lon) for lat, lon in zip(latitudes[:, 0], longitudes[:, 0])]
+    # Closest grid points first, each location names one grid point only
+    taken = set()
+    for row in np.argsort(nearest_distance, kind="stable"):
+        if nearest_distance[row] <= max_distance and nearest[row] not in taken:
+            names[row] = locations.index[nearest[row]]
+            taken.add(nearest[row])
+    return unique_names(names)
+
+def unique_names(names):
+    '''
+    Makes location names unique, by adding a suffix to the repeated ones, e.g. 'penrith_2'.
+
+    Parameters:
+        - names (list): Location names.
+
+    Returns:
+        - list: The names, the first of each repeated name unchanged.
+    '''
+
+    seen = set(names)
+    unique = []
+    counts = {}
+    for name in names:
+        if name in counts:
+            number = counts[name]
+            while f"{name}_{number}" in seen:
+                number += 1
+            counts[name] = number + 1
+            name = f"{name}_{number}"
+            seen.add(name)
+        else:
+            counts[name] = 2
+        unique.append(name)
+    return unique
+
+def read_open_meteo_csv(source, names=None, locations=None):
+    '''
+    Reads Open-Meteo CSV data of one or several locations.
+
+    Parameters:
+        - source (str or file): CSV file path, file object or CSV text.
+        - names (list, optional): Location names in the order of the file.
+        - locations (pd.DataFrame, optional): Locations from load_locations, used to name the grid points when names is not given.
+          By default the grid points keep their coordinates as name, e.g. '54.73N2.85W'.
+
+    Returns:
+        - pd.DataFrame: location, time (UTC, without time zone) and the variables in snake_case, e.g. 'temperature_2m_°c'.
+    '''
+
+    if hasattr(source, "read"):
+        text = source.read()
+    elif "\n" in source:
+        text = source
+    else:
+        with open(source, encoding="utf-8") as f:
+            text = f.read()
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+
+    # Metadata block, then the data blocks (hourly first), separated by empty lines
+    blocks = [block for block in text.replace("\r\n", "\n").split("\n\n") if block.strip()]
+    metadata = pd.read_csv(io.StringIO(blocks[0]))
+    hourly = pd.read_csv(io.StringIO(blocks[1]))
+
+    if "location_id" not in metadata.columns:
+        metadata.insert(0, "location_id", 0)
+        hourly.insert(0, "location_id", 0)
+
+    if names is None and locations is not None:
+        names = nearest_names(metadata["latitude"], metadata["longitude"], locations)
+    elif names is None:
+        names = [location_name(lat, lon) for lat, lon in zip(metadata["latitude"], metadata["longitude"])]
+    if len(names) != len(metadata):
+        raise ValueError(f"{len(names)} location names given for {len(metadata)} locations in the data")
+    # Two grid points can round to the same coordinates
+    names = unique_names(list(names))
+
+    hourly = dc.snake(hourly)
+    hourly["time"] = pd.to_datetime(hourly["time"], format="%Y-%m-%dT%H:%M")
+    # The time column is in the time zone of the request, UTC by default
+    offsets = metadata.set_index("location_id")["utc_offset_seconds"]
+    hourly["time"] -= pd.to_timedelta(hourly["location_id"].map(offsets), unit="s")
+
+    hourly.insert(0, "location", pd.Categorical.from_codes(hourly.pop("location_id"), names))
+    return hourly
+
+def clean(weather):
+    '''
+    Removes duplicated hours and fills missing hours of every location.
+
+    Parameters:
+        - weather (pd.DataFrame): Weather data from read_open_meteo_csv.
+
+    Returns:
+        - pd.DataFrame: The data with one row per location and hour.
+    '''
+
+    cleaned = []
+    for name, part in weather.groupby("location", observed=True, sort=False):
+        part = dc.check_time_increase_in_weather(part.drop(columns="location"), "time")
+        part.insert(0, "location", name)
+        cleaned.append(part)
+
+    if len(cleaned) == 0:
+        return weather
+    return pd.concat(cleaned, ignore_index=True)
+
+def to_local_time(times):
+    '''
+    Converts UTC times to UK wall-clock times, as the settlement periods.
+
+    Parameters:
+        - times (pd.Series): Times in UTC, without time zone.
+
+    Returns:
+        - pd.Series: Wall-clock times, without time zone.
+    '''
+    return times.dt.tz_localize("UTC").dt.tz_convert(local_timezone).dt.tz_localize(None)
+
+def align_to_settlement_periods(weather, method="ffill", start=None, end=None):
+    '''
+    Aligns hourly weather to settlement periods, for all the locations at once.
+
+    Parameters:
+        - weather (pd.DataFrame): Hourly weather with location and time (UTC) columns.
+        - method (str): 'ffill' keeps the last hourly value, 'linear' interpolates between the hours.
+        - start (datetime-like, optional): First settlement period. The first hour by default.
+        - end (datetime-like, optional): Last settlement period. Half an hour after the last hour by default.
+
+    Returns:
+        - pd.DataFrame: settlement_date (start of the period), settlement_period, location and the variables.
+    '''
+
+    if method not in ("ffill", "linear"):
+        raise ValueError(f"Unknown alignment method '{method}', use 'ffill' or 'linear'")
+
+    df = weather.copy()
+    df["location"] = df["location"].astype(str)
+    df["time"] = to_local_time(df["time"])
+    # The repeated hour of the autumn clock change keeps its first value
+    df = df.drop_duplicates(subset=["location", "time"], keep="first").sort_values("time", kind="stable")
+    variables = [col for col in df.columns if col not in ("location", "time")]
+
+    # Settlement periods of the covered range, for every location, in time order for merge_asof
+    start = df["time"].min() if start is None else pd.Timestamp(start)
+    end = df["time"].max() + pd.Timedelta(minutes=30) if end is None else pd.Timestamp(end)
+    periods = pd.date_range(start.floor("30min"), end, freq="30min")
+    names = df["location"].unique()
+    grid = pd.DataFrame({
+        "settlement_date": np.repeat(periods.to_numpy(), len(names)),
+        "location": np.tile(names.astype(object), len(periods)),
+    })
+
+    # Last hour at or before each period, per location
+    aligned = pd.merge_asof(grid, df.rename(columns={"time": "settlement_date"}), on="settlement_date",
+                            by="location", direction="backward", tolerance=max_gap)
+
+    if method == "linear" and len(df) > 0:
+        # Interpolate each location between its hours, on int64 nanoseconds
+        values = aligned[variables].to_numpy(dtype=np.float64, copy=True)
+        empty = np.isnan(values).all(axis=1)
+        target = aligned["settlement_date"].to_numpy().astype(np.int64)
+        hourly = df.groupby("location").indices
+        for name, rows in aligned.groupby("location").indices.items():
+            part = df.iloc[hourly[name]]
+            hours = part["time"].to_numpy().astype(np.int64)
+            rows = rows[(target[rows] >= hours[0]) & (target[rows] <= hours[-1])]
+            for i, col in enumerate(variables):
+                values[rows, i] = np.interp(target[rows], hours, part[col].to_numpy(dtype=np.float64))
+        # Periods after a gap longer than max_gap stay empty
+        values[empty] = np.nan
+        aligned[variables] = values
+
+    aligned.insert(1, "settlement_period", (aligned["settlement_date"].dt.hour * 2 + aligned["settlement_date"].dt.minute // 30 + 1).astype("int8"))
+    return aligned.dropna(subset=variables, how="all").sort_values(KEY_COLUMNS).reset_index(drop=True)
+
+def read_location(location=None, start=None):
+    '''
+    Reads the stored weather of one location, to join it to the merged data.
+
+    Parameters:
+        - location (str, optional): Location name. The first location of load_locations() by default.
+        - start (datetime-like, optional): Only the periods from this date.
+
+    Returns:
+        - pd.DataFrame: settlement_date, settlement_period and the variables. Empty if there is no weather data.
+    '''
+
+    if location is None:
+        location = load_locations().index[0]
+
+    df = storage.read("weather", start=start)
+    if len(df) == 0:
+        return pd.DataFrame({"settlement_date": pd.Series(dtype="datetime64[ns]"), "settlement_period": pd.Series(dtype="int8")})
+    return df[df["location"] == location].drop(columns="location").reset_index(drop=True)
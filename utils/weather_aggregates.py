@@ -0,0 +1,284 @@
+'''This file builds national weather features from the weather of many grid points.
+
+Wind and solar output depend on the weather where the farms are, so each national feature
+is a mean over the locations weighted by the capacity around them (see
+weather.load_locations):
+
+    - wind speed at the hub height of the turbines, extrapolated from the 100 m wind speed,
+      weighted by wind capacity,
+    - irradiance and cloud cover, weighted by solar capacity,
+    - temperature, with the same weight for every location.
+
+The values are reduced as a (time x location) float32 array with one matrix product per
+feature. For long histories every location is kept in its own memory-mapped float32 file
+on a common half-hourly axis, and the reduction reads a block of periods at a time, so the
+memory stays at one block (about 20 MB for 50 locations) whatever the length of the history:
+
+    data/weather/arrays/<location>.f32
+    data/weather/arrays/index.json
+
+The features are written to the 'weather_national' dataset of the store.'''
+
+import os
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from utils import storage
+from utils import weather
+
+# Memory-mapped arrays of the locations
+script_dir = os.path.dirname(os.path.realpath(__file__))
+arrays_path = os.path.join(script_dir, "../data/weather/arrays")
+index_file = os.path.join(arrays_path, "index.json")
+
+# National feature -> (variable, location weight column or None for the same weight)
+aggregates = {
+    "national_wind_speed_hub_km/h": ("wind_speed_100m_km/h", "wind_capacity_mw"),
+    "national_shortwave_radiation_w/m²": ("shortwave_radiation_w/m²", "solar_capacity_mw"),
+    "national_global_tilted_irradiance_w/m²": ("global_tilted_irradiance_w/m²", "solar_capacity_mw"),
+    "national_direct_radiation_w/m²": ("direct_radiation_w/m²", "solar_capacity_mw"),
+    "national_cloud_cover_%": ("cloud_cover_%", "solar_capacity_mw"),
+    "national_temperature_2m_°c": ("temperature_2m_°c", None),
+}
+
+# Wind speed at hub height from the 100 m wind speed, with the power law v_hub = v_100 * (h / 100) ** shear_exponent.
+# Hub height in metres of the locations without a hub_height_m column in the locations file
+hub_height = 110
+shear_exponent = 1 / 7
+
+# Settlement periods reduced at a time, one year by default
+block_periods = 17568
+
+period = pd.Timedelta(minutes=30)
+
+def weighted_mean(values, weights):
+    '''
+    Weighted mean over the locations of every period, ignoring the missing values.
+
+    Parameters:
+        - values (np.ndarray): (time x location) values, NaN when missing.
+        - weights (np.ndarray): Weight of each location.
+
+    Returns:
+        - np.ndarray: float32 mean of every period, NaN when no weighted location has a value.
+    '''
+
+    weights = np.asarray(weights, dtype=np.float32)
+    present = ~np.isnan(values)
+    total = np.where(present, values, 0).astype(np.float32, copy=False) @ weights
+    weight = present.astype(np.float32) @ weights
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(weight > 0, total / weight, np.nan).astype(np.float32)
+
+def _features(block, variables, locations):
+    # National features of a (time x location x variable) block
+    features = {}
+    for name, (variable, weight_column) in aggregates.items():
+        if variable not in variables:
+            continue
+        weights = np.ones(len(locations)) if weight_column is None else locations[weight_column].to_numpy()
+        values = block[:, :, variables.index(variable)]
+        if variable.startswith("wind_speed_100m"):
+            heights = locations.get("hub_height_m", pd.Series(np.nan, index=locations.index)).fillna(hub_height)
+            values = values * ((heights.to_numpy(dtype=np.float64) / 100) ** shear_exponent).astype(np.float32)
+        features[name] = weighted_mean(values, weights)
+    return features
+
+def _frame(dates, features):
+    df = pd.DataFrame({"settlement_date": dates})
+    df["settlement_period"] = (df["settlement_date"].dt.hour * 2 + df["settlement_date"].dt.minute // 30 + 1).astype("int8")
+    for name, values in features.items():
+        df[name] = values
+    variables = list(features)
+    return df.dropna(subset=variables, how="all").reset_index(drop=True) if variables else df
+
+def national_features(aligned, locations=None):
+    '''
+    Computes the national features of aligned weather, e.g. the periods of a refresh.
+
+    Parameters:
+        - aligned (pd.DataFrame): Weather from weather.align_to_settlement_periods, one row per period and location.
+        - locations (pd.DataFrame, optional): Locations and capacities. weather.load_locations() by default.
+
+    Returns:
+        - pd.DataFrame: settlement_date, settlement_period and the national features.
+    '''
+
+    if locations is None:
+        locations = weather.load_locations()
+    aligned = aligned[aligned["location"].isin(locations.index)]
+    variables = [col for col in aligned.columns if col not in weather.KEY_COLUMNS]
+
+    # (time x location x variable) array, locations in the order of the capacities
+    wide = aligned.pivot(index="settlement_date", columns="location", values=variables)
+    wide = wide.reindex(columns=pd.MultiIndex.from_product([variables, locations.index]))
+    block = wide.to_numpy(dtype=np.float32).reshape(len(wide), len(variables), len(locations)).transpose(0, 2, 1)
+
+    return _frame(wide.index, _features(block, variables, locations))
+
+def load_index():
+    '''
+    Reads the index of the memory-mapped arrays.
+
+    Returns:
+        - dict: start, periods, variables and locations of the arrays. Empty if there are none.
+    '''
+
+    if not os.path.exists(index_file):
+        return {}
+    with open(index_file) as f:
+        return json.load(f)
+
+def location_file(name):
+    '''Returns the memory-mapped array file of a location.'''
+    return os.path.join(arrays_path, f"{name}.f32")
+
+def open_array(name, index, mode="r"):
+    '''
+    Opens the (period x variable) float32 array of a location.
+
+    Parameters:
+        - name (str): Location name.
+        - index (dict): Index from load_index.
+        - mode (str): numpy.memmap mode, 'r' to read, 'r+' to write.
+
+    Returns:
+        - np.memmap: The array, without loading it in memory.
+    '''
+    return np.memmap(location_file(name), dtype=np.float32, mode=mode, shape=(index["periods"], len(index["variables"])))
+
+def write_arrays(frames, start, end, variables=None):
+    '''
+    Writes aligned weather to one memory-mapped array per location, replacing the existing arrays.
+
+    Parameters:
+        - frames (iterable): DataFrames from weather.align_to_settlement_periods, e.g. one per Open-Meteo file.
+          Only one of them is in memory at a time.
+        - start (datetime-like): First settlement period of the arrays.
+        - end (datetime-like): Last settlement period of the arrays.
+        - variables (list, optional): Variables to keep. The ones of the aggregates by default.
+
+    Returns:
+        - dict: The new index.
+    '''
+
+    start = pd.Timestamp(start).floor("30min")
+    periods = int((pd.Timestamp(end) - start) // period) + 1
+    if variables is None:
+        variables = list(dict.fromkeys(variable for variable, _ in aggregates.values()))
+    index = {"start": str(start), "periods": periods, "variables": variables, "locations": []}
+
+    os.makedirs(arrays_path, exist_ok=True)
+    for frame in frames:
+        rows = ((frame["settlement_date"] - start) // period).to_numpy()
+        inside = (rows >= 0) & (rows < periods)
+        for name, positions in frame.groupby("location").indices.items():
+            positions = positions[inside[positions]]
+            # A location can be spread over several frames
+            if name in index["locations"]:
+                array = np.memmap(location_file(name), dtype=np.float32, mode="r+", shape=(periods, len(variables)))
+            else:
+                array = np.memmap(location_file(name), dtype=np.float32, mode="w+", shape=(periods, len(variables)))
+                array[:] = np.nan
+                index["locations"].append(name)
+            part = frame.iloc[positions].reindex(columns=variables)
+            array[rows[positions]] = part.to_numpy(dtype=np.float32)
+            array.flush()
+            del array
+
+    # Write to a temporary file and rename it, so readers never see a partial file
+    tmp_file = f"{index_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_file, index_file)
+
+    return index
+
+def national_features_from_arrays(locations=None, start=None, end=None):
+    '''
+    Computes the national features from the memory-mapped arrays, a block of periods at a time.
+
+    Parameters:
+        - locations (pd.DataFrame, optional): Locations and capacities. weather.load_locations() by default.
+          Locations without an array are left out.
+        - start (datetime-like, optional): First settlement period. The start of the arrays by default.
+        - end (datetime-like, optional): Last settlement period. The end of the arrays by default.
+
+    Returns:
+        - pd.DataFrame: settlement_date, settlement_period and the national features.
+    '''
+
+    index = load_index()
+    if not index:
+        return pd.DataFrame()
+    if locations is None:
+        locations = weather.load_locations()
+    locations = locations[locations.index.isin(index["locations"])]
+
+    first = pd.Timestamp(index["start"])
+    begin = 0 if start is None else max(0, int((pd.Timestamp(start) - first) // period))
+    stop = index["periods"] if end is None else min(index["periods"], int((pd.Timestamp(end) - first) // period) + 1)
+    arrays = [open_array(name, index) for name in locations.index]
+
+    frames = []
+    block = np.empty((min(block_periods, max(stop - begin, 0)), len(locations), len(index["variables"])), dtype=np.float32)
+    for block_start in range(begin, stop, block_periods):
+        block_stop = min(block_start + block_periods, stop)
+        view = block[:block_stop - block_start]
+        for i, array in enumerate(arrays):
+            view[:, i, :] = array[block_start:block_stop]
+        dates = first + period * np.arange(block_start, block_stop)
+        frames.append(_frame(dates, _features(view, index["variables"], locations)))
+
+    if len(frames) == 0:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+def update(aligned):
+    '''
+    Updates the national features of the periods of newly stored weather.
+
+    Parameters:
+        - aligned (pd.DataFrame): Weather just written to the 'weather' dataset.
+
+    Returns:
+        - pd.DataFrame: The national features written to the store.
+    '''
+
+    if len(aligned) == 0:
+        return aligned
+    features = national_features(aligned)
+    storage.upsert(features, "weather_national")
+    return features
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds the national weather features from Open-Meteo CSV files of many locations.")
+    parser.add_argument("files", nargs="+", help="Open-Meteo CSV files, each with one or several locations.")
+    parser.add_argument("--start", required=True, help="First day of the arrays.")
+    parser.add_argument("--end", required=True, help="Last day of the arrays.")
+    parser.add_argument("--method", default="ffill", choices=["ffill", "linear"], help="Alignment of the hours to settlement periods.")
+    args = parser.parse_args()
+
+    end = pd.Timestamp(args.end) + pd.Timedelta(days=1) - period
+
+    locations = weather.load_locations()
+
+    def frames():
+        # One file in memory at a time
+        for file in args.files:
+            print(f"Reading {file}")
+            hourly = weather.clean(weather.read_open_meteo_csv(file, locations=locations))
+            yield weather.align_to_settlement_periods(hourly, method=args.method, start=args.start, end=end)
+
+    index = write_arrays(frames(), args.start, end)
+    print(f"Wrote arrays of {len(index['locations'])} locations and {index['periods']} periods to {arrays_path}")
+
+    features = national_features_from_arrays(locations, start=args.start, end=end)
+    storage.write(features, "weather_national")
+    print(f"Stored {len(features)} periods of national weather features")
+
+if __name__ == "__main__":
+    main()